@@ -3,6 +3,7 @@ import os
 import shutil
 from deidapp.models import Patient, DicomStudy, DicomSeries, DicomInstance
 from dicomapp.models import DicomSeriesProcessingModel
+from dicomapp.dicom_utils.dicom_headers import sniff_dicom_file, DICOM_PART10, DICOM_UNREADABLE
 # from dicom_handler.models import DicomUnprocessed
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
@@ -182,6 +183,20 @@ class DicomDeidentifier:
                     yaml_files.append((file_path, file))
                     continue
 
+                # Files without the DICM preamble are not valid DICOM files for pydicom, delete them without parsing.
+                # Files which could not be read are kept, the read error may be transient.
+                dicom_kind = sniff_dicom_file(file_path)
+                if dicom_kind == DICOM_UNREADABLE:
+                    logger.error(f'Error processing {file}: The file could not be read')
+                    continue
+                if dicom_kind != DICOM_PART10:
+                    logger.warning(f'Deleting {file}: Not a valid DICOM file')
+                    try:
+                        os.remove(file_path)
+                    except OSError as e:
+                        logger.warning(f"Could not delete file {file_path}: {str(e)}")
+                    continue
+
                 try:
                     # Try to read the DICOM file
                     logger.info(f"Reading DICOM file: {file_path}")
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:20
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0004_dicompathconfig_date_time_to_start_pulling_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='scan_concurrency',
+            field=models.PositiveSmallIntegerField(default=8, help_text='Enter the number of datastore folders that are scanned in parallel. Scanning a remote datastore is limited by network latency, so values of 8 - 16 speed up the scan of a network share. Use 1 to scan sequentially.', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(32)]),
+        ),
+    ]
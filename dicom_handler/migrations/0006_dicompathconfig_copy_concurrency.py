@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:05
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0005_dicompathconfig_scan_concurrency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='copy_concurrency',
+            field=models.PositiveSmallIntegerField(default=4, help_text='Enter the number of files that are copied from the datastore in parallel. Copying from a network share is limited by the latency of each file, so values of 4 - 8 speed up the import of large studies. Use 1 to copy sequentially.', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(32)]),
+        ),
+    ]
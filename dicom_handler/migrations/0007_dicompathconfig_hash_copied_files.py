@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0006_dicompathconfig_copy_concurrency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='hash_copied_files',
+            field=models.BooleanField(default=False, help_text='Store a hash of every copied file in the copy manifest. When only the modification time of a file in the datastore changes, its hash is compared and the file is not imported again if the content is unchanged.'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:58
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0007_dicompathconfig_hash_copied_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='minimum_settle_seconds',
+            field=models.PositiveIntegerField(default=30, help_text='Enter the minimum number of seconds the files of a datastore folder must stay unchanged before the folder is imported. A folder is imported once two consecutive scans see the same number of files, total size and newest modification time and this time has passed since the last change.', validators=[django.core.validators.MaxValueValidator(3600)]),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:24
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0008_dicompathconfig_minimum_settle_seconds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='datastore_io_timeout_seconds',
+            field=models.PositiveIntegerField(default=30, help_text='Enter the number of seconds after which a single file system call on the datastore (listing a folder, reading file details) is considered hung. The scan is then stopped and the datastore is retried with an increasing delay until it responds again.', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(600)]),
+        ),
+    ]
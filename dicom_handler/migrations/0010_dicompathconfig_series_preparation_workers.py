@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:02
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0009_dicompathconfig_datastore_io_timeout_seconds'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='series_preparation_workers',
+            field=models.PositiveSmallIntegerField(default=4, help_text='Enter the number of worker processes used to read the DICOM headers when imported files are grouped into series. Reading headers is limited by the CPU, so this can be raised up to the number of CPU cores of the worker host. Use 1 to read the headers in the Celery task itself.', validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(64)]),
+        ),
+    ]
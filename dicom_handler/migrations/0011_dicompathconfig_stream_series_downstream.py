@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0010_dicompathconfig_series_preparation_workers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='stream_series_downstream',
+            field=models.BooleanField(default=False, help_text='Send every series on to template matching, deidentification and the remote server as soon as its files have been grouped, instead of waiting until all series of the export run are prepared. The first series of a large import reaches the remote server earlier.'),
+        ),
+    ]
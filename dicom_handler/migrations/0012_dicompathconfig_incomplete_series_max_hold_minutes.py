@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:52
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0011_dicompathconfig_stream_series_downstream'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='incomplete_series_max_hold_minutes',
+            field=models.PositiveIntegerField(default=30, help_text='Enter the maximum number of minutes a series with missing slices (gaps in the instance numbers or in the slice positions) is held back while the remaining slices arrive. A held back series is copied again on the next scan of its datastore directory. Once this time has passed the series is sent as it is. Use 0 to send incomplete series right away.', validators=[django.core.validators.MaxValueValidator(1440)]),
+        ),
+    ]
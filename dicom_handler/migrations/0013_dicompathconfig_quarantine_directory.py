@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0012_dicompathconfig_incomplete_series_max_hold_minutes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='quarantine_directory',
+            field=models.CharField(blank=True, help_text='Optional folder on this machine where imported files which are not DICOM files of a supported modality (e.g. thumbnails, PDFs, RTPLAN or RTDOSE files) are moved to for inspection. If empty these files are deleted. Rejected files are remembered and not copied from the datastore again until they change.', max_length=512),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0014_dicompathconfig_filter_files_at_copy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='excluded_image_types',
+            field=models.CharField(blank=True, default='LOCALIZER', help_text='Comma separated ImageType values (e.g. LOCALIZER, DERIVED, SECONDARY). Images whose ImageType contains one of them are dropped from their series before it is sent for segmentation. Scanners store localizer images in the same series as the axial images, where they increase the upload size and can make the server reject or mis-segment the series. Leave empty to keep all images.', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='dicompathconfig',
+            name='exclude_secondary_capture_images',
+            field=models.BooleanField(default=True, help_text='Drop secondary capture images (screenshots, scanned documents, dose reports) from the series they are stored in before the series is sent for segmentation.'),
+        ),
+    ]
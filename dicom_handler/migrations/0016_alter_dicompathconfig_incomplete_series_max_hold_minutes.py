@@ -0,0 +1,19 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:10
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0015_dicompathconfig_excluded_image_types'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dicompathconfig',
+            name='incomplete_series_max_hold_minutes',
+            field=models.PositiveIntegerField(default=30, help_text='Enter the maximum number of minutes a series with missing slices (gaps in the instance numbers or in the slice positions) is held back while the remaining slices arrive. A held back series is copied again once the files of its datastore directory change. Once this time has passed the series is sent as it is. Use 0 to send incomplete series right away.', validators=[django.core.validators.MaxValueValidator(1440)]),
+        ),
+    ]
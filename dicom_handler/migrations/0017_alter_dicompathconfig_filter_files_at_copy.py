@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicom_handler', '0016_alter_dicompathconfig_incomplete_series_max_hold_minutes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='dicompathconfig',
+            name='filter_files_at_copy',
+            field=models.BooleanField(default=False, help_text='Read the first kilobytes of every file before copying it from the datastore and leave out files which are not CT / MR / PT (PET) / US images (e.g. RTDOSE, RTPLAN, RTSTRUCT, structured reports, PDFs). This saves copying large dose grids and files that series preparation would drop anyway. The number of skipped files is recorded for each directory.'),
+        ),
+    ]
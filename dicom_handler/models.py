@@ -2,6 +2,7 @@ from django.db import models
 import os
 import logging
 from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator, MaxValueValidator
 from urllib.parse import urlparse
 from pathlib import Path
 from django.utils import timezone
@@ -15,6 +16,18 @@ class DicomPathConfig(models.Model):
                                      help_text="Enter the full path to the datastore which is the remote folder from the DICOM data will be imported. This can be a remote folder in which case the full path is required. We would suggest that in such a situation the remote folder is mapped as a shared drive on the machine where this client runs."
                                      )
     date_time_to_start_pulling_data = models.DateTimeField(null=True, blank=True, default=timezone.now, help_text="Enter the date and time to start pulling data from the datastore. This setting can be changed manually at a later time to trigger a new pull of the data from the datastore.")
+    datastore_io_timeout_seconds = models.PositiveIntegerField(default=30, validators=[MinValueValidator(1), MaxValueValidator(600)], help_text="Enter the number of seconds after which a single file system call on the datastore (listing a folder, reading file details) is considered hung. The scan is then stopped and the datastore is retried with an increasing delay until it responds again.")
+    scan_concurrency = models.PositiveSmallIntegerField(default=8, validators=[MinValueValidator(1), MaxValueValidator(32)], help_text="Enter the number of datastore folders that are scanned in parallel. Scanning a remote datastore is limited by network latency, so values of 8 - 16 speed up the scan of a network share. Use 1 to scan sequentially.")
+    minimum_settle_seconds = models.PositiveIntegerField(default=30, validators=[MaxValueValidator(3600)], help_text="Enter the minimum number of seconds the files of a datastore folder must stay unchanged before the folder is imported. A folder is imported once two consecutive scans see the same number of files, total size and newest modification time and this time has passed since the last change.")
+    copy_concurrency = models.PositiveSmallIntegerField(default=4, validators=[MinValueValidator(1), MaxValueValidator(32)], help_text="Enter the number of files that are copied from the datastore in parallel. Copying from a network share is limited by the latency of each file, so values of 4 - 8 speed up the import of large studies. Use 1 to copy sequentially.")
+    series_preparation_workers = models.PositiveSmallIntegerField(default=4, validators=[MinValueValidator(1), MaxValueValidator(64)], help_text="Enter the number of worker processes used to read the DICOM headers when imported files are grouped into series. Reading headers is limited by the CPU, so this can be raised up to the number of CPU cores of the worker host. Use 1 to read the headers in the Celery task itself.")
+    hash_copied_files = models.BooleanField(default=False, help_text="Store a hash of every copied file in the copy manifest. When only the modification time of a file in the datastore changes, its hash is compared and the file is not imported again if the content is unchanged.")
+    stream_series_downstream = models.BooleanField(default=False, help_text="Send every series on to template matching, deidentification and the remote server as soon as its files have been grouped, instead of waiting until all series of the export run are prepared. The first series of a large import reaches the remote server earlier.")
+    incomplete_series_max_hold_minutes = models.PositiveIntegerField(default=30, validators=[MaxValueValidator(1440)], help_text="Enter the maximum number of minutes a series with missing slices (gaps in the instance numbers or in the slice positions) is held back while the remaining slices arrive. A held back series is copied again once the files of its datastore directory change. Once this time has passed the series is sent as it is. Use 0 to send incomplete series right away.")
+    quarantine_directory = models.CharField(max_length=512, blank=True, help_text="Optional folder on this machine where imported files which are not DICOM files of a supported modality (e.g. thumbnails, PDFs, RTPLAN or RTDOSE files) are moved to for inspection. If empty these files are deleted. Rejected files are remembered and not copied from the datastore again until they change.")
+    filter_files_at_copy = models.BooleanField(default=False, help_text="Read the first kilobytes of every file before copying it from the datastore and leave out files which are not CT / MR / PT (PET) / US images (e.g. RTDOSE, RTPLAN, RTSTRUCT, structured reports, PDFs). This saves copying large dose grids and files that series preparation would drop anyway. The number of skipped files is recorded for each directory.")
+    excluded_image_types = models.CharField(max_length=255, blank=True, default="LOCALIZER", help_text="Comma separated ImageType values (e.g. LOCALIZER, DERIVED, SECONDARY). Images whose ImageType contains one of them are dropped from their series before it is sent for segmentation. Scanners store localizer images in the same series as the axial images, where they increase the upload size and can make the server reject or mis-segment the series. Leave empty to keep all images.")
+    exclude_secondary_capture_images = models.BooleanField(default=True, help_text="Drop secondary capture images (screenshots, scanned documents, dose reports) from the series they are stored in before the series is sent for segmentation.")
 
     class Meta:
         db_table = "dicom_path_config"
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from dicomapp.models import CopyDicomTaskModel, DicomSeriesProcessingModel, DicomSeriesProcessingLogModel, DicomFileUploadModel
+from dicomapp.models import CopyDicomTaskModel, DicomSeriesProcessingModel, DicomSeriesProcessingLogModel, DicomFileUploadModel, DatastoreHealthModel, RejectedFileModel, ArchivedSeriesFileModel
 from unfold.admin import ModelAdmin
 from unfold.decorators import action
 from dicomapp.admin_actions.send_dicom_for_processing import send_dicom_for_processing_action
@@ -10,11 +10,40 @@ class CopyDicomTaskAdmin(ModelAdmin):
     list_display = ('id', 'source_directory', 'target_directory', 'created_at', 'updated_at')
     readonly_fields = ('id', 'source_directory', 'source_directory_creation_date', 
                       'source_directory_modification_date', 'source_directory_size',
-                      'target_directory', 'task_id', 'created_at', 'updated_at')
+                      'target_directory', 'task_id', 'copy_strategy', 'files_copied', 'bytes_copied',
+                      'copy_duration_seconds', 'copy_files_per_second', 'copy_megabytes_per_second',
+                      'file_manifest', 'skipped_file_counts', 'incomplete_series_held_since', 'incomplete_series_checked_at', 'created_at', 'updated_at')
     search_fields = ('source_directory', 'target_directory', 'task_id')
     list_per_page = 10
     ordering = ('-created_at',)
 
+@admin.register(DatastoreHealthModel)
+class DatastoreHealthAdmin(ModelAdmin):
+    list_display = ('datastore_path', 'healthy', 'consecutive_failures', 'unavailable_until', 'latency_p50_ms',
+                    'latency_p95_ms', 'latency_p99_ms', 'last_checked_at')
+    readonly_fields = ('id', 'datastore_path', 'healthy', 'consecutive_failures', 'unavailable_until', 'last_error',
+                      'last_checked_at', 'metadata_calls', 'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms',
+                      'latency_max_ms', 'created_at', 'updated_at')
+
+@admin.register(RejectedFileModel)
+class RejectedFileAdmin(ModelAdmin):
+    list_display = ('file_path', 'reason', 'file_size', 'rejection_count', 'quarantine_path', 'updated_at')
+    readonly_fields = ('id', 'file_path', 'file_size', 'file_modification_time', 'reason', 'reason_message',
+                      'quarantine_path', 'rejection_count', 'created_at', 'updated_at')
+    search_fields = ('file_path', 'reason_message')
+    list_filter = ('reason',)
+    list_per_page = 10
+    ordering = ('-updated_at',)
+
+@admin.register(ArchivedSeriesFileModel)
+class ArchivedSeriesFileAdmin(ModelAdmin):
+    list_display = ('file_path', 'series_instance_uid', 'file_size', 'updated_at')
+    readonly_fields = ('id', 'file_path', 'series_instance_uid', 'file_size', 'file_modification_time', 'header_record',
+                      'created_at', 'updated_at')
+    search_fields = ('file_path', 'series_instance_uid')
+    list_per_page = 10
+    ordering = ('-updated_at',)
+
 @admin.register(DicomSeriesProcessingModel)
 class DicomSeriesProcessingAdmin(ModelAdmin):
     list_display = ('patient_id', 'patient_name', 'modality','series_description', 'protocol_name','template_file', 'processing_status', 
@@ -24,7 +53,7 @@ class DicomSeriesProcessingAdmin(ModelAdmin):
                       'gender', 'scan_date', 'modality', 'protocol_name', 'study_instance_uid',
                       'series_instance_uid', 'series_description', 'series_import_directory',
                       'series_archive_directory', 'series_current_directory', 'processing_status', 'series_state',
-                      'created_at', 'updated_at')
+                      'series_header', 'excluded_image_count', 'created_at', 'updated_at')
     search_fields = ('patient_id', 'patient_name', 'modality', 'protocol_name', 'processing_status')
     list_filter = ('processing_status', 'series_state', 'modality','protocol_name','scan_date', 'created_at')
     list_per_page = 10
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DicomappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dicomapp'
+
+    def ready(self):
+        # Connects the signals which invalidate the compiled template matching rules and templates
+        from dicomapp.dicom_utils import rule_index, template_index  # noqa: F401
@@ -2,15 +2,96 @@ from dicomapp.models import *
 from logging import getLogger
 import os
 from pathlib import Path
-import shutil
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.utils import timezone
+from django.db import transaction
 import uuid
+from dicomapp.dicom_utils.datastore_scan import scan_datastore
+from dicomapp.dicom_utils.file_transfer import CopyPool, CopyStatistics, FileCopier
+from dicomapp.dicom_utils.copy_manifest import get_changed_files, add_file_hashes, build_manifest_entry
+from dicomapp.dicom_utils.stability_tracker import StabilityTracker
+from dicomapp.dicom_utils.rejected_files import RejectedFileCache
+from dicomapp.dicom_utils.dicom_headers import peek_dicom_file, get_import_skip_label, is_import_skip_label
+from collections import Counter
+from dicomapp.dicom_utils.datastore_io import DatastoreIO, DatastoreUnavailableError, get_mount_health, mount_in_backoff, record_mount_failure, record_mount_success
 logger = getLogger(__name__)
 
+# Directories are copied once two consecutive scans see the same files (see stability_tracker.py).
+# Directories which have not been modified for this long are copied without waiting for a second scan.
+QUIESCENCE_WINDOW = timedelta(minutes=10)
+
+# Fields written when a CopyDicomTaskModel entry is created or updated by copy_dicom
+COPY_TASK_UPDATE_FIELDS = [
+    'source_directory_creation_date',
+    'source_directory_modification_date',
+    'source_directory_size',
+    'target_directory',
+    'task_id',
+    'copy_completed',
+    'skipped_file_counts',
+    'copy_strategy',
+    'files_copied',
+    'bytes_copied',
+    'copy_duration_seconds',
+    'copy_files_per_second',
+    'copy_megabytes_per_second',
+    'file_manifest',
+    'updated_at',
+]
+
+
+def get_existing_copy_tasks(source_directories, batch_size=500):
+    """
+    Fetch the CopyDicomTaskModel entries for the given source directories.
+    The lookup is done with source_directory__in queries of batch_size directories each.
+
+    Returns:
+        dict: Mapping of source directory to the CopyDicomTaskModel entry.
+    """
+    existing_entries = {}
+    for start in range(0, len(source_directories), batch_size):
+        batch = source_directories[start:start + batch_size]
+        existing_entries.update(
+            (entry.source_directory, entry)
+            for entry in CopyDicomTaskModel.objects.filter(source_directory__in=batch)
+        )
+    return existing_entries
+
+
+def save_copy_tasks(entries):
+    """
+    Create or update the CopyDicomTaskModel entries in a single transaction.
+    New and existing entries are written together with bulk upserts on the unique source_directory.
+    """
+    if not entries:
+        return
+    with transaction.atomic():
+        CopyDicomTaskModel.objects.bulk_create(
+            entries,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['source_directory'],
+            update_fields=COPY_TASK_UPDATE_FIELDS
+        )
+    logger.info(f"Created/Updated {len(entries)} database entries")
+
+
+def get_copy_skip_label(file_record):
+    """
+    Peek at the header of a file in the datastore and return the label it is skipped under
+    (see get_import_skip_label), None if the file is copied. Files which cannot be read are copied.
+    """
+    try:
+        return get_import_skip_label(*peek_dicom_file(file_record.path))
+    except OSError as e:
+        logger.warning(f"Could not check the header of {file_record.path}: {str(e)}")
+        return None
+
+
 # Function to find all directories containing files directly or indirectly (including files in subdirectories)
-def find_directories_with_direct_files(base_path, pull_start_time):
+# Returns the DirectoryRecords (see datastore_scan.py) sorted by modification time
+def find_directories_with_direct_files(base_path, pull_start_time, source_directories=None, scan_concurrency=1, datastore_io=None):
     # Convert datetime to timestamp if needed
     if hasattr(pull_start_time, 'timestamp'):
         # Ensure the datetime is timezone aware
@@ -21,45 +102,33 @@ def find_directories_with_direct_files(base_path, pull_start_time):
         # If pull_start_time is already a timestamp, use it directly
         pull_start_timestamp = pull_start_time
 
-    # Use Pathlib to list all directories in the base path
-    path_object = Path(base_path)
-    # Get all directories recursively
-    dir_items = [item for item in path_object.glob('**/') if item.is_dir()]
+    # Walk the datastore in a single pass using the persistent scan index so that unchanged directories are not listed again.
+    # Every record carries the stat result of the directory, so no further stat calls are needed here.
+    base_path = str(Path(base_path))
+    scanned_dirs = scan_datastore(base_path, source_directories, scan_concurrency, datastore_io)
+    logger.info(f"Found {len(scanned_dirs)} total directories")
     # Sort the directories by modification time
-    sorted_dirs = sorted(dir_items, key=lambda item: item.stat().st_mtime)
-    # Only keep the directories which are modified after the pull start time
-    all_dirs = [str(item) for item in sorted_dirs if item.stat().st_mtime >= pull_start_timestamp]
-    logger.info(f"Found {len(all_dirs)} total directories")
-
-    # Remove the root directory from the list
-    if str(path_object) in all_dirs:
-        all_dirs.remove(str(path_object))
-    
-    # Check the directory has files inside it
-    dirs_with_files = []
-    for dir_path in all_dirs:
-        # Check if the directory contains any files (not just subdirectories)
-        has_files = False
-        for item in os.listdir(dir_path):
-            if os.path.isfile(os.path.join(dir_path, item)):
-                has_files = True
-                break
-        
-        if has_files:  # Only add directories that contain at least one file
-            dirs_with_files.append(dir_path)
+    scanned_dirs.sort(key=lambda record: record.modification_time)
+
+    # Only keep the directories which are modified after the pull start time and contain at least one file
+    # directly inside them (not just subdirectories). The root directory itself is skipped.
+    dirs_with_files = [
+        record for record in scanned_dirs
+        if record.path != base_path and record.modification_time >= pull_start_timestamp and record.file_count > 0
+    ]
     
     logger.info(f"Found {len(dirs_with_files)} directories with files (direct) Check line")
     # Log each directory on a separate line for better readability
     if dirs_with_files:
         logger.info("List of directories with files:")
-        for dir_path in dirs_with_files:
-            logger.info(f"  - {dir_path}")
+        for record in dirs_with_files:
+            logger.info(f"  - {record.path}")
     else:
         logger.info("No directories with files found")
     return dirs_with_files
 
 
-def copy_dicom(datastore_path, target_path = None, task_id=None) -> dict:
+def copy_dicom(datastore_path, target_path = None, task_id=None, source_directories=None, mount_health_path=None) -> dict:
     """
     This task will recursively scan folders from the datastore path and copy all directories containing files to the target path. 
     1. It will recursively find all directories containing files in the datastore path.
@@ -69,8 +138,12 @@ def copy_dicom(datastore_path, target_path = None, task_id=None) -> dict:
        c. Calculate the size of the directory and store it.
     3. It will copy the directory to the target path if the following conditions are met:
         a. The directory has been modified since the past 1 week 
-        b. The directory has been modified not less than the past 10 minutes from the current time
+        b. The files of the directory have settled: two consecutive scans saw the same file count, total size and
+           newest modification time, and the minimum settle time of the DicomPathConfig has passed since they last changed.
+           Directories not modified for the past 10 minutes are copied on their first scan.
         c. The directory's modification time is different from what's stored in the database
+       Only the files which are new or changed (name, size or modification time) compared to the file manifest
+       of the previous copy are copied, into a new target directory.
 
     4. It will save the task_id of the celery task in the field called task_id.
     It will run as a part of the celery task. 
@@ -79,12 +152,17 @@ def copy_dicom(datastore_path, target_path = None, task_id=None) -> dict:
         datastore_path (str): The path to the datastore directory.
         target_path (str): The path to the target directory. If not provided, the default path will be used.
         task_id (str): The id of the celery task.
+        source_directories (list): Optional list of directories inside the datastore to scan instead of the whole datastore.
+            This is passed by the datastore watcher with the directories which received filesystem events.
+        mount_health_path (str): The path the DatastoreHealthModel entry of the mount is kept under,
+            datastore_path if None. copy_dicom_task passes the configured path (see resolve_datastore_path).
 
     Returns:
         dict: A dictionary containing:
             - status: The status of the operation ('success', 'partial_failure', or 'failure')
             - task_id: The id of the celery task
             - target_paths: List of paths where DICOM directories were copied
+            - datastore_latency: Latency percentiles of the datastore metadata calls of the scan
             - error: Error message (only present if status is 'failure')
     """
 
@@ -123,8 +201,6 @@ def copy_dicom(datastore_path, target_path = None, task_id=None) -> dict:
         # Get the time delta w.r.t to date_time_to_start_pulling_data
         pull_start_time = date_time_to_start_pulling_data - timedelta(minutes=10)
         logger.info(f"Pull start time: {pull_start_time} (timezone: {pull_start_time.tzinfo})")
-        ten_minutes_ago = current_time - timedelta(minutes=10)
-        logger.info(f"Ten minutes ago: {ten_minutes_ago} (timezone: {ten_minutes_ago.tzinfo})")
         
         # Validate time window
         if pull_start_time > current_time:
@@ -132,10 +208,33 @@ def copy_dicom(datastore_path, target_path = None, task_id=None) -> dict:
             pull_start_time = current_time - timedelta(minutes=20)
             logger.info(f"Pull start time: {pull_start_time} (timezone: {pull_start_time.tzinfo})")
         
+        # Metadata calls on the datastore run under a deadline so that a hung mount can not block the worker.
+        # After a timeout the datastore is not scanned again until its backoff has passed.
+        datastore_io = DatastoreIO(dicom_path_config.datastore_io_timeout_seconds if dicom_path_config else 30)
+        mount_health = get_mount_health(mount_health_path or datastore_path)
+        if mount_in_backoff(mount_health, current_time):
+            logger.warning(f"Skipping the scan of {datastore_path} as the datastore is unavailable until {mount_health.unavailable_until}")
+            return {
+                'status': 'failure',
+                'task_id': task_id,
+                'error': f"Datastore {datastore_path} is unavailable until {mount_health.unavailable_until}: {mount_health.last_error}"
+            }
+
         logger.info(f"Starting directory scan in {datastore_path}")
         
         # Find all directories with files (directly or in subdirectories)
-        directories_with_files = find_directories_with_direct_files(datastore_path, pull_start_time)
+        scan_concurrency = dicom_path_config.scan_concurrency if dicom_path_config else 1
+        try:
+            directories_with_files = find_directories_with_direct_files(datastore_path, pull_start_time, source_directories, scan_concurrency, datastore_io)
+        except DatastoreUnavailableError as e:
+            record_mount_failure(mount_health, e, current_time, datastore_io)
+            return {
+                'status': 'failure',
+                'task_id': task_id,
+                'error': str(e)
+            }
+        record_mount_success(mount_health, datastore_io, current_time)
+        result['datastore_latency'] = datastore_io.latency_percentiles()
         
         if not directories_with_files:
             logger.warning(f"No directories with files found in {datastore_path}")
@@ -144,116 +243,200 @@ def copy_dicom(datastore_path, target_path = None, task_id=None) -> dict:
                 'task_id': task_id,
                 'target_paths': [],
                 'copy_dicom_task_id': [],
+                'datastore_latency': result['datastore_latency'],
                 'message': 'No directories with files found'
             }
             
         logger.info(f"Processing {len(directories_with_files)} directories")
+
+        # Fetch the database entries of all candidate directories at once
+        existing_entries = get_existing_copy_tasks([record.path for record in directories_with_files])
+        # Entries to be created / updated at the end of the run
+        copy_task_entries = []
+        # Copies the files of each directory in parallel, with a reflink / copy_file_range when the filesystems allow it.
+        # Never with a hardlink: a scanner or PACS rewriting a datastore file in place would also change the
+        # imported file and through it the series archive.
+        copy_concurrency = dicom_path_config.copy_concurrency if dicom_path_config else 1
+        copy_pool = CopyPool(copy_concurrency, FileCopier(allow_hardlink=False))
+        run_statistics = CopyStatistics()
+        # Whether the manifest of copied files also stores their hashes
+        hash_copied_files = dicom_path_config.hash_copied_files if dicom_path_config else False
+        # Holds back directories until their files stop changing between scans
+        minimum_settle_seconds = dicom_path_config.minimum_settle_seconds if dicom_path_config else 30
+        stability_tracker = StabilityTracker(minimum_settle_seconds, QUIESCENCE_WINDOW)
+        stability_tracker.load([record.path for record in directories_with_files])
+        # Files rejected by series preparation
+        rejected_file_cache = RejectedFileCache()
+        # Whether the header of every file is checked before it is copied
+        filter_files_at_copy = dicom_path_config.filter_files_at_copy if dicom_path_config else False
+        # Series held back as incomplete are copied again when their directory changes or the hold expires
+        max_hold = timedelta(minutes=dicom_path_config.incomplete_series_max_hold_minutes if dicom_path_config else 0)
         
         # Process each directory containing files
-        for source_dir in directories_with_files:
-            # Get directory stats
-            stats = os.stat(source_dir)
-            # Convert timestamps to timezone-aware datetimes
-            creation_time = timezone.make_aware(datetime.fromtimestamp(stats.st_ctime))
-            modification_time = timezone.make_aware(datetime.fromtimestamp(stats.st_mtime))
-            logger.info(f"Directory {source_dir} modification time: {modification_time} (timezone: {modification_time.tzinfo})")
+        with copy_pool:
+            for directory_record in directories_with_files:
+                source_dir = directory_record.path
+                # Get directory stats cached by the walker
+                stats = directory_record.stat
+                # Convert timestamps to timezone-aware datetimes
+                creation_time = timezone.make_aware(datetime.fromtimestamp(stats.st_ctime))
+                modification_time = timezone.make_aware(datetime.fromtimestamp(stats.st_mtime))
+                logger.info(f"Directory {source_dir} modification time: {modification_time} (timezone: {modification_time.tzinfo})")
             
-            # Check if directory exists in database and compare modification times
-            db_modification_time = None
-            try:
-                existing_entry = CopyDicomTaskModel.objects.get(source_directory=source_dir)
-                db_modification_time = existing_entry.source_directory_modification_date
-                # check if the copy_completed field is True. If so skip the directory.
-                if existing_entry.copy_completed and db_modification_time == modification_time:
-                    logger.debug(f"Skipping {source_dir} as it has been already copied and modification time hasn't changed")
-                    continue
-            except CopyDicomTaskModel.DoesNotExist:
-                # Directory not in database, will be processed
-                pass
+                # Check if directory exists in database and compare modification times
+                db_modification_time = None
+                existing_entry = existing_entries.get(source_dir)
+                if existing_entry is not None:
+                    db_modification_time = existing_entry.source_directory_modification_date
+                    # Files left out of an earlier copy whose label no longer skips them (the filter was turned off
+                    # or their modality is supported now) must be copied
+                    stale_skip_labels = [
+                        label for label in (existing_entry.skipped_file_counts or {})
+                        if not filter_files_at_copy or not is_import_skip_label(label)
+                    ]
+                    # check if the copy_completed field is True. If so skip the directory.
+                    if existing_entry.copy_completed and db_modification_time == modification_time and not stale_skip_labels:
+                        logger.debug(f"Skipping {source_dir} as it has been already copied and modification time hasn't changed")
+                        continue
+                # Directories not in the database will be processed
             
-            # Check modification time conditions
-            logger.debug(f"Modification time: {modification_time} for {source_dir}. DB modification time: {db_modification_time}")
-            if (modification_time >= pull_start_time and 
-                modification_time < ten_minutes_ago):
-                logger.info(f"Processing {source_dir} as it meets the modification time conditions")
-                # Calculate size of only the files directly in this directory (not in subdirectories)
-                total_size = 0
-                files_count = 0
-                for f in os.listdir(source_dir):
-                    file_path = os.path.join(source_dir, f)
-                    if os.path.isfile(file_path):
-                        total_size += os.path.getsize(file_path)
-                        files_count += 1
+                # Check modification time conditions and whether the files have settled
+                logger.debug(f"Modification time: {modification_time} for {source_dir}. DB modification time: {db_modification_time}")
+                ready = modification_time >= pull_start_time and stability_tracker.is_ready(directory_record, current_time)
+                if (
+                    ready
+                    and existing_entry is not None
+                    and existing_entry.incomplete_series_held_since is not None
+                    and existing_entry.incomplete_series_checked_at is not None
+                    and not stability_tracker.changed_since(source_dir, existing_entry.incomplete_series_checked_at)
+                    and current_time - existing_entry.incomplete_series_held_since < max_hold
+                ):
+                    logger.debug(f"Skipping {source_dir} as its files have not changed since its incomplete series was held back")
+                    continue
+                if ready:
+                    logger.info(f"Processing {source_dir} as it meets the modification time conditions and its files have settled")
+                    # Directories the walk took from the scan index are only listed once they are copied
+                    try:
+                        source_files = directory_record.get_files()
+                    except DatastoreUnavailableError as e:
+                        # Listing the directory timed out, keep what was copied so far and stop
+                        logger.error(f"Stopping the copy as the datastore became unavailable: {str(e)}")
+                        record_mount_failure(mount_health, e, current_time, datastore_io)
+                        result['status'] = 'partial_failure'
+                        break
+                    # Manifest of the files copied by the previous passes over this directory
+                    previous_manifest = existing_entry.file_manifest if existing_entry is not None else {}
+                    # Prepare the database entry, it is written together with the others at the end of the run
+                    dicom_dir = existing_entry or CopyDicomTaskModel(source_directory=source_dir)
+                    dicom_dir.source_directory_creation_date = creation_time
+                    dicom_dir.source_directory_modification_date = modification_time
+                    dicom_dir.task_id = task_id
+                    dicom_dir.copy_completed = True
+                    # Calculate size of only the files directly in this directory (not in subdirectories)
+                    total_size = sum(file_record.size for file_record in source_files)
+                    files_count = len(source_files)
+
+                    # Only copy the files which are new or changed since the last copy of the directory,
+                    # e.g. a late slice or an RTSTRUCT written into the directory, instead of the whole directory.
+                    # Series preparation completes their series with the files archived by the earlier copies.
+                    files_to_copy, file_manifest = get_changed_files(source_files, previous_manifest, hash_copied_files)
+                    # Files left out of an earlier copy are kept in the manifest with their label and checked again
+                    # once the label no longer skips them
+                    for file_record in source_files:
+                        skip_label = file_manifest[file_record.name].get('skipped')
+                        if skip_label and (not filter_files_at_copy or not is_import_skip_label(skip_label)):
+                            file_manifest[file_record.name] = build_manifest_entry(file_record)
+                            files_to_copy.append(file_record)
+                    # Files which series preparation rejected before (not DICOM, unsupported modality...) are not
+                    # copied again while they are unchanged
+                    rejected_file_cache.load([file_record.path for file_record in files_to_copy])
+                    rejected_paths = {
+                        file_record.path for file_record in files_to_copy
+                        if rejected_file_cache.is_rejected(file_record.path, file_record.size, file_record.modification_time)
+                    }
+                    if rejected_paths:
+                        logger.info(f"Not copying {len(rejected_paths)} files of {source_dir} which were rejected before")
+                        files_to_copy = [file_record for file_record in files_to_copy if file_record.path not in rejected_paths]
+                    if filter_files_at_copy and files_to_copy:
+                        # Leave out files which are not images series preparation imports (RTDOSE, RTPLAN, SR...).
+                        # Their manifest entry records the label, they are not checked again while they are
+                        # unchanged and the label still skips them.
+                        skip_labels = copy_pool.map(get_copy_skip_label, files_to_copy)
+                        for file_record, label in zip(files_to_copy, skip_labels):
+                            if label is not None:
+                                file_manifest[file_record.name]['skipped'] = label
+                        if any(label is not None for label in skip_labels):
+                            logger.info(f"Not copying {sum(label is not None for label in skip_labels)} files of {source_dir}: {dict(Counter(label for label in skip_labels if label is not None))}")
+                            files_to_copy = [
+                                file_record for file_record, label in zip(files_to_copy, skip_labels) if label is None
+                            ]
+                    dicom_dir.skipped_file_counts = dict(Counter(
+                        entry['skipped'] for entry in file_manifest.values() if entry.get('skipped')
+                    ))
+                    if files_count > 0 and not files_to_copy:
+                        logger.info(f"Skipping copy of {source_dir} as none of its {files_count} files are new or changed")
+                        dicom_dir.source_directory_size = total_size
+                        dicom_dir.file_manifest = file_manifest
+                        copy_task_entries.append(dicom_dir)
+                        continue
                 
-                # Create a unique directory name using UUID
-                unique_dir_name = str(uuid.uuid4())
-                # Get the source directory name to add to the unique name for better identification
-                source_dir_name = os.path.basename(source_dir)
-                unique_dir_with_name = f"{unique_dir_name}_{source_dir_name}"
+                    # Create a unique directory name using UUID
+                    unique_dir_name = str(uuid.uuid4())
+                    # Get the source directory name to add to the unique name for better identification
+                    source_dir_name = os.path.basename(source_dir)
+                    unique_dir_with_name = f"{unique_dir_name}_{source_dir_name}"
                 
-                target_dir = os.path.join(target_path, unique_dir_with_name)
+                    target_dir = os.path.join(target_path, unique_dir_with_name)
                 
-                # Create target directory if it doesn't exist
-                os.makedirs(target_dir, exist_ok=True)
+                    # Create target directory if it doesn't exist
+                    os.makedirs(target_dir, exist_ok=True)
                 
-                # For directories with files, copy them
-                if files_count > 0:
-                    logger.info(f"Directory {source_dir}: Size={total_size}, Modified={modification_time}, Files={files_count}")
+                    # For directories with files, copy them
+                    if files_count > 0:
+                        logger.info(f"Directory {source_dir}: Size={total_size}, Modified={modification_time}, Files={files_count}, New or changed files={len(files_to_copy)}")
                     
-                    try:
-                        # Store directory information in database
-                        dicom_dir, created = CopyDicomTaskModel.objects.update_or_create(
-                            source_directory = source_dir,
-                            defaults={
-                                'source_directory_creation_date': creation_time,
-                                'source_directory_modification_date': modification_time,
-                                'source_directory_size': total_size,
-                                'target_directory': target_dir,
-                                'task_id': task_id,
-                                'copy_completed': True
-                            }
-                        )
-                        logger.info(f"Created/Updated database entry for {source_dir}")
-                        
-                        # Copy only the files directly in this directory
-                        files_copied = 0
-                        for item in os.listdir(source_dir):
-                            source_item = os.path.join(source_dir, item)
-                            # Only copy files, not subdirectories
-                            if os.path.isfile(source_item):
-                                target_file = os.path.join(target_dir, item)
-                                shutil.copyfile(source_item, target_file)
-                                logger.info(f"Copied file {source_item} to {target_file}")
-                                files_copied += 1
-                        
-                        result['target_paths'].append(target_dir)
-                        result['copy_dicom_task_id'].append(str(dicom_dir.id))  # Convert UUID to string
-                        logger.info(f"Successfully copied {files_copied} files from {source_dir} to {target_dir}")
+                        try:
+                            # Copy only the new or changed files directly in this directory
+                            copy_statistics = copy_pool.copy_files(files_to_copy, target_dir)
+                            run_statistics.add(copy_statistics)
+                            if hash_copied_files:
+                                add_file_hashes(file_manifest, files_to_copy, target_dir)
+
+                            # Store directory information in database once the copy is complete
+                            dicom_dir.source_directory_size = total_size
+                            dicom_dir.target_directory = target_dir
+                            dicom_dir.file_manifest = file_manifest
+                            # Record the strategy used for most of the files and the throughput of the copy
+                            dicom_dir.copy_strategy = copy_statistics.most_common_strategy
+                            dicom_dir.files_copied = copy_statistics.files_copied
+                            dicom_dir.bytes_copied = copy_statistics.bytes_copied
+                            dicom_dir.copy_duration_seconds = copy_statistics.duration_seconds
+                            dicom_dir.copy_files_per_second = copy_statistics.files_per_second
+                            dicom_dir.copy_megabytes_per_second = copy_statistics.megabytes_per_second
+                            copy_task_entries.append(dicom_dir)
+
+                            result['target_paths'].append(target_dir)
+                            result['copy_dicom_task_id'].append(str(dicom_dir.id))  # Convert UUID to string
+                            logger.info(f"Successfully copied {source_dir} to {target_dir}: {copy_statistics}")
                         
-                    except Exception as e:
-                        logger.error(f"Error copying directory {source_dir}: {str(e)}")
-                        result['status'] = 'partial_failure'
-                else:
-                    # Still create an entry for directories without direct files but with subdirectories containing files
-                    # This ensures the directory structure is maintained
-                    try:
-                        dicom_dir, created = CopyDicomTaskModel.objects.update_or_create(
-                            source_directory = source_dir,
-                            defaults={
-                                'source_directory_creation_date': creation_time,
-                                'source_directory_modification_date': modification_time,
-                                'source_directory_size': 0,  # No direct files
-                                'target_directory': target_dir,
-                                'task_id': task_id,
-                                'copy_completed': True
-                            }
-                        )
+                        except Exception as e:
+                            logger.error(f"Error copying directory {source_dir}: {str(e)}")
+                            result['status'] = 'partial_failure'
+                    else:
+                        # Still create an entry for directories without direct files but with subdirectories containing files
+                        # This ensures the directory structure is maintained
+                        dicom_dir.source_directory_size = 0  # No direct files
+                        dicom_dir.target_directory = target_dir
+                        copy_task_entries.append(dicom_dir)
                         logger.info(f"Created directory structure entry for {source_dir} (no direct files)")
-                    except Exception as e:
-                        logger.error(f"Error creating directory structure entry for {source_dir}: {str(e)}")
-                        # Continue processing other directories
-            else:
-                logger.debug(f"Skipping {source_dir} due to modification time constraints")
+                else:
+                    logger.debug(f"Skipping {source_dir} due to modification time constraints")
+
+        logger.info(f"Copied with {copy_concurrency} workers: {run_statistics}")
+
+        # Write all database entries in one transaction
+        stability_tracker.save()
+        save_copy_tasks(copy_task_entries)
         
         logger.info(f"DICOM copy process completed with status {result}")
 
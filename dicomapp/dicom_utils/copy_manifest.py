@@ -0,0 +1,76 @@
+from logging import getLogger
+import hashlib
+import os
+
+logger = getLogger(__name__)
+
+
+def calculate_file_hash(file_path):
+    """Calculate the SHA-256 hash of a file."""
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def build_manifest_entry(file_record, file_hash=None):
+    """Return the manifest entry (size, mtime and optional hash) stored for a FileRecord."""
+    entry = {'size': file_record.size, 'mtime': file_record.modification_time}
+    if file_hash:
+        entry['hash'] = file_hash
+    return entry
+
+
+def get_changed_files(file_records, manifest, hash_files=False):
+    """
+    Compare the files of a source directory with the manifest of the last copy.
+
+    A file is new or changed when its name is not in the manifest or its size or modification time differ.
+    When hash_files is True and only the modification time of a file moved, the file is hashed and
+    compared with the stored hash so that files which were only touched are not copied again.
+
+    Args:
+        file_records (list): FileRecords (see datastore_scan.py) of the files currently in the directory.
+        manifest (dict): The manifest of the last copy, mapping file name to {'size', 'mtime', 'hash'}.
+        hash_files (bool): Whether to compare hashes of files whose modification time changed.
+
+    Returns:
+        tuple: (changed_files, new_manifest) where changed_files is the list of FileRecords to copy and
+        new_manifest is the manifest describing the current files. Files which were removed from the
+        directory are dropped from the manifest.
+    """
+    manifest = manifest or {}
+    changed_files = []
+    new_manifest = {}
+    for file_record in file_records:
+        previous = manifest.get(file_record.name)
+        if previous is not None and previous.get('size') == file_record.size:
+            if previous.get('mtime') == file_record.modification_time:
+                new_manifest[file_record.name] = previous
+                continue
+            if hash_files and previous.get('hash'):
+                try:
+                    file_hash = calculate_file_hash(file_record.path)
+                except OSError as e:
+                    logger.warning(f"Could not hash {file_record.path}: {str(e)}")
+                    file_hash = None
+                if file_hash == previous['hash']:
+                    logger.debug(f"Skipping {file_record.path} as only its modification time changed")
+                    new_manifest[file_record.name] = build_manifest_entry(file_record, file_hash)
+                    continue
+        changed_files.append(file_record)
+        new_manifest[file_record.name] = build_manifest_entry(file_record)
+    return changed_files, new_manifest
+
+
+def add_file_hashes(manifest, file_records, target_dir):
+    """
+    Store the hashes of copied files in the manifest.
+    The hash is calculated from the copy in the target directory so that the datastore is not read twice.
+    """
+    for file_record in file_records:
+        try:
+            manifest[file_record.name]['hash'] = calculate_file_hash(os.path.join(target_dir, file_record.name))
+        except OSError as e:
+            logger.warning(f"Could not hash {file_record.name} in {target_dir}: {str(e)}")
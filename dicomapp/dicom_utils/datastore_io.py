@@ -0,0 +1,205 @@
+from dicomapp.models import DatastoreHealthModel
+from logging import getLogger
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from datetime import timedelta
+import errno
+import os
+import queue
+import threading
+import time
+
+logger = getLogger(__name__)
+
+# Number of threads which run datastore metadata calls. A call which hangs on a stalled mount keeps its thread,
+# so the threads are daemon threads that never block the shutdown of the worker.
+DEADLINE_WORKERS = 32
+
+# Backoff after a datastore mount failed: 1, 2, 4 ... minutes up to 30 minutes
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(minutes=30)
+
+
+class DatastoreUnavailableError(OSError):
+    """Raised when a datastore metadata call did not return within the deadline or the mount is in backoff."""
+
+
+class _DeadlineRunner:
+    """A pool of daemon threads running the calls submitted by DatastoreIO. Threads are started on demand."""
+    def __init__(self, workers):
+        self.workers = workers
+        self._queue = queue.Queue()
+        self._threads = 0
+        self._idle = 0
+        self._lock = threading.Lock()
+
+    def submit(self, function, *args, **kwargs):
+        with self._lock:
+            if self._idle > 0:
+                # An idle thread will pick up the call
+                self._idle -= 1
+            elif self._threads < self.workers:
+                self._threads += 1
+                threading.Thread(target=self._work, name=f"datastore_io_{self._threads}", daemon=True).start()
+        future = Future()
+        self._queue.put((future, function, args, kwargs))
+        return future
+
+    def _work(self):
+        while True:
+            future, function, args, kwargs = self._queue.get()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(function(*args, **kwargs))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self._lock:
+                self._idle += 1
+
+
+_runner = _DeadlineRunner(DEADLINE_WORKERS)
+
+
+class DatastoreIO:
+    """
+    Runs metadata calls (stat, directory listings) on the datastore under a deadline.
+
+    A stalled NFS/SMB mount makes these calls block forever. Here each call runs on a daemon thread and the caller
+    only waits for deadline_seconds. Once a call timed out every further call raises DatastoreUnavailableError
+    immediately, so a scan of a stalled mount ends after a single deadline instead of blocking the Celery worker.
+    The latency of every completed call is recorded for the run.
+
+    Args:
+        deadline_seconds (float): The maximum time to wait for a single call.
+    """
+    def __init__(self, deadline_seconds):
+        self.deadline_seconds = deadline_seconds
+        self.latencies = []
+        self.error = None
+
+    @property
+    def timed_out(self):
+        return self.error is not None
+
+    def call(self, function, *args, **kwargs):
+        """Run function(*args, **kwargs) under the deadline and return its result."""
+        if self.error is not None:
+            raise DatastoreUnavailableError(errno.ETIMEDOUT, f"Datastore is unavailable: {self.error}")
+        start = time.perf_counter()
+        future = _runner.submit(function, *args, **kwargs)
+        try:
+            result = future.result(timeout=self.deadline_seconds)
+        except FutureTimeoutError:
+            future.cancel()
+            self.error = f"{getattr(function, '__name__', function)}{args} did not return within {self.deadline_seconds}s"
+            logger.error(f"Datastore metadata call timed out: {self.error}")
+            raise DatastoreUnavailableError(errno.ETIMEDOUT, self.error)
+        except OSError:
+            self.latencies.append(time.perf_counter() - start)
+            raise
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    def stat(self, path):
+        return self.call(os.stat, path)
+
+    def latency_percentiles(self):
+        """
+        Return the latency percentiles of the calls made so far in milliseconds.
+
+        Returns:
+            dict: calls, p50_ms, p95_ms, p99_ms and max_ms. The percentiles are None if no call completed.
+        """
+        latencies = sorted(self.latencies)
+        percentiles = {'calls': len(latencies)}
+        for name, fraction in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99), ('max_ms', 1.0)):
+            if latencies:
+                position = min(len(latencies) - 1, max(0, int(round(fraction * len(latencies))) - 1))
+                percentiles[name] = round(latencies[position] * 1000, 3)
+            else:
+                percentiles[name] = None
+        return percentiles
+
+
+def get_mount_health(datastore_path):
+    """Return the DatastoreHealthModel entry of the datastore, creating it if required."""
+    health, _ = DatastoreHealthModel.objects.get_or_create(datastore_path=str(datastore_path))
+    return health
+
+
+def mount_in_backoff(health, now):
+    """True if the mount failed recently and must not be scanned before health.unavailable_until."""
+    return health.unavailable_until is not None and health.unavailable_until > now
+
+
+def resolve_datastore_path(path_config, now):
+    """
+    Return the resolved datastore path of the DicomPathConfig without blocking on a stalled mount.
+
+    Resolving the path touches the mount, so it is not attempted while the mount is in backoff and otherwise runs
+    under the datastore deadline. A timeout is recorded as a failure of the mount. The DatastoreHealthModel entry
+    is kept under the configured path, which is known without touching the mount.
+
+    Args:
+        path_config (DicomPathConfig): The configuration with the datastore path.
+        now (datetime): The current time.
+
+    Returns:
+        Path: The resolved datastore path, None if no datastore path is configured.
+
+    Raises:
+        DatastoreUnavailableError: If the mount is in backoff or did not respond within the deadline.
+    """
+    if not path_config.datastorepath:
+        return None
+    health = get_mount_health(path_config.datastorepath)
+    if mount_in_backoff(health, now):
+        raise DatastoreUnavailableError(
+            errno.EAGAIN,
+            f"Datastore {path_config.datastorepath} is unavailable until {health.unavailable_until}: {health.last_error}"
+        )
+    datastore_io = DatastoreIO(path_config.datastore_io_timeout_seconds)
+    try:
+        return datastore_io.call(path_config.get_safe_path)
+    except DatastoreUnavailableError as e:
+        record_mount_failure(health, e, now, datastore_io)
+        raise
+
+
+def record_mount_failure(health, error, now, datastore_io=None):
+    """Mark the mount as unhealthy and set the time until which it is not scanned again."""
+    health.healthy = False
+    health.consecutive_failures += 1
+    backoff = min(BACKOFF_BASE * (2 ** (health.consecutive_failures - 1)), BACKOFF_MAX)
+    health.unavailable_until = now + backoff
+    health.last_error = str(error)
+    health.last_checked_at = now
+    if datastore_io is not None:
+        set_mount_latency(health, datastore_io)
+    health.save()
+    logger.error(f"Datastore {health.datastore_path} is unavailable ({health.consecutive_failures} consecutive failures), not scanning it until {health.unavailable_until}: {error}")
+
+
+def record_mount_success(health, datastore_io, now):
+    """Mark the mount as healthy and store the latency percentiles of the run."""
+    if not health.healthy:
+        logger.info(f"Datastore {health.datastore_path} recovered after {health.consecutive_failures} failures")
+    health.healthy = True
+    health.consecutive_failures = 0
+    health.unavailable_until = None
+    health.last_error = ''
+    health.last_checked_at = now
+    set_mount_latency(health, datastore_io)
+    health.save()
+
+
+def set_mount_latency(health, datastore_io):
+    percentiles = datastore_io.latency_percentiles()
+    health.metadata_calls = percentiles['calls']
+    health.latency_p50_ms = percentiles['p50_ms']
+    health.latency_p95_ms = percentiles['p95_ms']
+    health.latency_p99_ms = percentiles['p99_ms']
+    health.latency_max_ms = percentiles['max_ms']
+    logger.info(
+        f"Datastore {health.datastore_path} metadata latency over {percentiles['calls']} calls: "
+        f"p50={percentiles['p50_ms']}ms p95={percentiles['p95_ms']}ms p99={percentiles['p99_ms']}ms max={percentiles['max_ms']}ms"
+    )
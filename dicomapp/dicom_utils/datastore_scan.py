@@ -0,0 +1,296 @@
+from dicomapp.models import DatastoreScanIndexModel
+from dicomapp.dicom_utils.datastore_io import DatastoreUnavailableError
+from logging import getLogger
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+from django.db.models import Q
+from django.utils import timezone
+
+logger = getLogger(__name__)
+
+
+# A file directly inside a datastore directory, built from the cached DirEntry stat
+FileRecord = namedtuple('FileRecord', ['name', 'path', 'size', 'modification_time'])
+
+# An immediate subdirectory found while listing a directory. stat is None if the subdirectory could not be stat'ed.
+SubdirectoryRecord = namedtuple('SubdirectoryRecord', ['name', 'path', 'stat'])
+
+
+def run_datastore_call(datastore_io, function, *args):
+    """Run a metadata call under the deadline of datastore_io (see datastore_io.py) if one is given."""
+    if datastore_io is None:
+        return function(*args)
+    return datastore_io.call(function, *args)
+
+
+class DirectoryRecord:
+    """
+    A directory found while walking the datastore.
+
+    Holds the stat result of the directory itself and, when the directory was listed during the walk,
+    the records of the files directly inside it. When the walk reused the scan index for the directory
+    the files are not known yet and are listed on the first call to get_files().
+    """
+    def __init__(self, path, stat_result, file_count, total_size, subdirectories, files=None, datastore_io=None):
+        self.path = path
+        self.stat = stat_result
+        self.file_count = file_count
+        self.total_size = total_size
+        self.subdirectories = subdirectories
+        self.files = files
+        self.datastore_io = datastore_io
+
+    @property
+    def modification_time(self):
+        return self.stat.st_mtime
+
+    @property
+    def creation_time(self):
+        return self.stat.st_ctime
+
+    @property
+    def listed(self):
+        """True if the directory was listed during the walk rather than taken from the scan index."""
+        return self.files is not None
+
+    def get_files(self):
+        """Return the FileRecords for the files directly inside the directory, listing it if required."""
+        if self.files is None:
+            files, _ = run_datastore_call(self.datastore_io, list_directory, self.path)
+            self.files = files
+            self.file_count = len(files)
+            self.total_size = sum(file_record.size for file_record in files)
+        return self.files
+
+    def __repr__(self):
+        return f"DirectoryRecord({self.path!r}, files={self.file_count})"
+
+
+def list_directory(dir_path):
+    """
+    List the immediate contents of a single directory with one os.scandir call.
+    The subdirectories are stat'ed here as well so that all metadata calls for the directory run under the
+    same deadline when the listing is run through a DatastoreIO.
+
+    Args:
+        dir_path (str): The directory to list.
+
+    Returns:
+        tuple: (files, subdirectories) where files is a list of FileRecords for the files directly inside the
+        directory and subdirectories is a list of SubdirectoryRecords for the immediate subdirectories.
+    """
+    files = []
+    subdirectories = []
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            try:
+                # Symlinked directories are not followed, same as Path.glob('**/')
+                if entry.is_dir(follow_symlinks=False):
+                    try:
+                        subdirectory_stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        subdirectory_stat = None
+                    subdirectories.append(SubdirectoryRecord(entry.name, entry.path, subdirectory_stat))
+                elif entry.is_file():
+                    entry_stat = entry.stat()
+                    files.append(FileRecord(entry.name, entry.path, entry_stat.st_size, entry_stat.st_mtime))
+            except OSError as e:
+                logger.warning(f"Could not read {entry.path}: {str(e)}")
+    return files, subdirectories
+
+
+def walk_datastore(base_path, index=None, recursive=True, datastore_io=None):
+    """
+    Walk the datastore in a single pass and yield a DirectoryRecord for every directory, the base path included.
+
+    Each directory is stat'ed once. The stat of a subdirectory is taken from the DirEntry returned when its parent
+    was listed, so no separate stat call is made for it. When an index entry (see DatastoreScanIndexModel) exists
+    for a directory and its modification time has not moved, the stored file count and subdirectory names are
+    reused and the directory is not listed again.
+
+    Args:
+        base_path (str): The path to the datastore directory.
+        index (dict): Optional mapping of directory path to DatastoreScanIndexModel entries.
+        recursive (bool): If False only the record for base_path itself is yielded.
+        datastore_io (DatastoreIO): Optional, runs the stat and listing calls under a deadline.
+
+    Yields:
+        DirectoryRecord: One record per directory. Records taken from the index have files set to None.
+    """
+    index = index or {}
+    stack = [(str(base_path), None)]
+    while stack:
+        dir_path, dir_stat = stack.pop()
+        if dir_stat is None:
+            try:
+                dir_stat = run_datastore_call(datastore_io, os.stat, dir_path)
+            except OSError as e:
+                logger.warning(f"Could not stat directory {dir_path}: {str(e)}")
+                continue
+
+        entry = index.get(dir_path)
+        if entry is None or entry.directory_modification_time != dir_stat.st_mtime:
+            try:
+                files, subdirectory_entries = run_datastore_call(datastore_io, list_directory, dir_path)
+            except OSError as e:
+                logger.warning(f"Could not list directory {dir_path}: {str(e)}")
+                files = None
+            if files is not None:
+                for subdirectory in subdirectory_entries if recursive else []:
+                    stack.append((subdirectory.path, subdirectory.stat))
+                yield DirectoryRecord(
+                    dir_path, dir_stat, len(files), sum(file_record.size for file_record in files),
+                    sorted(subdirectory.name for subdirectory in subdirectory_entries), files, datastore_io
+                )
+                continue
+            if entry is None:
+                continue
+            # The listing failed, fall back to the stale index entry so that its subtree is still walked
+
+        if recursive:
+            stack.extend((os.path.join(dir_path, name), None) for name in entry.subdirectories)
+        yield DirectoryRecord(dir_path, dir_stat, entry.file_count, entry.total_size, entry.subdirectories, datastore_io=datastore_io)
+
+
+def walk_datastore_concurrently(roots, index, concurrency, datastore_io=None):
+    """
+    Walk datastore subtrees with a bounded thread pool.
+
+    Metadata calls on a network share are latency bound rather than bandwidth bound, so walking independent
+    subtrees concurrently scales the scan throughput with the number of workers. When a single root is given
+    the root itself is listed first and its top-level subdirectories are walked concurrently.
+
+    Args:
+        roots (list): The directories to walk.
+        index (dict): Mapping of directory path to DatastoreScanIndexModel entries.
+        concurrency (int): The maximum number of concurrent walkers.
+        datastore_io (DatastoreIO): Optional, runs the metadata calls under a deadline.
+
+    Returns:
+        list: The DirectoryRecords of all walked directories in no particular order.
+    """
+    directories = []
+    if len(roots) == 1:
+        directories.extend(walk_datastore(roots[0], index, recursive=False, datastore_io=datastore_io))
+        if not directories:
+            return directories
+        roots = [os.path.join(roots[0], name) for name in directories[0].subdirectories]
+
+    if concurrency <= 1 or len(roots) <= 1:
+        for root in roots:
+            directories.extend(walk_datastore(root, index, datastore_io=datastore_io))
+        return directories
+
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(roots)), thread_name_prefix='datastore_scan') as executor:
+        for records in executor.map(lambda root: list(walk_datastore(root, index, datastore_io=datastore_io)), roots):
+            directories.extend(records)
+    return directories
+
+
+def get_scan_roots(base_path, source_directories):
+    """
+    Reduce a list of directories to the scan roots that need to be walked.
+    Directories outside the datastore are ignored and directories nested inside another listed directory are dropped
+    as they are covered by the walk of their ancestor.
+    """
+    base_path = os.path.normpath(base_path)
+    candidates = sorted({os.path.normpath(str(path)) for path in source_directories})
+    roots = []
+    for path in candidates:
+        if path != base_path and not path.startswith(base_path + os.sep):
+            logger.warning(f"Ignoring directory {path} as it is outside the datastore {base_path}")
+            continue
+        if any(path == root or path.startswith(root + os.sep) for root in roots):
+            continue
+        roots.append(path)
+    return roots
+
+
+def scan_datastore(base_path, source_directories=None, concurrency=1, datastore_io=None):
+    """
+    Walk the datastore and return a DirectoryRecord for every directory below the base path.
+
+    The walk is backed by the DatastoreScanIndexModel table. A directory's modification time only changes when
+    entries are added, removed or renamed directly inside it, so when the stored modification time matches
+    the current one the stored file count and subdirectory names are reused and the directory is not listed again.
+    Only directories whose modification time moved (or which are new) are listed. Unchanged subdirectories
+    still get a single stat call so that changes deeper in the tree are picked up.
+
+    At the end of the scan the index is updated with bulk writes and entries for directories that no longer
+    exist are removed.
+
+    When source_directories is given (for example by the datastore watcher) only the subtrees of those directories
+    are walked and no index entries are removed.
+
+    Top-level subtrees (or the source directories) are walked concurrently by up to concurrency threads.
+
+    When a DatastoreIO is given every metadata call runs under its deadline. If a call times out the scan is
+    aborted with DatastoreUnavailableError and the index is left untouched, as the walk is incomplete.
+
+    Args:
+        base_path (str): The path to the datastore directory.
+        source_directories (list): Optional list of directories inside the datastore to limit the scan to.
+        concurrency (int): The maximum number of subtrees walked concurrently.
+        datastore_io (DatastoreIO): Optional, runs the metadata calls under a deadline.
+
+    Returns:
+        list: A list of DirectoryRecords. The base path itself is included unless source_directories is given.
+
+    Raises:
+        DatastoreUnavailableError: If a metadata call did not return within the deadline.
+    """
+    base_path = str(base_path)
+    if source_directories:
+        roots = get_scan_roots(base_path, source_directories)
+    else:
+        roots = [base_path]
+
+    index = {}
+    for root in roots:
+        # The separator keeps sibling trees out, e.g. /data/ds2 for the root /data/ds
+        index.update(
+            (entry.directory_path, entry)
+            for entry in DatastoreScanIndexModel.objects.filter(
+                Q(directory_path=root) | Q(directory_path__startswith=root.rstrip(os.sep) + os.sep)
+            )
+        )
+    logger.info(f"Loaded {len(index)} scan index entries for {len(roots)} scan roots in {base_path}")
+
+    directories = walk_datastore_concurrently(roots, index, concurrency, datastore_io)
+    if datastore_io is not None and datastore_io.timed_out:
+        raise DatastoreUnavailableError(f"Scan of {base_path} aborted: {datastore_io.error}")
+    new_entries = []
+    changed_entries = []
+    for record in directories:
+        if not record.listed:
+            continue
+        entry = index.get(record.path)
+        if entry is None:
+            entry = DatastoreScanIndexModel(directory_path=record.path)
+            new_entries.append(entry)
+        else:
+            entry.updated_at = timezone.now()
+            changed_entries.append(entry)
+        entry.directory_modification_time = record.modification_time
+        entry.file_count = record.file_count
+        entry.total_size = record.total_size
+        entry.subdirectories = record.subdirectories
+
+    logger.info(f"Scanned {len(directories)} directories, listed {len(new_entries) + len(changed_entries)} new or modified directories")
+
+    # Persist the index
+    DatastoreScanIndexModel.objects.bulk_create(new_entries, batch_size=500)
+    DatastoreScanIndexModel.objects.bulk_update(
+        changed_entries,
+        ['directory_modification_time', 'file_count', 'total_size', 'subdirectories', 'updated_at'],
+        batch_size=500
+    )
+    # Only prune the index after a full scan for which the datastore root itself was reachable
+    seen = {record.path for record in directories}
+    stale_ids = [entry.id for path, entry in index.items() if path not in seen] if roots == [base_path] and base_path in seen else []
+    if stale_ids:
+        DatastoreScanIndexModel.objects.filter(id__in=stale_ids).delete()
+        logger.info(f"Removed {len(stale_ids)} scan index entries for directories that no longer exist")
+
+    return directories
@@ -0,0 +1,131 @@
+from logging import getLogger
+import os
+import threading
+import time
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+logger = getLogger(__name__)
+
+# Filesystems on which changes made by other machines are not reported as filesystem events.
+# Datastores on these mounts are scanned periodically instead.
+NETWORK_FILESYSTEM_TYPES = {'cifs', 'smb3', 'smbfs', 'nfs', 'nfs4', 'fuse.sshfs', 'fuse.rclone', '9p', 'davfs'}
+
+def get_filesystem_type(path):
+    """
+    Return the filesystem type of the mount containing the path as listed in /proc/mounts.
+    Returns None if the mount table is not available (non Linux systems).
+    """
+    try:
+        with open('/proc/mounts') as f:
+            mounts = [line.split() for line in f]
+    except OSError:
+        return None
+
+    path = os.path.realpath(str(path))
+    filesystem_type = None
+    longest_mount_point = -1
+    for fields in mounts:
+        if len(fields) < 3:
+            continue
+        # Spaces in mount points are escaped as \040 in /proc/mounts
+        mount_point = fields[1].replace('\\040', ' ')
+        if path == mount_point or path.startswith(mount_point.rstrip('/') + '/'):
+            if len(mount_point) > longest_mount_point:
+                filesystem_type = fields[2]
+                longest_mount_point = len(mount_point)
+    return filesystem_type
+
+
+def filesystem_events_supported(path):
+    """
+    Check whether filesystem events can be relied upon for the datastore path.
+    Returns False if watchdog is not installed or the datastore is on a network filesystem.
+    """
+    if Observer is None:
+        logger.warning("The watchdog package is not installed, filesystem events are not available")
+        return False
+    filesystem_type = get_filesystem_type(path)
+    if filesystem_type in NETWORK_FILESYSTEM_TYPES:
+        logger.warning(f"Datastore {path} is on a {filesystem_type} mount which does not deliver filesystem events")
+        return False
+    return True
+
+
+class TouchedDirectoryHandler(FileSystemEventHandler):
+    """Records the directory affected by each filesystem event with the DatastoreWatcher."""
+    def __init__(self, watcher):
+        super().__init__()
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        # Reads do not change anything in the datastore
+        if event.event_type in ('opened', 'closed_no_write'):
+            return
+        if event.is_directory and event.event_type == 'modified':
+            # The listing of this directory changed
+            self.watcher.touch(event.src_path)
+            return
+        # A file was created, written, deleted or moved, or a directory was created, deleted or moved.
+        # In both cases the listing of the parent directory changed.
+        self.watcher.touch(os.path.dirname(event.src_path))
+        dest_path = getattr(event, 'dest_path', None)
+        if dest_path:
+            self.watcher.touch(os.path.dirname(dest_path))
+
+
+class DatastoreWatcher:
+    """
+    Watches the datastore for filesystem events and collects the directories which were touched.
+    A directory is handed out by pop_settled_directories() once no event was seen for it for the quiescence window.
+    It is then handed out once more after another quiescence window without events, so that the stability
+    tracker of copy_dicom sees two consecutive scans of the directory.
+    """
+    def __init__(self, datastore_path, quiescence_seconds):
+        self.datastore_path = str(datastore_path)
+        self.quiescence_seconds = quiescence_seconds
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._observer = None
+
+    def touch(self, directory):
+        with self._lock:
+            # (time of the last event, whether the next hand out is the confirmation scan)
+            self._pending[directory] = (time.monotonic(), False)
+
+    def start(self):
+        self._observer = Observer()
+        self._observer.schedule(TouchedDirectoryHandler(self), self.datastore_path, recursive=True)
+        self._observer.start()
+        logger.info(f"Watching {self.datastore_path} for filesystem events")
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def is_alive(self):
+        return self._observer is not None and self._observer.is_alive()
+
+    def pop_settled_directories(self):
+        """
+        Return the touched directories which have been quiet for the quiescence window.
+        Directories handed out for the first time are kept for a confirmation hand out, the others are forgotten.
+        """
+        now = time.monotonic()
+        with self._lock:
+            settled = [
+                directory for directory, (last_event, _) in self._pending.items()
+                if now - last_event >= self.quiescence_seconds
+            ]
+            for directory in settled:
+                _, confirmation = self._pending.pop(directory)
+                if not confirmation:
+                    self._pending[directory] = (now, True)
+        return settled
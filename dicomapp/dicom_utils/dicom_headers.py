@@ -0,0 +1,299 @@
+from logging import getLogger
+import io
+import struct
+import threading
+import pydicom
+from pydicom.tag import Tag
+from billiard.pool import Pool
+
+logger = getLogger(__name__)
+
+# The worker pool of this process, see get_process_pool()
+_process_pool = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+
+# The attributes series_preparation needs to group files into series
+SERIES_PREPARATION_TAGS = [
+    'PatientID',
+    'PatientName',
+    'PatientSex',
+    'StudyDate',
+    'Modality',
+    'StudyInstanceUID',
+    'ProtocolName',
+    'SeriesInstanceUID',
+    'SeriesDescription',
+    'InstanceNumber',
+    'ImagePositionPatient',
+    'ImageOrientationPatient',
+    'ImageType',
+    'SOPClassUID',
+    'SOPInstanceUID',
+]
+
+# Result of sniff_dicom_file()
+DICOM_PART10 = 'part10'
+DICOM_RAW_IMPLICIT_VR = 'raw_implicit_vr'
+DICOM_RAW_EXPLICIT_VR = 'raw_explicit_vr'
+# The file could not be read, e.g. a transient error of the filesystem. It may well be a DICOM file.
+DICOM_UNREADABLE = 'unreadable'
+
+# A DICOM file starts with a 128 byte preamble followed by b'DICM'
+DICOM_PREAMBLE_LENGTH = 128
+DICOM_PREFIX = b'DICM'
+
+# The groups a data set written without the preamble can start with: command, file meta, directory,
+# identifying and patient information.
+RAW_DATASET_FIRST_GROUPS = (0x0000, 0x0002, 0x0004, 0x0008, 0x0010)
+
+# Value representations of explicit VR data sets
+EXPLICIT_VRS = frozenset(vr.encode('ascii') for vr in (
+    'AE', 'AS', 'AT', 'CS', 'DA', 'DS', 'DT', 'FD', 'FL', 'IS', 'LO', 'LT', 'OB', 'OD', 'OF', 'OL', 'OV', 'OW',
+    'PN', 'SH', 'SL', 'SQ', 'SS', 'ST', 'SV', 'TM', 'UC', 'UI', 'UL', 'UN', 'UR', 'US', 'UT', 'UV',
+))
+
+# The values of the first elements of a data set are short, a larger implicit VR length means the bytes are not DICOM
+MAXIMUM_FIRST_ELEMENT_LENGTH = 0x10000
+UNDEFINED_LENGTH = 0xFFFFFFFF
+
+
+def sniff_dicom_bytes(head):
+    """
+    Classify the first bytes of a file as DICOM or not, see sniff_dicom_file().
+
+    Args:
+        head (bytes): The first 132 bytes of the file (fewer if the file is shorter).
+
+    Returns:
+        str: DICOM_PART10, DICOM_RAW_IMPLICIT_VR, DICOM_RAW_EXPLICIT_VR or None if the bytes are not DICOM.
+    """
+    if head[DICOM_PREAMBLE_LENGTH:DICOM_PREAMBLE_LENGTH + 4] == DICOM_PREFIX:
+        return DICOM_PART10
+    if len(head) < 8:
+        return None
+
+    # Without the preamble the file must start with the tag of the first element (little endian)
+    group, _ = struct.unpack('<HH', head[:4])
+    if group not in RAW_DATASET_FIRST_GROUPS:
+        return None
+    if head[4:6] in EXPLICIT_VRS:
+        return DICOM_RAW_EXPLICIT_VR
+    (length,) = struct.unpack('<I', head[4:8])
+    if length == UNDEFINED_LENGTH or length < MAXIMUM_FIRST_ELEMENT_LENGTH:
+        return DICOM_RAW_IMPLICIT_VR
+    return None
+
+
+def sniff_dicom_file(file_path):
+    """
+    Check whether a file is a DICOM file by reading its first 132 bytes.
+
+    This is much cheaper than a failing pydicom.dcmread, so files like thumbnails, .DS_Store files or PDFs
+    are rejected before they reach pydicom. Files with the DICM prefix are DICOM_PART10 files which
+    pydicom reads without force. Files without the preamble are classified from the tag of their first
+    element and can only be read with force=True.
+
+    Args:
+        file_path (str): The file to check.
+
+    Returns:
+        str: DICOM_PART10, DICOM_RAW_IMPLICIT_VR, DICOM_RAW_EXPLICIT_VR, DICOM_UNREADABLE if the file cannot
+            be read or None if the file is not a DICOM file.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            head = f.read(DICOM_PREAMBLE_LENGTH + len(DICOM_PREFIX))
+    except OSError as e:
+        logger.warning(f"Could not read {file_path}: {str(e)}")
+        return DICOM_UNREADABLE
+    return sniff_dicom_bytes(head)
+
+
+# Modalities series preparation imports
+SUPPORTED_MODALITIES = ['CT', 'MR', 'PT', 'US']
+
+# SOP classes which never hold images to segment: RT objects, structured reports and encapsulated documents
+NON_IMAGE_SOP_CLASSES = {
+    '1.2.840.10008.5.1.4.1.1.481.1': 'RTIMAGE',
+    '1.2.840.10008.5.1.4.1.1.481.2': 'RTDOSE',
+    '1.2.840.10008.5.1.4.1.1.481.3': 'RTSTRUCT',
+    '1.2.840.10008.5.1.4.1.1.481.4': 'RTBEAMSTREATMENTRECORD',
+    '1.2.840.10008.5.1.4.1.1.481.5': 'RTPLAN',
+    '1.2.840.10008.5.1.4.1.1.481.8': 'RTIONPLAN',
+    '1.2.840.10008.5.1.4.1.1.88.11': 'SR',
+    '1.2.840.10008.5.1.4.1.1.88.22': 'SR',
+    '1.2.840.10008.5.1.4.1.1.88.33': 'SR',
+    '1.2.840.10008.5.1.4.1.1.88.67': 'SR',
+    '1.2.840.10008.5.1.4.1.1.104.1': 'PDF',
+    '1.2.840.10008.5.1.4.1.1.66': 'RAW',
+    '1.2.840.10008.5.1.4.1.1.66.1': 'REG',
+    '1.2.840.10008.5.1.4.1.1.66.4': 'SEG',
+    '1.2.840.10008.5.1.4.1.1.11.1': 'PR',
+}
+
+# peek_dicom_file() reads at most this many bytes. SOPClassUID and Modality are among the first elements
+# of the data set and are found within the first few kilobytes.
+PEEK_MAX_BYTES = 16 * 1024
+PEEK_TAGS = [Tag('SOPClassUID'), Tag('Modality')]
+MODALITY_TAG = 0x00080060
+
+
+def _past_modality(tag, vr, length):
+    return tag > MODALITY_TAG
+
+
+def peek_dicom_file(file_path, max_bytes=PEEK_MAX_BYTES):
+    """
+    Read the SOPClassUID and the Modality of a file from its first max_bytes bytes.
+
+    Used at copy time to leave out files which series preparation would drop, without reading the whole file.
+
+    Args:
+        file_path (str): The file to check.
+        max_bytes (int): The maximum number of bytes read.
+
+    Returns:
+        tuple: (dicom_kind, sop_class_uid, modality). dicom_kind is the result of sniff_dicom_bytes(), None if
+            the file is not DICOM. sop_class_uid and modality are None if they were not found in the bytes read.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(max_bytes)
+    dicom_kind = sniff_dicom_bytes(head[:DICOM_PREAMBLE_LENGTH + len(DICOM_PREFIX)])
+    if dicom_kind is None:
+        return (None, None, None)
+    try:
+        dataset = pydicom.filereader.read_partial(
+            io.BytesIO(head), stop_when=_past_modality, force=True, specific_tags=PEEK_TAGS
+        )
+    except Exception as e:
+        logger.debug(f"Could not parse the first {len(head)} bytes of {file_path}: {str(e)}")
+        return (dicom_kind, None, None)
+    sop_class_uid = getattr(dataset, 'SOPClassUID', None)
+    modality = getattr(dataset, 'Modality', None)
+    return (dicom_kind, str(sop_class_uid) if sop_class_uid else None, str(modality) if modality else None)
+
+
+def get_import_skip_label(dicom_kind, sop_class_uid, modality):
+    """
+    Decide from the result of peek_dicom_file() whether a file is left out of the import.
+
+    Files whose SOP class or modality could not be read are imported, series preparation decides about them.
+
+    Returns:
+        str: The label the skipped file is counted under (NOT_DICOM, the SOP class or the modality),
+            None if the file is imported.
+    """
+    if dicom_kind is None:
+        return 'NOT_DICOM'
+    if sop_class_uid in NON_IMAGE_SOP_CLASSES:
+        return NON_IMAGE_SOP_CLASSES[sop_class_uid]
+    if modality is not None and modality not in SUPPORTED_MODALITIES:
+        return modality
+    return None
+
+
+def is_import_skip_label(label):
+    """
+    Return whether a label returned by get_import_skip_label() still leaves the file out of the import.
+
+    NOT_DICOM and the SOP class labels are never modalities, so they always skip the file. A file skipped for
+    its modality is imported once the modality is added to SUPPORTED_MODALITIES.
+    """
+    return label not in SUPPORTED_MODALITIES
+
+
+PIXEL_DATA_TAG = 0x7FE00010
+
+
+def build_header_record(dataset):
+    """
+    Return the header of a dataset as the list of elements used for template matching.
+
+    Series preparation stores this record for every series (DicomSeriesProcessingModel.series_header) so that the
+    later stages do not parse the files again. Every element except the pixel data is kept, including sequences,
+    binary values and private tags read as UN, as rules may refer to any of them.
+
+    Args:
+        dataset (pydicom.Dataset): The header of a file of the series.
+
+    Returns:
+        list: One dictionary per element with the keys tag, tag_name (the element name without spaces)
+            and tag_value (the value as a string).
+    """
+    return [
+        {
+            'tag': str(elem.tag),
+            'tag_name': elem.name.replace(" ", ""),
+            'tag_value': str(elem.value)
+        }
+        for elem in dataset
+        if elem.tag != PIXEL_DATA_TAG
+    ]
+
+
+def read_dicom_header(file_path, tags=None, force=False):
+    """
+    Read only the header of a DICOM file.
+
+    Parsing stops before the pixel data, so for image files only the first few kilobytes of the file are read
+    instead of the whole file. When tags is given only those attributes are kept in the returned dataset
+    (pydicom skips over the values of all other elements).
+
+    Args:
+        file_path (str): The DICOM file.
+        tags (list): Optional list of attribute keywords or tags to read. All header attributes are read if None.
+        force (bool): Passed to pydicom.dcmread, read files without the DICM preamble.
+
+    Returns:
+        pydicom.Dataset: The header of the file without the pixel data.
+    """
+    return pydicom.dcmread(file_path, stop_before_pixels=True, specific_tags=tags, force=force)
+
+
+def has_required_tags(dataset, tags):
+    """True if all the given attributes are present in the dataset."""
+    return all(hasattr(dataset, tag) for tag in tags)
+
+
+def get_process_pool(workers):
+    """
+    Return the worker pool of this process, creating it on first use.
+
+    The pool is a billiard pool (the multiprocessing fork used by Celery) because the processes of a Celery
+    prefork worker are daemonic and may not start multiprocessing children. Stopping a billiard pool can take
+    several seconds, so the pool is kept for the lifetime of the process and reused by later tasks.
+    It is only replaced when the number of workers changes.
+    """
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is not None and _process_pool_workers != workers:
+            _process_pool.terminate()
+            _process_pool = None
+        if _process_pool is None:
+            logger.info(f"Starting a pool of {workers} worker processes for DICOM header parsing")
+            _process_pool = Pool(processes=workers)
+            _process_pool_workers = workers
+        return _process_pool
+
+
+def map_files_in_process_pool(function, file_paths, workers=1, chunk_size=32):
+    """
+    Apply function to every file path, in a pool of worker processes when there are enough files.
+
+    Parsing DICOM headers is CPU bound in pydicom, so a large backfill is spread over the CPU cores in chunks of
+    chunk_size files. function must be a module level function and return a small picklable result.
+
+    Args:
+        function (callable): Called with each file path.
+        file_paths (list): The files to process.
+        workers (int): The number of worker processes. The files are processed in this process if 1.
+        chunk_size (int): The number of files sent to a worker at a time.
+
+    Returns:
+        list: The results of function in the order of file_paths.
+    """
+    if workers <= 1 or len(file_paths) < 2 * chunk_size:
+        return [function(file_path) for file_path in file_paths]
+    logger.info(f"Processing {len(file_paths)} files with {workers} worker processes")
+    return get_process_pool(workers).map(function, file_paths, chunksize=chunk_size)
@@ -0,0 +1,238 @@
+from dicomapp.models import CopyStrategyChoices
+from logging import getLogger
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import errno
+import os
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows
+    fcntl = None
+
+logger = getLogger(__name__)
+
+# ioctl request to clone the extents of one file into another (Linux, _IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+# Errors which mean a strategy can not work between the source and target filesystems.
+# Once seen the strategy is not tried again by the same FileCopier.
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV,
+    errno.EOPNOTSUPP,
+    errno.ENOTTY,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EPERM,
+    errno.EACCES,
+    errno.EMLINK,
+}
+
+
+def reflink_file(source, target):
+    """Clone the source file into the target with the FICLONE ioctl (btrfs, XFS, bcachefs...)."""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "FICLONE is not available on this platform")
+    try:
+        with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+        raise
+
+
+def hardlink_file(source, target):
+    """Create the target as a hardlink to the source. Only works when both are on the same filesystem."""
+    os.link(source, target)
+
+
+def copy_file_range_file(source, target):
+    """Copy the source file into the target inside the kernel with os.copy_file_range."""
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOSYS, "copy_file_range is not available on this platform")
+    try:
+        with open(source, 'rb') as source_file, open(target, 'wb') as target_file:
+            remaining = os.fstat(source_file.fileno()).st_size
+            while remaining > 0:
+                copied = os.copy_file_range(source_file.fileno(), target_file.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+    except OSError:
+        if os.path.exists(target):
+            os.remove(target)
+        raise
+
+
+def userspace_copy_file(source, target):
+    shutil.copyfile(source, target)
+
+
+# Strategies in order of preference
+COPY_STRATEGIES = [
+    (CopyStrategyChoices.REFLINK, reflink_file),
+    (CopyStrategyChoices.HARDLINK, hardlink_file),
+    (CopyStrategyChoices.COPY_FILE_RANGE, copy_file_range_file),
+    (CopyStrategyChoices.COPY, userspace_copy_file),
+]
+
+
+class FileCopier:
+    """
+    Copies files using the cheapest strategy that works between the source and target filesystems:
+    a reflink (copy on write clone), then a hardlink, then os.copy_file_range and finally a userspace copy.
+
+    A strategy that fails because the filesystems do not support it is disabled for the remaining files.
+    Hardlinked files share their data with the source, so the files must never be modified in place
+    (the pipeline only ever writes DICOM files to new paths). Use allow_hardlink=False when the source can
+    be modified by others, e.g. files of the datastore.
+
+    A FileCopier can be shared between threads.
+    """
+    def __init__(self, allow_hardlink=True):
+        self.disabled = set()
+        self._lock = threading.Lock()
+        if not allow_hardlink:
+            self.disabled.add(CopyStrategyChoices.HARDLINK)
+
+    def copy(self, source, target):
+        """
+        Copy source to target.
+
+        Returns:
+            str: The CopyStrategyChoices value of the strategy that was used.
+        """
+        for strategy, copy_function in COPY_STRATEGIES:
+            if strategy in self.disabled:
+                continue
+            if strategy == CopyStrategyChoices.COPY:
+                copy_function(source, target)
+                return strategy
+            try:
+                copy_function(source, target)
+                return strategy
+            except OSError as e:
+                if e.errno in UNSUPPORTED_ERRNOS:
+                    logger.debug(f"Copy strategy {strategy} is not supported for {source}: {str(e)}")
+                    with self._lock:
+                        self.disabled.add(strategy)
+                    continue
+                raise
+        raise OSError(f"No copy strategy available for {source}")
+
+
+class CopyStatistics:
+    """Number of files and bytes copied together with the wall time it took."""
+    def __init__(self):
+        self.files_copied = 0
+        self.bytes_copied = 0
+        self.duration_seconds = 0.0
+        self.strategies = Counter()
+
+    @property
+    def files_per_second(self):
+        return self.files_copied / self.duration_seconds if self.duration_seconds > 0 else None
+
+    @property
+    def megabytes_per_second(self):
+        return self.bytes_copied / (1024 * 1024) / self.duration_seconds if self.duration_seconds > 0 else None
+
+    @property
+    def most_common_strategy(self):
+        """The strategy used for most of the files, or an empty string if nothing was copied."""
+        return self.strategies.most_common(1)[0][0] if self.strategies else ''
+
+    def add(self, other):
+        """Add the counts of another CopyStatistics to this one."""
+        self.files_copied += other.files_copied
+        self.bytes_copied += other.bytes_copied
+        self.duration_seconds += other.duration_seconds
+        self.strategies.update(other.strategies)
+
+    def __str__(self):
+        files_per_second = self.files_per_second or 0
+        megabytes_per_second = self.megabytes_per_second or 0
+        return (
+            f"{self.files_copied} files, {self.bytes_copied} bytes in {self.duration_seconds:.2f}s "
+            f"({files_per_second:.1f} files/s, {megabytes_per_second:.1f} MB/s)"
+        )
+
+
+class CopyPool:
+    """
+    Copies files with a bounded thread pool.
+
+    Copying from a network share is limited by the latency of each file rather than by bandwidth,
+    so copying several files of a directory at once multiplies the import throughput.
+    The pool is meant to be used as a context manager and reused for all directories of a run.
+
+    Args:
+        workers (int): The maximum number of files copied concurrently.
+        file_copier (FileCopier): The copier used for each file. A new FileCopier is created if not given.
+    """
+    def __init__(self, workers=1, file_copier=None):
+        self.workers = max(1, int(workers))
+        self.file_copier = file_copier or FileCopier()
+        self._executor = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='dicom_copy')
+        return self
+
+    def __exit__(self, *args):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def map(self, function, items):
+        """Apply function to every item on the worker threads of the pool and return the results in order."""
+        if self._executor is None:
+            return [function(item) for item in items]
+        return list(self._executor.map(function, items))
+
+    def _copy_file(self, source, target):
+        strategy = self.file_copier.copy(source, target)
+        logger.info(f"Copied file {source} to {target} ({strategy})")
+        return strategy
+
+    def copy_files(self, file_records, target_dir):
+        """
+        Copy the files into the target directory.
+
+        All copies are waited for before returning. If any of them failed the first error is raised
+        once the others have finished.
+
+        Args:
+            file_records (list): FileRecords (see datastore_scan.py) of the files to copy.
+            target_dir (str): The directory the files are copied into.
+
+        Returns:
+            CopyStatistics: The files, bytes and wall time of the copy.
+        """
+        statistics = CopyStatistics()
+        start = time.perf_counter()
+        jobs = [(file_record, os.path.join(target_dir, file_record.name)) for file_record in file_records]
+        if self._executor is None:
+            strategies = [self._copy_file(file_record.path, target_file) for file_record, target_file in jobs]
+            first_error = None
+        else:
+            futures = [self._executor.submit(self._copy_file, file_record.path, target_file) for file_record, target_file in jobs]
+            errors = [future.exception() for future in futures]
+            first_error = next((error for error in errors if error is not None), None)
+            strategies = [future.result() if error is None else None for future, error in zip(futures, errors)]
+        statistics.duration_seconds = time.perf_counter() - start
+
+        if first_error is not None:
+            raise first_error
+
+        for (file_record, _), strategy in zip(jobs, strategies):
+            statistics.files_copied += 1
+            statistics.bytes_copied += file_record.size
+            statistics.strategies[strategy] += 1
+        return statistics
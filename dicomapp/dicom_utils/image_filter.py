@@ -0,0 +1,50 @@
+from logging import getLogger
+
+logger = getLogger(__name__)
+
+# Secondary capture SOP classes: screenshots, scanned documents and dose reports stored in the series of the scan
+SECONDARY_CAPTURE_SOP_CLASSES = frozenset([
+    '1.2.840.10008.5.1.4.1.1.7',      # Secondary Capture Image Storage
+    '1.2.840.10008.5.1.4.1.1.7.1',    # Multi-frame Single Bit Secondary Capture Image Storage
+    '1.2.840.10008.5.1.4.1.1.7.2',    # Multi-frame Grayscale Byte Secondary Capture Image Storage
+    '1.2.840.10008.5.1.4.1.1.7.3',    # Multi-frame Grayscale Word Secondary Capture Image Storage
+    '1.2.840.10008.5.1.4.1.1.7.4',    # Multi-frame True Color Secondary Capture Image Storage
+])
+
+SECONDARY_CAPTURE_LABEL = 'SECONDARY_CAPTURE'
+
+
+def parse_excluded_image_types(excluded_image_types):
+    """
+    Parse the comma separated ImageType values of DicomPathConfig.excluded_image_types.
+
+    Returns:
+        frozenset: The values in upper case, e.g. {'LOCALIZER', 'DERIVED'}.
+    """
+    return frozenset(
+        value.strip().upper() for value in (excluded_image_types or '').split(',') if value.strip()
+    )
+
+
+def get_excluded_image_label(image_type, sop_class_uid, excluded_image_types, exclude_secondary_capture):
+    """
+    Decide whether an image is dropped from its series before the series is sent for segmentation.
+
+    Scanners store localizer (scout) images, secondary captures and derived images in the same series as the
+    axial images. They increase the size of the upload and can make the server reject or mis-segment the series.
+
+    Args:
+        image_type (tuple): The values of the ImageType attribute, e.g. ('ORIGINAL', 'PRIMARY', 'LOCALIZER').
+        sop_class_uid (str): The SOPClassUID of the image.
+        excluded_image_types (frozenset): ImageType values which drop the image, see parse_excluded_image_types().
+        exclude_secondary_capture (bool): Drop images of a secondary capture SOP class.
+
+    Returns:
+        str: The ImageType value or SECONDARY_CAPTURE_LABEL the image is dropped for, None if the image is kept.
+    """
+    if exclude_secondary_capture and sop_class_uid in SECONDARY_CAPTURE_SOP_CLASSES:
+        return SECONDARY_CAPTURE_LABEL
+    for value in image_type or ():
+        if value.upper() in excluded_image_types:
+            return value.upper()
+    return None
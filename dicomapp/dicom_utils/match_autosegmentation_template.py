@@ -5,25 +5,17 @@ from pathlib import Path
 import shutil
 from datetime import datetime, timedelta
 from django.conf import settings
-import pydicom
-from dicom_handler.models import ModelYamlInfo, Rule, RuleSet
-import pandas as pd
+from dicomapp.dicom_utils.dicom_headers import read_dicom_header, build_header_record, sniff_dicom_file, DICOM_PART10
+from dicom_handler.models import ModelYamlInfo, RuleSet
+from dicomapp.dicom_utils.rule_index import get_rule_index, match_rule_sets
+from dicomapp.dicom_utils.template_index import calculate_hash, get_template_index, get_template_by_hash
 import glob
-import hashlib
 
 logger = getLogger(__name__)
 
-def calculate_hash(file_path):
-    """Calculate SHA-512 hash of a file."""
-    try:
-        hash_md5 = hashlib.sha512()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
-    except Exception as e:
-        logger.error(f"Error calculating hash for {file_path}: {str(e)}")
-        raise
+# Read together with the tags of the rules when a series has no stored header record
+MATCHING_IDENTIFYING_TAGS = ['PatientID', 'StudyInstanceUID', 'SeriesInstanceUID']
+
 
 def match_autosegmentation_template(input_data: dict) -> dict:
     """
@@ -112,6 +104,11 @@ def match_autosegmentation_template(input_data: dict) -> dict:
                 "task_id": task_id
             }
         
+        # Rules compiled once per process, rebuilt only when they have changed
+        rule_index = get_rule_index()
+        # Templates by file hash, loaded once per process and compared with the table every few seconds
+        template_index = get_template_index()
+
         # Track successful and failed series
         successful_series = []
         failed_series = []
@@ -133,10 +130,10 @@ def match_autosegmentation_template(input_data: dict) -> dict:
                     # Single YAML file found
                     yaml_file_path = yaml_files[0]
                     yaml_file_hash = calculate_hash(yaml_file_path)
+                    template = get_template_by_hash(template_index, yaml_file_hash)
                     
-                    if ModelYamlInfo.objects.filter(file_hash=yaml_file_hash).exists():
+                    if template is not None:
                         # Valid template found
-                        template = ModelYamlInfo.objects.get(file_hash=yaml_file_hash)
                         dest_dir = os.path.join(deidentification_folder, os.path.basename(series_path))
                         
                         # Move series folder
@@ -215,66 +212,46 @@ def match_autosegmentation_template(input_data: dict) -> dict:
                 else:
                     # No YAML files found, try to match based on DICOM tags
                     try:
-                        # Read first file irrespective of the file format
-                        dicom_files = glob.glob(os.path.join(series_path, "*"))
-                        logger.info(f"Found {len(dicom_files)} files in series {series_id}")
-                        if not dicom_files:
-                            raise ValueError("No DICOM files found in series")
+                        # Use the header record stored by series preparation, the files are only read for
+                        # series prepared before the record existed
+                        tag_list = (series_model.series_header or {}).get('elements')
+                        if tag_list:
+                            logger.info(f"Using the stored header record of {series_model.series_header.get('file_name')} for series {series_id}")
+                        else:
+                            # Read first file irrespective of the file format
+                            dicom_files = glob.glob(os.path.join(series_path, "*"))
+                            logger.info(f"Found {len(dicom_files)} files in series {series_id}")
+                            if not dicom_files:
+                                raise ValueError("No DICOM files found in series")
 
-                        # Read files one by one till the first valid dicom file is read.
-                        for file in dicom_files:
-                            try: 
-                                ds = pydicom.dcmread(file)
-                                logger.info(f"Successfully read DICOM file with UIDs: PatientID={ds.PatientID}, StudyInstanceUID={ds.StudyInstanceUID}, SeriesInstanceUID={ds.SeriesInstanceUID}")
-                                break
-                            except Exception as e:
-                                logger.warning(f"Error reading DICOM file {file}: {str(e)}")
-                                continue
-                        
-                        # Process DICOM tags
-                        tag_list = []
-                        for elem in ds:
-                            # Skip PixelData tag as it's not needed for template matching
-                            if elem.tag == (0x7FE0, 0x0010):  # PixelData tag
-                                continue
-                            tag_dict = {
-                                'tag': str(elem.tag),
-                                'tag_name': elem.name.replace(" ", ""),
-                                'tag_value': str(elem.value)
-                            }
-                            tag_list.append(tag_dict)
+                            # Read files one by one till the first valid dicom file is read.
+                            # Files without the DICM preamble are not passed to pydicom.
+                            # Only the tags referenced by the rules are read.
+                            matching_tags = None
+                            if rule_index.specific_tags is not None:
+                                matching_tags = MATCHING_IDENTIFYING_TAGS + rule_index.specific_tags
+                            for file in dicom_files:
+                                if sniff_dicom_file(file) != DICOM_PART10:
+                                    logger.debug(f"Skipping {file}, not a DICOM file")
+                                    continue
+                                try: 
+                                    ds = read_dicom_header(file, matching_tags)
+                                    logger.info(f"Successfully read DICOM file with UIDs: PatientID={ds.PatientID}, StudyInstanceUID={ds.StudyInstanceUID}, SeriesInstanceUID={ds.SeriesInstanceUID}")
+                                    break
+                                except Exception as e:
+                                    logger.warning(f"Error reading DICOM file {file}: {str(e)}")
+                                    continue
+
+                            # Process DICOM tags
+                            tag_list = build_header_record(ds)
                         logger.info(f"Tag dictionary: {tag_list}")
-                        # Create DataFrame and match rules
-                        tag_df = pd.DataFrame(tag_list)
-                        logger.info(f"Tag DataFrame: {tag_df}")
-                        tag_df["patient_id"] = ds.PatientID
-                        logger.info(f"Tag DataFrame with patient ID: {tag_df}")
-                        rule_set_table = Rule.objects.all().values(
-                            "rule_set__id", "rule_set__rule_set_name", 
-                            "tag_name__tag_name", "tag_value"
-                        )
-                        logger.info(f"Rule set table: {rule_set_table}")
-                        rule_set_table_df = pd.DataFrame(list(rule_set_table))
-                        logger.info(f"Rule set table DataFrame: {rule_set_table_df}")
-                        rule_set_table_df["count_rule"] = rule_set_table_df.groupby("rule_set__id")["rule_set__id"].transform("count")
-                        logger.info(f"Rule set table DataFrame with count_rule: {rule_set_table_df}")
-                        rule_set_table_df.rename(columns={
-                            "tag_name__tag_name": "tag_name", 
-                            "tag_value": "tag_value"
-                        }, inplace=True)
-                        logger.info(f"Rule set table DataFrame with renamed columns: {rule_set_table_df}")
-                        join_df = pd.merge(tag_df, rule_set_table_df, on=['tag_name', 'tag_value']).dropna()
-                        logger.info(f"Join DataFrame: {join_df}")
-                        match_rule = join_df.groupby(["rule_set__id", "patient_id", "count_rule"]).count().reset_index()
-                        logger.info(f"Match rule DataFrame: {match_rule}")
-                        match_rule = match_rule[["rule_set__id", "patient_id", "count_rule", "rule_set__rule_set_name"]]
-                        match_rule.rename(columns={"rule_set__rule_set_name": "match_rule"}, inplace=True)
-                        logger.info(f"Match rule DataFrame with renamed columns: {match_rule}")
-                        filter_match_rule = match_rule.loc[(match_rule["count_rule"]) == (match_rule["match_rule"])]
-                        logger.info(f"Filter match rule DataFrame: {filter_match_rule}")
-                        if len(filter_match_rule) == 1:
+                        # Match the header against the compiled rules, an element matches a rule when the
+                        # tag name and the value are equal
+                        matched_rule_set_ids = match_rule_sets(rule_index, tag_list)
+                        logger.info(f"Matched rule sets for series {series_id}: {[rule_index.rule_set_names[rule_set_id] for rule_set_id in matched_rule_set_ids]}")
+                        if len(matched_rule_set_ids) == 1:
                             # Single rule match found
-                            rule_set_id = filter_match_rule["rule_set__id"].unique()[0]
+                            rule_set_id = matched_rule_set_ids[0]
                             rule_set = RuleSet.objects.get(id=rule_set_id)
                             
                             # Copy template and move folder
@@ -310,7 +287,7 @@ def match_autosegmentation_template(input_data: dict) -> dict:
                             successful_series.append(series_id)
                             successful_series_paths.append(dest_dir)
                             
-                        elif len(filter_match_rule) > 1:
+                        elif len(matched_rule_set_ids) > 1:
                             # Multiple rule matches
                             dest_dir = os.path.join(unprocessed_folder, os.path.basename(series_path))
                             if os.path.exists(dest_dir):
@@ -323,7 +300,7 @@ def match_autosegmentation_template(input_data: dict) -> dict:
                             series_model.task_id = task_id
                             series_model.save()
                             logger.info(f"Successfully updated database for series {series_id}")
-                            multiple_rules = ', '.join(filter_match_rule["match_rule"].unique().tolist())
+                            multiple_rules = ', '.join(rule_index.rule_set_names[rule_set_id] for rule_set_id in matched_rule_set_ids)
                             DicomSeriesProcessingLogModel.objects.create(
                                 task_id=task_id,
                                 dicom_series_processing_id=series_model,
@@ -0,0 +1,87 @@
+from dicomapp.models import RejectedFileModel
+from logging import getLogger
+import os
+import shutil
+
+logger = getLogger(__name__)
+
+
+class RejectedFileCache:
+    """
+    Remembers the files which series preparation rejected (not DICOM, unreadable, missing tags or an
+    unsupported modality) in RejectedFileModel.
+
+    A file is identified by its path in the datastore together with its size and modification time, so a
+    rejected file is skipped by later copies and series preparation runs until it changes. Checking a file
+    is a dictionary lookup once the entries of the files have been loaded.
+    """
+    def __init__(self):
+        self.entries = {}
+        self.changed_entries = {}
+
+    def load(self, file_paths, batch_size=500):
+        """Fetch the RejectedFileModel entries of the files that will be checked."""
+        file_paths = [file_path for file_path in file_paths if file_path not in self.entries]
+        for start in range(0, len(file_paths), batch_size):
+            batch = file_paths[start:start + batch_size]
+            self.entries.update(
+                (entry.file_path, entry)
+                for entry in RejectedFileModel.objects.filter(file_path__in=batch)
+            )
+
+    def is_rejected(self, file_path, size, modification_time):
+        """True if the file was rejected before and has not changed since."""
+        entry = self.entries.get(file_path)
+        return entry is not None and entry.file_size == size and entry.file_modification_time == modification_time
+
+    def reject(self, file_path, size, modification_time, reason, reason_message='', quarantine_path=''):
+        """Record that the file was rejected. The entries are written by save()."""
+        entry = self.entries.get(file_path)
+        if entry is None:
+            entry = RejectedFileModel(file_path=file_path, rejection_count=0)
+            self.entries[file_path] = entry
+        entry.file_size = size
+        entry.file_modification_time = modification_time
+        entry.reason = reason
+        entry.reason_message = reason_message or ''
+        entry.quarantine_path = quarantine_path or ''
+        entry.rejection_count += 1
+        self.changed_entries[file_path] = entry
+
+    def save(self):
+        """Write the rejections recorded during the run with bulk writes."""
+        if not self.changed_entries:
+            return
+        RejectedFileModel.objects.bulk_create(
+            list(self.changed_entries.values()),
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['file_path'],
+            update_fields=['file_size', 'file_modification_time', 'reason', 'reason_message', 'quarantine_path', 'rejection_count', 'updated_at']
+        )
+        logger.info(f"Recorded {len(self.changed_entries)} rejected files")
+        self.changed_entries = {}
+
+
+def quarantine_file(file_path, quarantine_directory, group_name):
+    """
+    Move a rejected file into the quarantine directory.
+
+    Args:
+        file_path (str): The rejected file.
+        quarantine_directory (str): The configured quarantine directory.
+        group_name (str): Subfolder of the quarantine directory, e.g. the name of the import folder.
+
+    Returns:
+        str: The path of the file in the quarantine directory, '' if it could not be moved.
+    """
+    target_directory = os.path.join(quarantine_directory, group_name)
+    target_path = os.path.join(target_directory, os.path.basename(file_path))
+    try:
+        os.makedirs(target_directory, exist_ok=True)
+        shutil.move(file_path, target_path)
+    except OSError as e:
+        logger.warning(f"Could not move {file_path} to the quarantine directory {target_directory}: {str(e)}")
+        return ''
+    logger.info(f"Moved rejected file {file_path} to {target_path}")
+    return target_path
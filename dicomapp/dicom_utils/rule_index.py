@@ -0,0 +1,155 @@
+from logging import getLogger
+from collections import Counter, namedtuple
+import re
+import threading
+import time
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from dicom_handler.models import Rule, RuleSet, TagName
+
+logger = getLogger(__name__)
+
+# The compiled rules of this process, see get_rule_index()
+_rule_index = None
+_rule_index_lock = threading.Lock()
+# time.monotonic() when the fingerprint of _rule_index was last compared with the tables
+_rule_index_checked_at = None
+# Seconds during which the compiled rules are used without comparing the fingerprint of the tables
+RULE_INDEX_CHECK_SECONDS = 30
+
+# TagName.tag_id as written in the DICOM dictionary, e.g. (0008,0060). Repeating groups like (50xx,0030) do not match.
+TAG_ID_PATTERN = re.compile(r'^\(?\s*([0-9A-Fa-f]{4})\s*,?\s*([0-9A-Fa-f]{4})\s*\)?$')
+
+RuleIndex = namedtuple('RuleIndex', [
+    'rule_sets_by_tag',       # tag name -> tag value -> rule set ids, one entry per rule
+    'required_rule_counts',   # rule set id -> number of rules of the rule set
+    'rule_set_names',         # rule set id -> rule set name
+    'specific_tags',          # the tags referenced by the rules as integers, None if a tag id cannot be read
+    'fingerprint',            # get_rules_fingerprint() when the index was built
+])
+
+
+def parse_tag_id(tag_id):
+    """Return a TagName.tag_id like (0008,0060) as the integer tag, None if it is not a single tag."""
+    match = TAG_ID_PATTERN.match(tag_id or '')
+    if match is None:
+        return None
+    return int(match.group(1) + match.group(2), 16)
+
+
+def get_rules_fingerprint():
+    """
+    Return the number of rows and the latest modification time of the Rule, RuleSet and TagName tables.
+
+    The rules are edited in the web process while the templates are matched in the Celery workers, so the
+    signals below cannot reach the index of a worker. A worker compares this fingerprint at most once every
+    RULE_INDEX_CHECK_SECONDS instead, so the per series matching tasks of a worker share three aggregate
+    queries rather than querying all rules per series.
+    """
+    return tuple(
+        tuple(model.objects.aggregate(count=Count('pk'), modified_at=Max('modified_at')).values())
+        for model in (Rule, RuleSet, TagName)
+    )
+
+
+def build_rule_index(fingerprint=None):
+    """
+    Compile all rules into dictionaries for matching a series header without database queries.
+
+    Args:
+        fingerprint (tuple): The get_rules_fingerprint() of the rules, queried if None.
+
+    Returns:
+        RuleIndex: The compiled rules.
+    """
+    if fingerprint is None:
+        fingerprint = get_rules_fingerprint()
+    rule_sets_by_tag = {}
+    required_rule_counts = Counter()
+    rule_set_names = {}
+    specific_tags = set()
+    for rule_set_id, rule_set_name, tag_name, tag_id, tag_value in Rule.objects.values_list(
+        'rule_set__id', 'rule_set__rule_set_name', 'tag_name__tag_name', 'tag_name__tag_id', 'tag_value'
+    ):
+        rule_sets_by_tag.setdefault(tag_name, {}).setdefault(tag_value, []).append(rule_set_id)
+        required_rule_counts[rule_set_id] += 1
+        rule_set_names[rule_set_id] = rule_set_name
+        tag = parse_tag_id(tag_id)
+        if tag is None:
+            logger.warning(f"Tag id {tag_id} of {tag_name} is not a single tag, template matching reads the whole header")
+        if specific_tags is not None:
+            specific_tags = None if tag is None else specific_tags | {tag}
+    logger.info(f"Compiled {sum(required_rule_counts.values())} rules of {len(required_rule_counts)} rule sets")
+    return RuleIndex(
+        rule_sets_by_tag,
+        dict(required_rule_counts),
+        rule_set_names,
+        sorted(specific_tags) if specific_tags is not None else None,
+        fingerprint
+    )
+
+
+def get_rule_index():
+    """
+    Return the rule index of this process, compiling it again when the rules have changed.
+
+    Rules changed in another process are picked up within RULE_INDEX_CHECK_SECONDS, changes made in this
+    process right away (see invalidate_rule_index).
+
+    Returns:
+        RuleIndex: The compiled rules.
+    """
+    global _rule_index, _rule_index_checked_at
+    now = time.monotonic()
+    with _rule_index_lock:
+        if _rule_index is not None and now - _rule_index_checked_at < RULE_INDEX_CHECK_SECONDS:
+            return _rule_index
+        fingerprint = get_rules_fingerprint()
+        if _rule_index is None or _rule_index.fingerprint != fingerprint:
+            _rule_index = build_rule_index(fingerprint)
+        _rule_index_checked_at = now
+        return _rule_index
+
+
+def match_rule_sets(rule_index, tag_list):
+    """
+    Find the rule sets all of whose rules match the header of a series.
+
+    A rule matches when the header has an element with the tag name and exactly the value of the rule.
+    The record is indexed by tag name once, then only the tag names of the compiled rules are looked up.
+
+    Args:
+        rule_index (RuleIndex): The compiled rules, see get_rule_index().
+        tag_list (list): The header record of the series, see build_header_record().
+
+    Returns:
+        list: The ids of the matching rule sets, sorted.
+    """
+    header_values = {}
+    for element in tag_list:
+        header_values.setdefault(element['tag_name'], set()).add(element['tag_value'])
+    matched_rule_counts = Counter()
+    for tag_name, rule_sets_by_value in rule_index.rule_sets_by_tag.items():
+        for tag_value in header_values.get(tag_name, ()):
+            rule_set_ids = rule_sets_by_value.get(tag_value)
+            if rule_set_ids:
+                matched_rule_counts.update(rule_set_ids)
+    return sorted(
+        rule_set_id for rule_set_id, count in matched_rule_counts.items()
+        if count == rule_index.required_rule_counts[rule_set_id]
+    )
+
+
+@receiver(post_save, sender=Rule)
+@receiver(post_delete, sender=Rule)
+@receiver(post_save, sender=RuleSet)
+@receiver(post_delete, sender=RuleSet)
+@receiver(post_save, sender=TagName)
+@receiver(post_delete, sender=TagName)
+def invalidate_rule_index(sender, **kwargs):
+    """Drop the rule index of this process when a rule, rule set or tag name is saved or deleted."""
+    global _rule_index
+    with _rule_index_lock:
+        _rule_index = None
+    logger.debug(f"Rule index invalidated by a change of {sender.__name__}")
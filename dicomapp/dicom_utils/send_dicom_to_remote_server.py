@@ -86,11 +86,19 @@ def send_dicom_to_remote_server(deidentification_result: dict):
                 if not dicom_files:
                     raise ValueError(f"No DICOM files found in {series_path}")
 
-                # Read first DICOM file for UIDs
-                first_dicom = dicom_files[0]
-                ds = pydicom.dcmread(first_dicom, stop_before_pixels=True)
-                series_uid = ds.SeriesInstanceUID
-                study_uid = ds.StudyInstanceUID
+                # The deidentified series folder is named after the deidentified SeriesInstanceUID and the UIDs are
+                # recorded by deidentification. The first DICOM file is only read if they are not found.
+                deidentified_series = DicomSeries.objects.select_related('study').filter(
+                    deidentified_series_instance_uid=os.path.basename(os.path.normpath(series_path))
+                ).first()
+                if deidentified_series is not None and deidentified_series.study.deidentified_study_instance_uid:
+                    series_uid = deidentified_series.deidentified_series_instance_uid
+                    study_uid = deidentified_series.study.deidentified_study_instance_uid
+                else:
+                    first_dicom = dicom_files[0]
+                    ds = pydicom.dcmread(first_dicom, stop_before_pixels=True, specific_tags=['SeriesInstanceUID', 'StudyInstanceUID'])
+                    series_uid = ds.SeriesInstanceUID
+                    study_uid = ds.StudyInstanceUID
                 logger.info(f"Series UID: {series_uid}, Study UID: {study_uid}")
 
                 # Get client name from settings
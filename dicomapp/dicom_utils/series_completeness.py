@@ -0,0 +1,120 @@
+from logging import getLogger
+from collections import namedtuple
+import numpy as np
+
+logger = getLogger(__name__)
+
+# Modalities whose series are stacks of parallel slices which can be checked for completeness
+STACK_MODALITIES = ['CT', 'MR', 'PT']
+
+# Positions closer than this (in mm) along the slice normal are the same slice position
+POSITION_TOLERANCE_MM = 0.01
+# Orientations whose direction cosines differ by less than this are the same orientation
+ORIENTATION_TOLERANCE = 1e-3
+# A step between neighbouring slice positions larger than this factor times the median step is a gap
+GAP_FACTOR = 1.5
+# Steps differing from the median step by more than this fraction (but less than a gap) are inconsistent spacing
+SPACING_TOLERANCE = 0.1
+
+SeriesCompleteness = namedtuple('SeriesCompleteness', [
+    'complete',                    # False if slices are missing
+    'slice_count',                 # Number of files in the series
+    'missing_instance_numbers',    # InstanceNumbers missing between the lowest and highest InstanceNumber
+    'missing_positions',           # Estimated number of slice positions missing in gaps of the stack
+    'duplicate_positions',         # Number of slice positions which occur more often than others
+    'slice_spacing',               # Median step between slice positions in mm, None if not computed
+    'inconsistent_spacing',        # Number of steps that deviate from the median step without being a gap
+    'reasons',                     # Human readable findings
+])
+
+
+def analyse_series_completeness(instance_numbers, image_positions, image_orientations, modality=None):
+    """
+    Check a series for missing slices using the slice geometry of all of its files.
+
+    The InstanceNumbers must run without gaps. For stacks of parallel slices (one ImageOrientationPatient
+    for the whole series) every ImagePositionPatient is projected on the slice normal: a step between
+    neighbouring positions well above the median step means slices are missing, and positions which occur
+    more often than the others (a multi phase series where one phase has not fully arrived) mean the series
+    is still arriving. Steps which deviate from the median without being a gap are reported as inconsistent
+    spacing, but do not make the series incomplete as waiting does not change them. When every file has an
+    InstanceNumber and they run without gaps, a gap between positions is reported as inconsistent spacing as
+    well: planning CTs are often reconstructed with thicker slices at both ends of the stack.
+
+    Args:
+        instance_numbers (list): InstanceNumber of every file, None where missing.
+        image_positions (list): ImagePositionPatient of every file as 3 floats, None where missing.
+        image_orientations (list): ImageOrientationPatient of every file as 6 floats, None where missing.
+        modality (str): The modality of the series. Only CT / MR / PT (PET) series are checked.
+
+    Returns:
+        SeriesCompleteness: The findings for the series.
+    """
+    slice_count = len(instance_numbers)
+    reasons = []
+    missing_instance_numbers = []
+    missing_positions = 0
+    duplicate_positions = 0
+    slice_spacing = None
+    inconsistent_spacing = 0
+
+    if (modality is not None and modality not in STACK_MODALITIES) or slice_count < 2:
+        return SeriesCompleteness(True, slice_count, [], 0, 0, None, 0, [])
+
+    # Gaps in the instance numbers
+    numbers = np.array([number for number in instance_numbers if number is not None], dtype=np.int64)
+    instance_numbers_contiguous = False
+    if len(numbers) == slice_count:
+        unique_numbers = np.unique(numbers)
+        expected = np.arange(unique_numbers[0], unique_numbers[-1] + 1)
+        missing_instance_numbers = np.setdiff1d(expected, unique_numbers).tolist()
+        if missing_instance_numbers:
+            reasons.append(
+                f"{len(missing_instance_numbers)} instance numbers missing between {unique_numbers[0]} and {unique_numbers[-1]}"
+            )
+        instance_numbers_contiguous = not missing_instance_numbers
+
+    # Geometry of the stack
+    if all(position is not None for position in image_positions) and all(orientation is not None for orientation in image_orientations):
+        orientations = np.asarray(image_orientations, dtype=np.float64)
+        if np.all(np.abs(orientations - orientations[0]) < ORIENTATION_TOLERANCE):
+            normal = np.cross(orientations[0, :3], orientations[0, 3:])
+            distances = np.asarray(image_positions, dtype=np.float64) @ normal
+            slice_positions, counts = np.unique(np.round(distances / POSITION_TOLERANCE_MM).astype(np.int64), return_counts=True)
+
+            # Every position must occur equally often: once, or once per phase
+            duplicate_positions = int(np.count_nonzero(counts != counts.max()))
+            if duplicate_positions:
+                reasons.append(f"{duplicate_positions} slice positions occur fewer than {counts.max()} times")
+
+            if len(slice_positions) > 1:
+                steps = np.diff(slice_positions) * POSITION_TOLERANCE_MM
+                median_step = float(np.median(steps))
+                slice_spacing = round(median_step, 3)
+                if median_step > 0:
+                    gaps = steps > median_step * GAP_FACTOR
+                    if instance_numbers_contiguous:
+                        # No file is missing, the gaps are slices of a different thickness
+                        gaps[:] = False
+                    missing_positions = int(np.sum(np.round(steps[gaps] / median_step) - 1))
+                    if missing_positions:
+                        reasons.append(f"{missing_positions} slices missing in {int(np.count_nonzero(gaps))} gaps of the {slice_spacing} mm stack")
+                    inconsistent_spacing = int(np.count_nonzero(
+                        ~gaps & (np.abs(steps - median_step) > median_step * SPACING_TOLERANCE)
+                    ))
+                    if inconsistent_spacing:
+                        reasons.append(f"{inconsistent_spacing} slice steps deviate from the {slice_spacing} mm spacing")
+        else:
+            logger.debug("Series has more than one image orientation, skipping the slice geometry check")
+
+    complete = not missing_instance_numbers and not missing_positions and not duplicate_positions
+    return SeriesCompleteness(
+        complete,
+        slice_count,
+        missing_instance_numbers,
+        missing_positions,
+        duplicate_positions,
+        slice_spacing,
+        inconsistent_spacing,
+        reasons,
+    )
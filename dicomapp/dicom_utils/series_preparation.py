@@ -5,7 +5,15 @@ from pathlib import Path
 import shutil
 from datetime import datetime, timedelta
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 import pydicom
+from dicomapp.dicom_utils.dicom_headers import read_dicom_header, build_header_record, has_required_tags, map_files_in_process_pool, sniff_dicom_file, DICOM_PART10, SERIES_PREPARATION_TAGS, SUPPORTED_MODALITIES, DICOM_UNREADABLE
+from dicomapp.dicom_utils.file_transfer import FileCopier
+from dicomapp.dicom_utils.series_completeness import analyse_series_completeness
+from dicomapp.dicom_utils.rejected_files import RejectedFileCache, quarantine_file
+from dicomapp.dicom_utils.image_filter import get_excluded_image_label, parse_excluded_image_types
+from collections import Counter, namedtuple
 
 logger = getLogger(__name__)
 
@@ -28,7 +36,311 @@ def parse_dicom_date(date_str):
 
     
 
-def series_preparation(input_data: dict) -> dict:
+def header_value(dataset, keyword):
+    """Return an attribute of the dataset as a plain string, '' if it is missing or empty."""
+    value = getattr(dataset, keyword, '')
+    return '' if value is None else str(value)
+
+
+def header_strings(dataset, keyword):
+    """Return a multi-valued string attribute of the dataset as a tuple of strings, () if it is missing."""
+    value = getattr(dataset, keyword, None)
+    if value is None or value == '':
+        return ()
+    values = [value] if isinstance(value, str) else list(value)
+    return tuple(str(item) for item in values)
+
+
+def header_numbers(dataset, keyword, count):
+    """Return a numeric attribute with count values as a tuple of floats, None if it is missing or invalid."""
+    value = getattr(dataset, keyword, None)
+    if value is None or value == '':
+        return None
+    values = [value] if isinstance(value, (str, int, float)) else list(value)
+    try:
+        numbers = tuple(float(item) for item in values)
+    except (TypeError, ValueError):
+        return None
+    return numbers if len(numbers) == count else None
+
+
+def header_integer(dataset, keyword):
+    """Return an integer attribute of the dataset, None if it is missing or invalid."""
+    numbers = header_numbers(dataset, keyword, 1)
+    return int(numbers[0]) if numbers else None
+
+
+# Compact record of the attributes series_preparation needs from a DICOM file.
+# It is built in the worker processes and sent back to the task, so it only holds plain strings and numbers.
+SeriesHeaderRecord = namedtuple('SeriesHeaderRecord', [
+    'patient_id', 'patient_name', 'gender', 'study_date', 'modality', 'study_instance_uid',
+    'protocol_name', 'series_instance_uid', 'series_description',
+    'instance_number', 'image_position', 'image_orientation', 'image_type', 'sop_class_uid', 'sop_instance_uid',
+])
+
+
+def read_series_header_record(file_path):
+    """
+    Read the header of a single file for series_preparation. Runs in the header worker processes.
+
+    Returns:
+        tuple: (result_type, value) where result_type is
+            - 'record': value is the SeriesHeaderRecord of the file
+            - 'skipped': the file is not a DICOM file of a supported modality, value is a tuple of the
+              FileRejectionReasonChoices value and a message (or None)
+            - 'error': value is the error message
+    """
+    file_name = os.path.basename(file_path)
+    # Files which are not DICOM (thumbnails, .DS_Store, PDFs ...) are skipped without parsing them
+    dicom_kind = sniff_dicom_file(file_path)
+    if dicom_kind is None:
+        return ('skipped', (FileRejectionReasonChoices.NOT_DICOM, None))
+    if dicom_kind == DICOM_UNREADABLE:
+        # Not remembered as rejected, the file is read again by the next run
+        return ('error', f"Could not read file {file_name}")
+    try:
+        # First try to read the header of the dicom file without force = True.
+        # Only the attributes needed here are read and parsing stops before the pixel data.
+        # Files without the DICM preamble cannot be read this way and go straight to the force read.
+        dcm = None
+        if dicom_kind == DICOM_PART10:
+            try:
+                dcm = read_dicom_header(file_path, SERIES_PREPARATION_TAGS)
+            except Exception:
+                dcm = None
+
+        if dcm is None:
+            # If initial read fails, try with force=True
+            try:
+                dcm = read_dicom_header(file_path, SERIES_PREPARATION_TAGS, force=True)
+                # Check if required tags are present after force read
+                if has_required_tags(dcm, ['PatientID', 'StudyInstanceUID', 'SeriesInstanceUID', 'Modality']):
+                    # Save the dataset since we had to use force=True. Ensure file format is DICOM.
+                    # The whole file is read for this as the header only dataset has no pixel data.
+                    # Remove the original file and replace it with the new one.
+                    full_dataset = pydicom.dcmread(file_path, force=True)
+                    os.remove(file_path)
+                    logger.info(f"Removed original file {file_name}")
+                    full_dataset.save_as(file_path,enforce_file_format=True)
+                    logger.info(f"Saved file {file_name} after force read")
+                else:
+                    return ('skipped', (FileRejectionReasonChoices.MISSING_TAGS, f"File {file_name} is missing required DICOM tags after force read, skipping"))
+            except Exception:
+                # If both attempts fail, skip the file
+                return ('skipped', (FileRejectionReasonChoices.UNREADABLE, None))
+
+        # Check the modality is CT / MR / PET / US. Allow only those files to be processed.
+        if dcm.Modality not in SUPPORTED_MODALITIES:
+            return ('skipped', (FileRejectionReasonChoices.UNSUPPORTED_MODALITY, f"File {file_name} is not a CT / MR / PET / US, skipping"))
+
+        # Get SeriesInstanceUID
+        series_uid = getattr(dcm, 'SeriesInstanceUID', None)
+        if not series_uid:
+            return ('skipped', (FileRejectionReasonChoices.MISSING_TAGS, f"File {file_name} has no SeriesInstanceUID, skipping"))
+
+        return ('record', SeriesHeaderRecord(
+            patient_id=header_value(dcm, 'PatientID'),
+            patient_name=header_value(dcm, 'PatientName'),
+            gender=header_value(dcm, 'PatientSex'),
+            study_date=header_value(dcm, 'StudyDate'),
+            modality=header_value(dcm, 'Modality'),
+            study_instance_uid=header_value(dcm, 'StudyInstanceUID'),
+            protocol_name=header_value(dcm, 'ProtocolName'),
+            series_instance_uid=str(series_uid),
+            series_description=header_value(dcm, 'SeriesDescription'),
+            instance_number=header_integer(dcm, 'InstanceNumber'),
+            image_position=header_numbers(dcm, 'ImagePositionPatient', 3),
+            image_orientation=header_numbers(dcm, 'ImageOrientationPatient', 6),
+            image_type=header_strings(dcm, 'ImageType'),
+            sop_class_uid=header_value(dcm, 'SOPClassUID'),
+            sop_instance_uid=header_value(dcm, 'SOPInstanceUID'),
+        ))
+    except Exception as e:
+        return ('error', f"Error processing file {file_name}: {str(e)}")
+
+
+def datastore_file_key(file_path, source_path, copy_tasks_by_directory):
+    """
+    Return the (path, size, modification time) of the datastore file an imported file was copied from.
+
+    The size and modification time come from the file manifest of the copy task. Files without a manifest
+    entry (e.g. imported without a copy task) are identified by their own path and stat.
+    """
+    copy_task = copy_tasks_by_directory.get(source_path)
+    file_name = os.path.basename(file_path)
+    if copy_task is not None and os.path.dirname(file_path) == source_path:
+        manifest_entry = (copy_task.file_manifest or {}).get(file_name)
+        if manifest_entry is not None:
+            return (os.path.join(copy_task.source_directory, file_name), manifest_entry['size'], manifest_entry['mtime'])
+    stat = os.stat(file_path)
+    return (file_path, stat.st_size, stat.st_mtime)
+
+
+def archived_file_entry(archive_path, series_uid, header_record):
+    """
+    Build the ArchivedSeriesFileModel entry which stores the header record of an archived file.
+
+    Args:
+        archive_path (str): The path of the file in folder_for_series_archive/<SeriesInstanceUID>.
+        series_uid (str): The SeriesInstanceUID of the archive directory.
+        header_record (SeriesHeaderRecord): The header record of the file.
+
+    Returns:
+        ArchivedSeriesFileModel: The unsaved entry, written by save_archived_file_entries().
+    """
+    stat = os.stat(archive_path)
+    return ArchivedSeriesFileModel(
+        file_path=archive_path,
+        series_instance_uid=series_uid,
+        file_size=stat.st_size,
+        file_modification_time=stat.st_mtime,
+        header_record=list(header_record)
+    )
+
+
+def save_archived_file_entries(entries):
+    """Write the header records of archived files with a bulk upsert on the archive path."""
+    if not entries:
+        return
+    ArchivedSeriesFileModel.objects.bulk_create(
+        entries,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['file_path'],
+        update_fields=['series_instance_uid', 'file_size', 'file_modification_time', 'header_record', 'updated_at']
+    )
+
+
+def stored_header_record(entry):
+    """Rebuild the SeriesHeaderRecord of an ArchivedSeriesFileModel entry. JSON turns the tuples into lists."""
+    return SeriesHeaderRecord(*[tuple(value) if isinstance(value, list) else value for value in entry.header_record])
+
+
+def read_archived_series_files(series_files, series_headers, archive_directory_path, workers=1):
+    """
+    Find the files of the given series which were archived by an earlier run and are not part of this import.
+
+    copy_dicom only copies the new or changed files of a datastore directory, so a late slice arrives without
+    the rest of its series. The files already archived under folder_for_series_archive/<SeriesInstanceUID> are
+    added to the series, so the whole series goes downstream and not the late files alone. Files of this import
+    win over archived files with the same SOPInstanceUID or file name.
+
+    The header records of archived files are stored in ArchivedSeriesFileModel when the files are archived, so a
+    series arriving in many small imports does not parse its archived files again on each import. Only archived
+    files without a stored record, or whose size or modification time changed, are read.
+
+    Args:
+        series_files (dict): SeriesInstanceUID -> paths of the files of this import.
+        series_headers (dict): SeriesInstanceUID -> SeriesHeaderRecord of the files, in the order of series_files.
+        archive_directory_path (str): The folder_for_series_archive directory.
+        workers (int): The number of header worker processes.
+
+    Returns:
+        dict: SeriesInstanceUID -> list of (archived file path, SeriesHeaderRecord) to add to the series.
+    """
+    archived_sources = []
+    for series_uid, file_paths in series_files.items():
+        series_archive_directory = os.path.join(archive_directory_path, series_uid)
+        if not os.path.isdir(series_archive_directory):
+            continue
+        file_names = {os.path.basename(file_path) for file_path in file_paths}
+        with os.scandir(series_archive_directory) as entries:
+            for entry in entries:
+                if entry.name not in file_names and entry.is_file():
+                    stat = entry.stat()
+                    archived_sources.append((entry.path, series_uid, stat.st_size, stat.st_mtime))
+
+    archived_files = {}
+    if not archived_sources:
+        return archived_files
+
+    stored_entries = {
+        entry.file_path: entry
+        for entry in ArchivedSeriesFileModel.objects.filter(
+            series_instance_uid__in={series_uid for _, series_uid, _, _ in archived_sources}
+        )
+    }
+    header_records = {}
+    unread_paths = []
+    for archive_path, series_uid, size, modification_time in archived_sources:
+        entry = stored_entries.get(archive_path)
+        if entry is not None and entry.file_size == size and entry.file_modification_time == modification_time:
+            header_records[archive_path] = ('record', stored_header_record(entry))
+        else:
+            unread_paths.append(archive_path)
+    if unread_paths:
+        logger.info(f"Reading the headers of {len(unread_paths)} archived files without a stored header record")
+        header_records.update(zip(unread_paths, map_files_in_process_pool(read_series_header_record, unread_paths, workers)))
+
+    sop_instance_uids = {
+        series_uid: {header.sop_instance_uid for header in headers if header.sop_instance_uid}
+        for series_uid, headers in series_headers.items()
+    }
+    unread_paths = set(unread_paths)
+    new_entries = []
+    for archive_path, series_uid, _, _ in archived_sources:
+        result_type, header_record = header_records[archive_path]
+        # Template files and other files in the archive are left out
+        if result_type != 'record' or header_record.series_instance_uid != series_uid:
+            continue
+        if archive_path in unread_paths:
+            try:
+                new_entries.append(archived_file_entry(archive_path, series_uid, header_record))
+            except OSError as e:
+                logger.warning(f"Could not store the header record of archived file {archive_path}: {str(e)}")
+        if header_record.sop_instance_uid and header_record.sop_instance_uid in sop_instance_uids[series_uid]:
+            continue
+        archived_files.setdefault(series_uid, []).append((archive_path, header_record))
+    try:
+        save_archived_file_entries(new_entries)
+    except Exception as e:
+        logger.warning(f"Could not store the header records of {len(new_entries)} archived files: {str(e)}")
+    return archived_files
+
+
+def group_directories_by_series(file_sources, header_results, source_paths):
+    """
+    Split the files of an import into batches of directories which share no series.
+
+    Directories are in the same batch when files of one SeriesInstanceUID are spread over them, so a series is
+    prepared once with all of its files and never handed downstream before its last directory is consumed.
+
+    Args:
+        file_sources (list): (file path, source directory) of every file of the import.
+        header_results (dict): File path -> result of read_series_header_record().
+        source_paths (list): The source directories in the order they are prepared.
+
+    Returns:
+        list: The batches of (file path, source directory), ordered by their first source directory.
+    """
+    directory_indexes = {source_path: index for index, source_path in enumerate(source_paths)}
+    # Each directory points to the first directory of its batch
+    parents = list(range(len(source_paths)))
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    first_directory_of_series = {}
+    for file_path, source_path in file_sources:
+        result_type, header_record = header_results[file_path]
+        if result_type != 'record':
+            continue
+        index = directory_indexes[source_path]
+        first_index = first_directory_of_series.setdefault(header_record.series_instance_uid, index)
+        root, first_root = find(index), find(first_index)
+        if root != first_root:
+            parents[max(root, first_root)] = min(root, first_root)
+
+    batches = {}
+    for file_path, source_path in file_sources:
+        batches.setdefault(find(directory_indexes[source_path]), []).append((file_path, source_path))
+    return [batches[root] for root in sorted(batches)]
+
+
+def series_preparation(input_data: dict, on_series_ready=None) -> dict:
     """
     This function will read the DICOM metadata of the valid DICOM files in the source directory. 
     It will parse each file inside the folder (including any files inside subdirectories)
@@ -63,12 +375,18 @@ def series_preparation(input_data: dict) -> dict:
             - target_paths: List of paths where DICOM directories were copied
             - copy_dicom_task_id: The UUID of the CopyDicomTaskModel entry
             - error: Error message (only present if status is 'failure')
+        on_series_ready (callable): Optional. Called with the results of a single series (a dictionary with the
+            same keys as the returned one) as soon as the files of the series have been moved. The source
+            directories are then prepared in batches of directories which share no series (see
+            group_directories_by_series), so the series of a batch are sent downstream before the next batch is
+            moved, and a series is sent once with the files of all of its directories.
 
     Returns: A dictionary with the following keys:
         - status (success, partial_failure, or failure)
         - message (message to be displayed)
         - separated_series_path_folders (list of paths to folders where series were successfully separated)
         - series_processing_ids (list of UUIDs of created DicomSeriesProcessingModel entries)
+        - streamed_series_processing_ids (list of UUIDs of the series passed to on_series_ready)
     """
     logger.info("Starting series preparation process")
     
@@ -116,14 +434,21 @@ def series_preparation(input_data: dict) -> dict:
         os.makedirs(archive_directory_path, exist_ok=True)
         logger.info(f"Created archive directory at: {archive_directory_path}")
         
-        # Dictionary to store series data by SeriesInstanceUID
-        series_dict = {}
-        # Dictionary to store file paths for each series
-        series_files = {}
+        # Copies the files into the archive. The imported files are private copies (copy_dicom never hardlinks the
+        # datastore), so an archive file hardlinked to one stays unchanged: the later stages only ever rename or
+        # delete the working copy and write modified DICOM files to new paths.
+        archive_copier = FileCopier()
+        archive_strategies = Counter()
+
         # List to store series processing IDs
         series_processing_ids = []
+        # Folders of the series which were successfully separated
+        separated_series_path_folders = []
+        # Series already handed to on_series_ready
+        streamed_series_processing_ids = []
         
-        # First pass: collect metadata and file paths
+        # First pass: collect the file paths of all source directories
+        file_sources = []
         for source_path in source_paths:
             logger.info(f"Processing directory: {source_path}")
             
@@ -131,75 +456,7 @@ def series_preparation(input_data: dict) -> dict:
                 # Walk through all files in the directory and subdirectories
                 for root, _, files in os.walk(source_path):
                     for file_name in files:
-                        file_path = os.path.join(root, file_name)
-                        
-                        try:
-                            # First try to read the dicom file without force = True
-                            try:
-                                dcm = pydicom.dcmread(file_path)
-                            except Exception:
-                                # If initial read fails, try with force=True
-                                try:
-                                    dcm = pydicom.dcmread(file_path, force=True)
-                                    # Check if required tags are present after force read
-                                    if (hasattr(dcm, 'PatientID') and 
-                                        hasattr(dcm, 'StudyInstanceUID') and 
-                                        hasattr(dcm, 'SeriesInstanceUID') and 
-                                        hasattr(dcm, 'Modality')):
-                                        # Save the dataset since we had to use force=True. Ensure file format is DICOM.
-                                        # Remove the original file and replace it with the new one.
-                                        os.remove(file_path)
-                                        logger.info(f"Removed original file {file_name}")
-                                        dcm.save_as(file_path,enforce_file_format=True)
-                                        logger.info(f"Saved file {file_name} after force read")
-                                    else:
-                                        logger.warning(f"File {file_name} is missing required DICOM tags after force read, skipping")
-                                        continue
-                                except Exception as e:
-                                    # If both attempts fail, skip the file
-                                    continue
-
-                            # Check the modality is CT / MR / PET / US. Allow only those files to be processed.
-                            if dcm.Modality not in ['CT', 'MR', 'PET', 'US']:
-                                logger.warning(f"File {file_name} is not a CT / MR / PET / US, skipping")
-                                continue
-                            
-                            # Get SeriesInstanceUID
-                            series_uid = getattr(dcm, 'SeriesInstanceUID', None)
-                            if not series_uid:
-                                logger.warning(f"File {file_name} has no SeriesInstanceUID, skipping")
-                                continue
-                            
-                            # Extract required metadata
-                            series_data = {
-                                'patient_id': getattr(dcm, 'PatientID', ''),
-                                'patient_name': getattr(dcm, 'PatientName', ''),
-                                'gender': getattr(dcm, 'PatientSex', ''),
-                                'scan_date': parse_dicom_date(getattr(dcm, 'StudyDate', '')),
-                                'modality': getattr(dcm, 'Modality', ''),
-                                'study_instance_uid': getattr(dcm, 'StudyInstanceUID', ''),
-                                'protocol_name': getattr(dcm, 'ProtocolName', ''),
-                                'series_instance_uid': series_uid,
-                                'series_description': getattr(dcm, 'SeriesDescription', ''),
-                                'series_import_directory': source_path,
-                                'series_current_directory': os.path.join(series_directory_path, series_uid),
-                                'final_directory': None,  # Will be set after successful move
-                                'copy_dicom_task_id': None  # Will be set after finding the matching task
-                            }
-                            
-                            # Store series data and file path
-                            if series_uid not in series_dict:
-                                series_dict[series_uid] = series_data
-                                series_files[series_uid] = []
-                                logger.info(f"Found new series: {series_uid}")
-                            
-                            series_files[series_uid].append(file_path)
-                            logger.info(f"Found DICOM file for series {series_uid}: {file_name}")
-                            
-                        except Exception as e:
-                            logger.error(f"Error processing file {file_name}: {str(e)}")
-                            processing_errors.append(f"Error processing file {file_name}: {str(e)}")
-                            continue
+                        file_sources.append((os.path.join(root, file_name), source_path))
                 
                 processed_paths.append(source_path)
                 
@@ -207,101 +464,395 @@ def series_preparation(input_data: dict) -> dict:
                 logger.error(f"Error processing directory {source_path}: {str(e)}")
                 processing_errors.append(f"Error processing directory {source_path}: {str(e)}")
                 continue
-        
-        # Create database entries and move files for each series
-        for series_uid, series_data in series_dict.items():
+
+        # Fetch the copy tasks of this run once, keyed by the directory the files were copied to.
+        # The first task in copy_dicom_task_id wins if two tasks share a target directory.
+        copy_tasks_by_directory = {}
+        if copy_dicom_task_id:
+            copy_tasks = {
+                str(task.id): task
+                for task in CopyDicomTaskModel.objects.filter(id__in=copy_dicom_task_id)
+            }
+            for copy_task_id in copy_dicom_task_id:
+                copy_task = copy_tasks.get(str(copy_task_id))
+                if copy_task is not None:
+                    copy_tasks_by_directory.setdefault(copy_task.target_directory, copy_task)
+
+        dicom_path_config = DicomPathConfig.objects.first()
+        quarantine_directory = dicom_path_config.quarantine_directory if dicom_path_config else ''
+        # Localizers, secondary captures... dropped from the series they are stored in
+        excluded_image_types = parse_excluded_image_types(dicom_path_config.excluded_image_types if dicom_path_config else 'LOCALIZER')
+        exclude_secondary_capture = dicom_path_config.exclude_secondary_capture_images if dicom_path_config else True
+        rejected_file_cache = RejectedFileCache()
+        header_workers = dicom_path_config.series_preparation_workers if dicom_path_config else 1
+        max_hold = timedelta(minutes=dicom_path_config.incomplete_series_max_hold_minutes if dicom_path_config else 0)
+
+        # Files rejected by an earlier run are skipped without reading them again
+        file_keys = {}
+        for file_path, source_path in file_sources:
             try:
-                # Create series directory if it doesn't exist
-                os.makedirs(series_data['series_current_directory'], exist_ok=True)
-                
-                # Create series-specific archive directory
-                series_archive_directory = os.path.join(archive_directory_path, series_uid)
-                os.makedirs(series_archive_directory, exist_ok=True)
-                
-                # Find the matching CopyDicomTaskModel for this series
-                copy_dicom_task_instance = None
-                if input_data.get('copy_dicom_task_id'):
-                    # Find the CopyDicomTaskModel that matches the source path
-                    for task_id in input_data['copy_dicom_task_id']:
+                file_keys[file_path] = datastore_file_key(file_path, source_path, copy_tasks_by_directory)
+            except OSError as e:
+                logger.warning(f"Could not stat {file_path}: {str(e)}")
+        rejected_file_cache.load([file_key[0] for file_key in file_keys.values()])
+        previously_rejected = {
+            file_path for file_path, file_key in file_keys.items() if rejected_file_cache.is_rejected(*file_key)
+        }
+        if previously_rejected:
+            logger.info(f"Skipping {len(previously_rejected)} files which were rejected before")
+            file_sources = [(file_path, source_path) for file_path, source_path in file_sources if file_path not in previously_rejected]
+
+        # Read the headers of all files, in parallel worker processes for large imports
+        header_results = dict(zip(
+            [file_path for file_path, _ in file_sources],
+            map_files_in_process_pool(read_series_header_record, [file_path for file_path, _ in file_sources], header_workers)
+        ))
+
+        # In streaming mode the directories are prepared in batches of directories which share no series, so the
+        # series of a batch go downstream as soon as it has been consumed instead of after all directories of the
+        # run. A series whose files are spread over several directories is only sent once with all of them.
+        # Otherwise all directories are prepared together.
+        if on_series_ready is not None:
+            file_source_batches = group_directories_by_series(file_sources, header_results, processed_paths)
+        else:
+            file_source_batches = [file_sources]
+
+        for batch_sources in file_source_batches:
+            # Dictionary to store series data by SeriesInstanceUID
+            series_dict = {}
+            # Dictionary to store file paths for each series
+            series_files = {}
+            # Dictionary to store the header records of the files of each series, in the order of series_files
+            series_headers = {}
+            excluded_image_counts = Counter()
+            excluded_files = []
+
+            # Merge the compact per-file records into series
+            for file_path, source_path in batch_sources:
+                result_type, value = header_results[file_path]
+                file_name = os.path.basename(file_path)
+                if result_type == 'error':
+                    logger.error(value)
+                    processing_errors.append(value)
+                    continue
+                if result_type == 'skipped':
+                    reason, message = value
+                    if message:
+                        logger.warning(message)
+                    # Remember the rejection so that the file is not read or copied again until it changes
+                    quarantine_path = ''
+                    if quarantine_directory:
+                        quarantine_path = quarantine_file(file_path, quarantine_directory, os.path.basename(source_path))
+                    else:
+                        # Without a quarantine directory the file is deleted right away
                         try:
-                            task = CopyDicomTaskModel.objects.get(id=task_id)
-                            if task.target_directory == series_data['series_import_directory']:
-                                copy_dicom_task_instance = task
-                                series_data['copy_dicom_task_id'] = task
-                                logger.info(f"Found matching CopyDicomTaskModel for series {series_uid}: {task.id}")
-                                break
-                        except CopyDicomTaskModel.DoesNotExist:
-                            continue
-                    
-                    if not copy_dicom_task_instance:
-                        logger.warning(f"No matching CopyDicomTaskModel found for series {series_uid} with import directory {series_data['series_import_directory']}")
-                
-                # Create the main series processing entry
-                series_processing = DicomSeriesProcessingModel.objects.create(
-                    patient_id=series_data['patient_id'],
-                    patient_name=series_data['patient_name'],
-                    gender=series_data['gender'],
-                    scan_date=series_data['scan_date'],
-                    modality=series_data['modality'],
-                    protocol_name=series_data['protocol_name'],
-                    study_instance_uid=series_data['study_instance_uid'],
-                    series_instance_uid=series_data['series_instance_uid'],
-                    series_description=series_data['series_description'],
-                    series_import_directory=series_data['series_import_directory'],
-                    series_current_directory=series_data['series_current_directory'],
-                    series_archive_directory=series_archive_directory,
-                    processing_status=ProcessingStatusChoices.SERIES_SEPARATED,
-                    series_state=SeriesState.PROCESSING,
-                    copy_dicom_task_id=copy_dicom_task_instance
+                            os.remove(file_path)
+                        except OSError as e:
+                            logger.warning(f"Could not remove rejected file {file_path}: {str(e)}")
+                    if file_path in file_keys:
+                        rejected_file_cache.reject(*file_keys[file_path], reason, message, quarantine_path)
+                    continue
+
+                header_record = value
+                series_uid = header_record.series_instance_uid
+
+                excluded_label = get_excluded_image_label(
+                    header_record.image_type, header_record.sop_class_uid, excluded_image_types, exclude_secondary_capture
                 )
-                logger.info(f"Created database entry for series: {series_uid}")
-                series_processing_ids.append(str(series_processing.id))
+                if excluded_label is not None:
+                    logger.info(f"Dropping {excluded_label} image {file_name} from series {series_uid}")
+                    excluded_image_counts[series_uid] += 1
+                    excluded_files.append(file_path)
+                    continue
+            
+                # Extract required metadata
+                series_data = {
+                    'patient_id': header_record.patient_id,
+                    'patient_name': header_record.patient_name,
+                    'gender': header_record.gender,
+                    'scan_date': parse_dicom_date(header_record.study_date),
+                    'modality': header_record.modality,
+                    'study_instance_uid': header_record.study_instance_uid,
+                    'protocol_name': header_record.protocol_name,
+                    'series_instance_uid': series_uid,
+                    'series_description': header_record.series_description,
+                    'series_import_directory': source_path,
+                    'series_current_directory': os.path.join(series_directory_path, series_uid),
+                    'final_directory': None,  # Will be set after successful move
+                    'copy_dicom_task_id': None  # Will be set after finding the matching task
+                }
+            
+                # Store series data and file path
+                if series_uid not in series_dict:
+                    series_dict[series_uid] = series_data
+                    series_files[series_uid] = []
+                    series_headers[series_uid] = []
+                    logger.info(f"Found new series: {series_uid}")
+            
+                series_files[series_uid].append(file_path)
+                series_headers[series_uid].append(header_record)
+                logger.info(f"Found DICOM file for series {series_uid}: {file_name}")
 
-                # Create a log entry with processing summary
-                processing_summary = (
-                    f"Series {series_uid} processed successfully:\n"
-                    f"- Patient ID: {series_data['patient_id']}\n"
-                    f"- Study UID: {series_data['study_instance_uid']}\n"
-                    f"- Series Description: {series_data['series_description']}\n"
-                    f"- Import Directory: {series_data['series_import_directory']}\n"
-                    f"- Current Directory: {series_data['series_current_directory']}"
+            # Complete the series of this import with their files archived by earlier runs, as only the new or
+            # changed files of a datastore directory are copied
+            archived_files = set()
+            merged_file_counts = Counter()
+            archived_series_files = read_archived_series_files(series_files, series_headers, archive_directory_path, header_workers)
+            for series_uid, archived_records in archived_series_files.items():
+                for archive_path, header_record in archived_records:
+                    if get_excluded_image_label(header_record.image_type, header_record.sop_class_uid, excluded_image_types, exclude_secondary_capture) is not None:
+                        continue
+                    series_files[series_uid].append(archive_path)
+                    series_headers[series_uid].append(header_record)
+                    archived_files.add(archive_path)
+                    merged_file_counts[series_uid] += 1
+                if merged_file_counts[series_uid]:
+                    logger.info(f"Added {merged_file_counts[series_uid]} archived files to series {series_uid}")
+        
+            # Hold back series with missing slices until the remaining slices arrive. Their files are dropped and
+            # removed from the manifest of their copy task, so the datastore directory is copied again once its
+            # files change (see copy_dicom). After incomplete_series_max_hold_minutes the series is sent as it is.
+            # Series with files that can not be copied again (no copy task) are never held.
+            now = timezone.now()
+            file_source_paths = dict(batch_sources)
+            series_completeness = {}
+            holding_copy_tasks = {}
+            released_copy_tasks = {}
+            held_files = []
+            for series_uid in list(series_dict):
+                headers = series_headers[series_uid]
+                completeness = analyse_series_completeness(
+                    [header.instance_number for header in headers],
+                    [header.image_position for header in headers],
+                    [header.image_orientation for header in headers],
+                    series_dict[series_uid]['modality']
                 )
+                series_completeness[series_uid] = completeness
+                series_copy_tasks = {
+                    copy_task.id: copy_task
+                    for copy_task in (copy_tasks_by_directory.get(file_source_paths.get(file_path)) for file_path in series_files[series_uid])
+                    if copy_task is not None
+                }
+                if completeness.complete:
+                    released_copy_tasks.update(series_copy_tasks)
+                    continue
 
-                DicomSeriesProcessingLogModel.objects.create(
-                    task_id=task_id,
-                    dicom_series_processing_id=series_processing,
-                    processing_status=ProcessingStatusChoices.SERIES_SEPARATED,
-                    processing_status_message=processing_summary
+                held_since = min(
+                    (copy_task.incomplete_series_held_since for copy_task in series_copy_tasks.values() if copy_task.incomplete_series_held_since),
+                    default=now
                 )
-                logger.info(f"Created log entry for series: {series_uid}")
+                untracked_files = [
+                    file_path for file_path in series_files[series_uid]
+                    if file_path not in archived_files and copy_tasks_by_directory.get(file_source_paths.get(file_path)) is None
+                ]
+                if not series_copy_tasks or untracked_files or now - held_since >= max_hold:
+                    logger.warning(f"Sending incomplete series {series_uid} ({completeness.slice_count} files): {'; '.join(completeness.reasons)}")
+                    released_copy_tasks.update(series_copy_tasks)
+                    continue
 
-                # Move files after successful database creation
+                logger.warning(f"Holding back incomplete series {series_uid} ({completeness.slice_count} files, held since {held_since}): {'; '.join(completeness.reasons)}")
                 for file_path in series_files[series_uid]:
+                    # Archived files stay in the archive
+                    if file_path in archived_files:
+                        continue
+                    copy_task = copy_tasks_by_directory.get(file_source_paths.get(file_path))
+                    if copy_task is None:
+                        continue
+                    copy_task.file_manifest.pop(os.path.basename(file_path), None)
+                    held_files.append(file_path)
+                for copy_task in series_copy_tasks.values():
+                    copy_task.copy_completed = False
+                    copy_task.incomplete_series_checked_at = now
+                    if copy_task.incomplete_series_held_since is None:
+                        copy_task.incomplete_series_held_since = now
+                holding_copy_tasks.update(series_copy_tasks)
+                del series_dict[series_uid]
+                del series_files[series_uid]
+
+            changed_copy_tasks = list(holding_copy_tasks.values())
+            for copy_task_id, copy_task in released_copy_tasks.items():
+                if copy_task_id not in holding_copy_tasks and copy_task.incomplete_series_held_since is not None:
+                    copy_task.incomplete_series_held_since = None
+                    copy_task.incomplete_series_checked_at = None
+                    changed_copy_tasks.append(copy_task)
+            for copy_task in changed_copy_tasks:
+                copy_task.updated_at = now
+
+            # Build the database entries of all series and write them together
+            series_processing_entries = {}
+            series_log_entries = []
+            for series_uid, series_data in series_dict.items():
+                try:
+                    # Create series directory if it doesn't exist
+                    os.makedirs(series_data['series_current_directory'], exist_ok=True)
+                
+                    # Create series-specific archive directory
+                    series_archive_directory = os.path.join(archive_directory_path, series_uid)
+                    os.makedirs(series_archive_directory, exist_ok=True)
+                
+                    # Find the matching CopyDicomTaskModel for this series
+                    copy_dicom_task_instance = None
+                    if copy_dicom_task_id:
+                        copy_dicom_task_instance = copy_tasks_by_directory.get(series_data['series_import_directory'])
+                        if copy_dicom_task_instance:
+                            series_data['copy_dicom_task_id'] = copy_dicom_task_instance
+                            logger.info(f"Found matching CopyDicomTaskModel for series {series_uid}: {copy_dicom_task_instance.id}")
+                        else:
+                            logger.warning(f"No matching CopyDicomTaskModel found for series {series_uid} with import directory {series_data['series_import_directory']}")
+                
+                    # Header record of the series, stored so that the later stages do not parse the files again.
+                    # The headers do not change until deidentification.
+                    series_header = {}
+                    header_file = series_files[series_uid][0]
                     try:
-                        file_name = os.path.basename(file_path)
-                        target_path = os.path.join(series_data['series_current_directory'], file_name)
-                        # First copy to series-specific archive directory
-                        archive_path = os.path.join(series_archive_directory, file_name)
-                        
-                        shutil.copyfile(file_path, archive_path, follow_symlinks=True)
-
-                        logger.info(f"Successfully archived DICOM file: {file_name}")
-                        # Then move to target directory
-                        shutil.move(file_path, target_path)
-
-                        logger.info(f"Successfully archived and moved DICOM file: {file_name}")
+                        series_header = {
+                            'file_name': os.path.basename(header_file),
+                            'elements': build_header_record(read_dicom_header(header_file))
+                        }
                     except Exception as e:
-                        logger.error(f"Error moving file {file_name}: {str(e)}")
-                        processing_errors.append(f"Error moving file {file_name}: {str(e)}")
-                        continue
+                        logger.warning(f"Could not read the header record of series {series_uid} from {header_file}: {str(e)}")
+
+                    # The main series processing entry
+                    series_processing = DicomSeriesProcessingModel(
+                        patient_id=series_data['patient_id'],
+                        patient_name=series_data['patient_name'],
+                        gender=series_data['gender'],
+                        scan_date=series_data['scan_date'],
+                        modality=series_data['modality'],
+                        protocol_name=series_data['protocol_name'],
+                        study_instance_uid=series_data['study_instance_uid'],
+                        series_instance_uid=series_data['series_instance_uid'],
+                        series_description=series_data['series_description'],
+                        series_import_directory=series_data['series_import_directory'],
+                        series_current_directory=series_data['series_current_directory'],
+                        series_archive_directory=series_archive_directory,
+                        processing_status=ProcessingStatusChoices.SERIES_SEPARATED,
+                        series_state=SeriesState.PROCESSING,
+                        copy_dicom_task_id=copy_dicom_task_instance,
+                        series_header=series_header,
+                        excluded_image_count=excluded_image_counts[series_uid]
+                    )
+                    series_processing_entries[series_uid] = series_processing
+
+                    # A log entry with processing summary
+                    processing_summary = (
+                        f"Series {series_uid} processed successfully:\n"
+                        f"- Patient ID: {series_data['patient_id']}\n"
+                        f"- Study UID: {series_data['study_instance_uid']}\n"
+                        f"- Series Description: {series_data['series_description']}\n"
+                        f"- Import Directory: {series_data['series_import_directory']}\n"
+                        f"- Current Directory: {series_data['series_current_directory']}"
+                    )
+                    if merged_file_counts[series_uid]:
+                        processing_summary += f"\n- Archived files added: {merged_file_counts[series_uid]} (this import only held the new or changed files of the series)"
+                    if excluded_image_counts[series_uid]:
+                        processing_summary += f"\n- Dropped images: {excluded_image_counts[series_uid]} (localizer, secondary capture or excluded image type)"
+                    if series_completeness[series_uid].reasons:
+                        processing_summary += f"\n- Completeness: {'; '.join(series_completeness[series_uid].reasons)}"
+                    series_log_entries.append(DicomSeriesProcessingLogModel(
+                        task_id=task_id,
+                        dicom_series_processing_id=series_processing,
+                        processing_status=ProcessingStatusChoices.SERIES_SEPARATED,
+                        processing_status_message=processing_summary
+                    ))
+
+                except Exception as e:
+                    logger.error(f"Error processing series {series_uid}: {str(e)}")
+                    processing_errors.append(f"Error processing series {series_uid}: {str(e)}")
+
+            try:
+                with transaction.atomic():
+                    DicomSeriesProcessingModel.objects.bulk_create(series_processing_entries.values(), batch_size=500)
+                    DicomSeriesProcessingLogModel.objects.bulk_create(series_log_entries, batch_size=500)
+                    CopyDicomTaskModel.objects.bulk_update(
+                        changed_copy_tasks,
+                        ['copy_completed', 'file_manifest', 'incomplete_series_held_since', 'incomplete_series_checked_at', 'updated_at'],
+                        batch_size=500
+                    )
+                    rejected_file_cache.save()
+                logger.info(f"Created database and log entries for {len(series_processing_entries)} series")
+                # The files of held back series are copied again once their directory changes
+                for file_path in held_files:
+                    try:
+                        os.remove(file_path)
+                    except OSError as e:
+                        logger.warning(f"Could not remove held back file {file_path}: {str(e)}")
+                # Dropped images stay in the manifest of their copy task and are not copied again
+                for file_path in excluded_files:
+                    try:
+                        os.remove(file_path)
+                    except OSError as e:
+                        logger.warning(f"Could not remove dropped image {file_path}: {str(e)}")
+                if excluded_files:
+                    logger.info(f"Dropped {len(excluded_files)} images from {len(excluded_image_counts)} series")
+            except Exception as e:
+                logger.error(f"Error creating the database entries of {len(series_processing_entries)} series: {str(e)}")
+                processing_errors.append(f"Error creating the database entries of {len(series_processing_entries)} series: {str(e)}")
+                series_processing_entries = {}
+
+            # Move files after successful database creation
+            archived_file_entries = []
+            for series_uid, series_processing in series_processing_entries.items():
+                series_data = series_dict[series_uid]
+                series_processing_ids.append(str(series_processing.id))
+                series_archive_directory = series_processing.series_archive_directory
+                try:
+                    for file_path, header_record in zip(series_files[series_uid], series_headers[series_uid]):
+                        try:
+                            file_name = os.path.basename(file_path)
+                            target_path = os.path.join(series_data['series_current_directory'], file_name)
+                            if file_path in archived_files:
+                                # Files of the series archived by an earlier run are copied back from the archive
+                                if os.path.lexists(target_path):
+                                    os.remove(target_path)
+                                archive_copier.copy(file_path, target_path)
+                                logger.info(f"Copied archived DICOM file: {file_name}")
+                                continue
+                            # First copy to series-specific archive directory. The archive shares the data of
+                            # the file (reflink or hardlink) when both folders are on the same volume.
+                            archive_path = os.path.join(series_archive_directory, file_name)
+                            if os.path.lexists(archive_path):
+                                os.remove(archive_path)
+                            archive_strategies[archive_copier.copy(os.path.realpath(file_path), archive_path)] += 1
+                            # Later imports of the series reuse the header record instead of reading the file again
+                            archived_file_entries.append(archived_file_entry(archive_path, series_uid, header_record))
+
+                            logger.info(f"Successfully archived DICOM file: {file_name}")
+                            # Then move to target directory
+                            shutil.move(file_path, target_path)
 
-                # Set the final directory after successful move
-                series_data['final_directory'] = series_data['series_current_directory']
+                            logger.info(f"Successfully archived and moved DICOM file: {file_name}")
+                        except Exception as e:
+                            logger.error(f"Error moving file {file_name}: {str(e)}")
+                            processing_errors.append(f"Error moving file {file_name}: {str(e)}")
+                            continue
+
+                    # Set the final directory after successful move
+                    series_data['final_directory'] = series_data['series_current_directory']
+                    separated_series_path_folders.append(series_data['final_directory'])
+
+                    # Hand the series downstream right away in streaming mode
+                    if on_series_ready is not None:
+                        on_series_ready({
+                            'status': 'success',
+                            'message': f"Series {series_uid} prepared",
+                            'separated_series_path_folders': [series_data['final_directory']],
+                            'series_processing_ids': [str(series_processing.id)]
+                        })
+                        streamed_series_processing_ids.append(str(series_processing.id))
 
+                except Exception as e:
+                    logger.error(f"Error processing series {series_uid}: {str(e)}")
+                    processing_errors.append(f"Error processing series {series_uid}: {str(e)}")
+
+            try:
+                save_archived_file_entries(archived_file_entries)
             except Exception as e:
-                logger.error(f"Error processing series {series_uid}: {str(e)}")
-                processing_errors.append(f"Error processing series {series_uid}: {str(e)}")
+                logger.warning(f"Could not store the header records of {len(archived_file_entries)} archived files: {str(e)}")
         
+        if archive_strategies:
+            logger.info(f"Archived files by copy strategy: {dict(archive_strategies)}")
+
         if not processed_paths:
             logger.error("No directories were successfully processed")
             return {
@@ -314,19 +865,16 @@ def series_preparation(input_data: dict) -> dict:
         # If we have both successes and failures, return partial_failure
         if processing_errors:
             logger.warning(f"Series preparation completed with some errors: {processing_errors}")
-            # Get all final directories where series were successfully processed
-            separated_series_path_folders = [series['final_directory'] for series in series_dict.values() if series['final_directory']]
             
             return {
                 'status': 'partial_failure',
                 'message': f"Series preparation completed with some errors: {', '.join(processing_errors)}",
                 'separated_series_path_folders': separated_series_path_folders,
-                'series_processing_ids': series_processing_ids
+                'series_processing_ids': series_processing_ids,
+                'streamed_series_processing_ids': streamed_series_processing_ids
             }
         
         logger.info("Series preparation process completed successfully")
-        # Get all final directories where series were successfully processed
-        separated_series_path_folders = [series['final_directory'] for series in series_dict.values() if series['final_directory']]
         
         # Delete source directories after successful processing
         if status == 'success':
@@ -342,7 +890,8 @@ def series_preparation(input_data: dict) -> dict:
             'status': 'success',
             'message': 'Series preparation completed successfully',
             'separated_series_path_folders': separated_series_path_folders,
-            'series_processing_ids': series_processing_ids
+            'series_processing_ids': series_processing_ids,
+            'streamed_series_processing_ids': streamed_series_processing_ids
         }
         
     except Exception as e:
@@ -0,0 +1,112 @@
+from dicomapp.models import DirectoryStabilityModel
+from logging import getLogger
+from datetime import timedelta
+
+logger = getLogger(__name__)
+
+
+class StabilityTracker:
+    """
+    Decides when a datastore directory has finished arriving.
+
+    For every directory the tracker remembers the signature (file count, total size and newest file
+    modification time) seen by the previous scan in DirectoryStabilityModel. A directory is ready once
+    two consecutive scans see the same signature and at least minimum_settle_seconds have passed since
+    the signature last changed. Scanners which finish writing in seconds are picked up on the next scan,
+    while directories which keep growing are held back until they stop changing.
+
+    Directories whose newest modification is older than fallback_window are ready on their first scan,
+    so directories that arrived while nothing was scanning are not delayed by an extra scan.
+
+    The tracker never lists a directory itself. The signature of a directory the walk took from the scan index
+    (its modification time has not moved since it was last listed) is built from the stored file count and
+    total size, with the newest file modification time of the previous scan.
+
+    Args:
+        minimum_settle_seconds (int): Minimum time the signature must stay unchanged.
+        fallback_window (timedelta): Age after which a directory is ready without a second scan.
+    """
+    def __init__(self, minimum_settle_seconds, fallback_window=None):
+        self.minimum_settle = timedelta(seconds=minimum_settle_seconds)
+        self.fallback_window = fallback_window
+        self.entries = {}
+        self.new_entries = []
+        self.changed_entries = []
+
+    def load(self, directory_paths, batch_size=500):
+        """Fetch the DirectoryStabilityModel entries of the directories that will be checked."""
+        for start in range(0, len(directory_paths), batch_size):
+            batch = directory_paths[start:start + batch_size]
+            self.entries.update(
+                (entry.directory_path, entry)
+                for entry in DirectoryStabilityModel.objects.filter(directory_path__in=batch)
+            )
+
+    def is_ready(self, directory_record, now):
+        """
+        Record the current signature of the directory and return whether it has settled.
+
+        Args:
+            directory_record (DirectoryRecord): The directory, see datastore_scan.py.
+            now (datetime): The time of the scan.
+
+        Returns:
+            bool: True if the directory can be copied.
+        """
+        entry = self.entries.get(directory_record.path)
+        file_count = directory_record.file_count
+        total_size = directory_record.total_size
+        if directory_record.listed:
+            max_file_modification_time = max(
+                (file_record.modification_time for file_record in directory_record.files), default=None
+            )
+        else:
+            max_file_modification_time = entry.max_file_modification_time if entry is not None else None
+
+        if entry is None:
+            entry = DirectoryStabilityModel(directory_path=directory_record.path, signature_changed_at=now)
+            self.entries[directory_record.path] = entry
+            self.new_entries.append(entry)
+            unchanged = False
+        else:
+            unchanged = (
+                entry.file_count == file_count
+                and entry.total_size == total_size
+                and entry.max_file_modification_time == max_file_modification_time
+            )
+            if not unchanged:
+                entry.signature_changed_at = now
+            entry.updated_at = now
+            self.changed_entries.append(entry)
+        entry.file_count = file_count
+        entry.total_size = total_size
+        entry.max_file_modification_time = max_file_modification_time
+        entry.last_scanned_at = now
+
+        if unchanged and now - entry.signature_changed_at >= self.minimum_settle:
+            return True
+
+        if self.fallback_window is not None:
+            newest_modification = max(directory_record.modification_time, max_file_modification_time or 0)
+            if now.timestamp() - newest_modification >= self.fallback_window.total_seconds():
+                logger.debug(f"{directory_record.path} has not been modified for {self.fallback_window}")
+                return True
+
+        logger.info(f"Holding back {directory_record.path} until its files settle ({file_count} files, {total_size} bytes, unchanged: {unchanged})")
+        return False
+
+    def changed_since(self, directory_path, since):
+        """Return whether the signature of the directory has changed after the time, True if it is not tracked."""
+        entry = self.entries.get(directory_path)
+        return entry is None or entry.signature_changed_at is None or entry.signature_changed_at > since
+
+    def save(self):
+        """Write the signatures recorded during the scan with bulk writes."""
+        DirectoryStabilityModel.objects.bulk_create(self.new_entries, batch_size=500)
+        DirectoryStabilityModel.objects.bulk_update(
+            self.changed_entries,
+            ['file_count', 'total_size', 'max_file_modification_time', 'signature_changed_at', 'last_scanned_at', 'updated_at'],
+            batch_size=500
+        )
+        self.new_entries = []
+        self.changed_entries = []
@@ -0,0 +1,102 @@
+from logging import getLogger
+from collections import namedtuple
+import hashlib
+import threading
+import time
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from dicom_handler.models import ModelYamlInfo
+
+logger = getLogger(__name__)
+
+# Seconds during which the templates of a process are used without comparing the fingerprint of the table.
+# Template matching runs one task per series, so a batch of series in a worker costs one fingerprint query
+# per interval instead of one per series.
+TEMPLATE_INDEX_CHECK_SECONDS = 30
+
+# The templates of this process by file hash, see get_template_index()
+_template_index = None
+_template_index_lock = threading.Lock()
+# time.monotonic() when the fingerprint of _template_index was last compared with the table
+_template_index_checked_at = None
+
+TemplateIndex = namedtuple('TemplateIndex', [
+    'templates_by_hash',    # file hash -> list of ModelYamlInfo entries with that hash
+    'fingerprint',          # get_templates_fingerprint() when the index was built
+])
+
+
+def calculate_hash(file_path):
+    """Calculate SHA-512 hash of a file."""
+    try:
+        hash_md5 = hashlib.sha512()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(4096), b""):
+                hash_md5.update(chunk)
+        return hash_md5.hexdigest()
+    except Exception as e:
+        logger.error(f"Error calculating hash for {file_path}: {str(e)}")
+        raise
+
+
+def get_templates_fingerprint():
+    """
+    Return the number of rows and the latest modification time of the ModelYamlInfo table.
+
+    Templates are added in the web process while the series are matched in the Celery workers, so the signals
+    below cannot reach the index of a worker. A worker compares this fingerprint at most once every
+    TEMPLATE_INDEX_CHECK_SECONDS instead.
+    """
+    return tuple(ModelYamlInfo.objects.aggregate(count=Count('pk'), modified_at=Max('modified_at')).values())
+
+
+def get_template_index():
+    """
+    Return the templates of this process by file hash, loading them again when the table has changed.
+
+    Templates changed in another process are picked up within TEMPLATE_INDEX_CHECK_SECONDS, changes made in
+    this process right away (see invalidate_template_index).
+
+    Returns:
+        TemplateIndex: The templates by file hash.
+    """
+    global _template_index, _template_index_checked_at
+    now = time.monotonic()
+    with _template_index_lock:
+        if _template_index is not None and now - _template_index_checked_at < TEMPLATE_INDEX_CHECK_SECONDS:
+            return _template_index
+        fingerprint = get_templates_fingerprint()
+        if _template_index is None or _template_index.fingerprint != fingerprint:
+            templates_by_hash = {}
+            for template in ModelYamlInfo.objects.exclude(file_hash__isnull=True):
+                templates_by_hash.setdefault(template.file_hash, []).append(template)
+            logger.info(f"Loaded {sum(len(templates) for templates in templates_by_hash.values())} templates by file hash")
+            _template_index = TemplateIndex(templates_by_hash, fingerprint)
+        _template_index_checked_at = now
+        return _template_index
+
+
+def get_template_by_hash(template_index, file_hash):
+    """
+    Return the ModelYamlInfo entry with the file hash, None if there is none.
+
+    Raises:
+        ModelYamlInfo.MultipleObjectsReturned: If more than one template has the hash.
+    """
+    templates = template_index.templates_by_hash.get(file_hash, [])
+    if len(templates) > 1:
+        raise ModelYamlInfo.MultipleObjectsReturned(
+            f"{len(templates)} templates have the file hash {file_hash}: {', '.join(template.yaml_name for template in templates)}"
+        )
+    return templates[0] if templates else None
+
+
+@receiver(post_save, sender=ModelYamlInfo)
+@receiver(post_delete, sender=ModelYamlInfo)
+def invalidate_template_index(sender, **kwargs):
+    """Drop the templates of this process when a ModelYamlInfo entry is saved or deleted."""
+    global _template_index
+    with _template_index_lock:
+        _template_index = None
+    logger.debug("Template index invalidated by a change of ModelYamlInfo")
@@ -0,0 +1,97 @@
+import logging
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from dicom_handler.models import DicomPathConfig
+from dicomapp.dicom_utils.datastore_io import DatastoreIO, DatastoreUnavailableError, resolve_datastore_path
+from dicomapp.dicom_utils.datastore_watcher import DatastoreWatcher, filesystem_events_supported
+from dicomapp.tasks import send_dicom_to_remote_server_pipeline
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Watch the datastore for filesystem events and start the DICOM export pipeline only for the directories which changed. "
+        "Falls back to periodic full scans of the datastore for mounts which do not deliver filesystem events (CIFS / NFS). "
+        "While watching, the full datastore is still scanned at a long interval to retry directories which only a later scan picks up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll-interval', type=int, default=600,
+                            help='Seconds between full datastore scans when filesystem events are not available (default: 600)')
+        parser.add_argument('--full-scan-interval', type=int, default=1800,
+                            help='Seconds between full datastore scans while watching for filesystem events. They retry directories which '
+                                 'were still settling, incomplete series whose hold expired and directories skipped while the mount was '
+                                 'unavailable (default: 1800)')
+        parser.add_argument('--check-interval', type=int, default=5,
+                            help='Seconds between checks for touched directories which have settled (default: 5)')
+        parser.add_argument('--force-polling', action='store_true',
+                            help='Do not use filesystem events and scan the full datastore periodically')
+
+    def handle(self, *args, **options):
+        path_config = DicomPathConfig.get_instance()
+        if not path_config.datastorepath:
+            raise CommandError("No valid datastore path configured")
+        # Resolving the path and checking its filesystem touch the mount, so they run under the datastore deadline.
+        # A stalled or backed off mount is scanned periodically by the pipeline once it is available again.
+        try:
+            datastore_path = resolve_datastore_path(path_config, timezone.now())
+            events_supported = (
+                not options['force_polling']
+                and DatastoreIO(path_config.datastore_io_timeout_seconds).call(filesystem_events_supported, datastore_path)
+            )
+        except DatastoreUnavailableError as e:
+            logger.error(f"Not watching the datastore for filesystem events as it is unavailable: {str(e)}")
+            events_supported = False
+
+        # Start with a full scan to pick up anything which arrived while the watcher was not running
+        result = send_dicom_to_remote_server_pipeline.delay()
+        logger.info(f"Started full datastore scan {result.id}")
+
+        try:
+            if events_supported:
+                self.watch(datastore_path, path_config.minimum_settle_seconds, options['check_interval'], options['full_scan_interval'])
+            logger.info(f"Falling back to full datastore scans every {options['poll_interval']} seconds")
+            self.poll(options['poll_interval'])
+        except KeyboardInterrupt:
+            logger.info("Datastore watcher stopped")
+
+    def watch(self, datastore_path, minimum_settle_seconds, check_interval, full_scan_interval):
+        """
+        Start the pipeline for touched directories once they have settled. Returns if the observer stops.
+
+        Directories which were still settling, series held back as incomplete and directories skipped while the
+        mount was unavailable are only retried by a later scan, so the full datastore is scanned every
+        full_scan_interval seconds as well. The scan uses the directory index and only lists changed directories.
+        """
+        watcher = DatastoreWatcher(datastore_path, max(minimum_settle_seconds, check_interval))
+        try:
+            watcher.start()
+        except OSError as e:
+            # For example when the inotify watch limit is reached
+            logger.error(f"Could not watch {datastore_path} for filesystem events: {str(e)}")
+            return
+
+        try:
+            next_full_scan = time.monotonic() + full_scan_interval
+            while watcher.is_alive():
+                time.sleep(check_interval)
+                directories = watcher.pop_settled_directories()
+                if directories:
+                    result = send_dicom_to_remote_server_pipeline.delay(source_directories=directories)
+                    logger.info(f"Started DICOM export pipeline {result.id} for {len(directories)} touched directories")
+                if time.monotonic() >= next_full_scan:
+                    next_full_scan = time.monotonic() + full_scan_interval
+                    result = send_dicom_to_remote_server_pipeline.delay()
+                    logger.info(f"Started full datastore scan {result.id}")
+            logger.error(f"Filesystem observer for {datastore_path} stopped unexpectedly")
+        finally:
+            watcher.stop()
+
+    def poll(self, poll_interval):
+        """Run the existing full datastore scan periodically."""
+        while True:
+            time.sleep(poll_interval)
+            result = send_dicom_to_remote_server_pipeline.delay()
+            logger.info(f"Started full datastore scan {result.id}")
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-18 10:45
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0005_dicomseriesprocessingmodel_dicomapp_di_patient_15a7f8_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatastoreScanIndexModel',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('directory_path', models.CharField(help_text='The datastore directory described by this index entry', max_length=512, unique=True)),
+                ('directory_modification_time', models.FloatField(help_text='The modification time (st_mtime) of the directory when it was last listed')),
+                ('file_count', models.IntegerField(default=0, help_text='Number of files directly inside the directory')),
+                ('total_size', models.BigIntegerField(default=0, help_text='Total size in bytes of the files directly inside the directory')),
+                ('subdirectories', models.JSONField(blank=True, default=list, help_text='Names of the immediate subdirectories of the directory')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Datastore Scan Index',
+                'verbose_name_plural': 'Datastore Scan Index',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 11:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0006_datastorescanindexmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='copydicomtaskmodel',
+            name='copy_strategy',
+            field=models.CharField(blank=True, choices=[('REFLINK', 'Reflink'), ('HARDLINK', 'Hardlink'), ('COPY_FILE_RANGE', 'Copy File Range'), ('COPY', 'Copy')], help_text='How the files were copied from the datastore (reflink, hardlink, in-kernel copy_file_range or a regular copy)', max_length=20),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0007_copydicomtaskmodel_copy_strategy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='copydicomtaskmodel',
+            name='files_copied',
+            field=models.IntegerField(default=0, help_text='Number of files copied from the source directory in the last copy'),
+        ),
+        migrations.AddField(
+            model_name='copydicomtaskmodel',
+            name='bytes_copied',
+            field=models.BigIntegerField(default=0, help_text='Number of bytes copied from the source directory in the last copy'),
+        ),
+        migrations.AddField(
+            model_name='copydicomtaskmodel',
+            name='copy_duration_seconds',
+            field=models.FloatField(blank=True, help_text='Wall time of the last copy in seconds', null=True),
+        ),
+        migrations.AddField(
+            model_name='copydicomtaskmodel',
+            name='copy_files_per_second',
+            field=models.FloatField(blank=True, help_text='Files copied per second in the last copy', null=True),
+        ),
+        migrations.AddField(
+            model_name='copydicomtaskmodel',
+            name='copy_megabytes_per_second',
+            field=models.FloatField(blank=True, help_text='Megabytes (MiB) copied per second in the last copy', null=True),
+        ),
+    ]
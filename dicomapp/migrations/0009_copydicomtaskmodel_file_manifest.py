@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0008_copydicomtaskmodel_copy_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='copydicomtaskmodel',
+            name='file_manifest',
+            field=models.JSONField(blank=True, default=dict, help_text='The files of the source directory at the last copy, mapping file name to size, modification time and optional hash'),
+        ),
+    ]
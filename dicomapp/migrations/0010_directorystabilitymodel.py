@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 12:58
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0009_copydicomtaskmodel_file_manifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectoryStabilityModel',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('directory_path', models.CharField(help_text='The datastore directory tracked for arrival stability', max_length=512, unique=True)),
+                ('file_count', models.IntegerField(default=0, help_text='Number of files directly inside the directory at the last scan')),
+                ('total_size', models.BigIntegerField(default=0, help_text='Total size in bytes of the files directly inside the directory at the last scan')),
+                ('max_file_modification_time', models.FloatField(blank=True, help_text='The newest modification time (st_mtime) of the files at the last scan', null=True)),
+                ('signature_changed_at', models.DateTimeField(help_text='When a scan last saw the file count, size or newest modification time change')),
+                ('last_scanned_at', models.DateTimeField(help_text='When the directory was last scanned')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Directory Stability',
+                'verbose_name_plural': 'Directory Stability',
+            },
+        ),
+    ]
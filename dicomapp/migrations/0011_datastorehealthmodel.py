@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-18 13:24
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0010_directorystabilitymodel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatastoreHealthModel',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('datastore_path', models.CharField(help_text='The datastore mount', max_length=512, unique=True)),
+                ('healthy', models.BooleanField(default=True, help_text='False if the last scan of the datastore timed out')),
+                ('consecutive_failures', models.IntegerField(default=0)),
+                ('unavailable_until', models.DateTimeField(blank=True, help_text='The datastore is not scanned again before this time', null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('last_checked_at', models.DateTimeField(blank=True, null=True)),
+                ('metadata_calls', models.IntegerField(default=0, help_text='Number of metadata calls (stat, directory listings) of the last scan')),
+                ('latency_p50_ms', models.FloatField(blank=True, help_text='Median metadata call latency of the last scan in milliseconds', null=True)),
+                ('latency_p95_ms', models.FloatField(blank=True, help_text='95th percentile metadata call latency of the last scan in milliseconds', null=True)),
+                ('latency_p99_ms', models.FloatField(blank=True, help_text='99th percentile metadata call latency of the last scan in milliseconds', null=True)),
+                ('latency_max_ms', models.FloatField(blank=True, help_text='Slowest metadata call of the last scan in milliseconds', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Datastore Health',
+                'verbose_name_plural': 'Datastore Health',
+            },
+        ),
+    ]
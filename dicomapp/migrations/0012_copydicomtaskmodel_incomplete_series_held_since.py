@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0011_datastorehealthmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='copydicomtaskmodel',
+            name='incomplete_series_held_since',
+            field=models.DateTimeField(blank=True, help_text='When a series copied from this directory was first held back because slices were missing. Cleared once the series is complete or has been sent anyway', null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0012_copydicomtaskmodel_incomplete_series_held_since'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicomseriesprocessingmodel',
+            name='series_header',
+            field=models.JSONField(blank=True, default=dict, help_text='Header of a file of the series read once by series preparation (file name and elements without sequences, binary values and pixel data). Template matching uses it instead of parsing the files again'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:34
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0013_dicomseriesprocessingmodel_series_header'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RejectedFileModel',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_path', models.CharField(help_text='The path of the file in the datastore', max_length=1024, unique=True)),
+                ('file_size', models.BigIntegerField(help_text='Size of the file when it was rejected')),
+                ('file_modification_time', models.FloatField(help_text='Modification time (unix timestamp) of the file when it was rejected')),
+                ('reason', models.CharField(choices=[('NOT_DICOM', 'Not Dicom'), ('UNREADABLE', 'Unreadable'), ('MISSING_TAGS', 'Missing Tags'), ('UNSUPPORTED_MODALITY', 'Unsupported Modality')], max_length=30)),
+                ('reason_message', models.TextField(blank=True)),
+                ('quarantine_path', models.CharField(blank=True, help_text='Where the rejected file was moved to, if a quarantine directory is configured', max_length=1024)),
+                ('rejection_count', models.IntegerField(default=1, help_text='Number of times the file was rejected')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Rejected File',
+                'verbose_name_plural': 'Rejected Files',
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0014_rejectedfilemodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='copydicomtaskmodel',
+            name='skipped_file_counts',
+            field=models.JSONField(blank=True, default=dict, help_text='Number of files left out of the last copy because their header showed they are not images that can be segmented, by modality or SOP class (e.g. RTDOSE, RTPLAN, SR, NOT_DICOM)'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0015_copydicomtaskmodel_skipped_file_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicomseriesprocessingmodel',
+            name='excluded_image_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of images dropped from the series by the ImageType / secondary capture filter (e.g. localizers)'),
+        ),
+    ]
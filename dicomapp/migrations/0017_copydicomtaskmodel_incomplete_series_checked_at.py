@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0016_dicomseriesprocessingmodel_excluded_image_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='copydicomtaskmodel',
+            name='incomplete_series_checked_at',
+            field=models.DateTimeField(blank=True, help_text='When the held back series of this directory were last checked for completeness. The directory is only copied again once its files change after this time or the hold has expired', null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-18 20:05
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dicomapp', '0018_alter_dicomseriesprocessingmodel_series_header'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedSeriesFileModel',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file_path', models.CharField(help_text='The path of the file in folder_for_series_archive/<SeriesInstanceUID>', max_length=1024, unique=True)),
+                ('series_instance_uid', models.CharField(db_index=True, help_text='The SeriesInstanceUID of the archive directory holding the file', max_length=255)),
+                ('file_size', models.BigIntegerField(help_text='Size of the archived file when its header record was stored')),
+                ('file_modification_time', models.FloatField(help_text='Modification time (unix timestamp) of the archived file when its header record was stored')),
+                ('header_record', models.JSONField(blank=True, default=list, help_text='The series preparation header record of the file (SeriesHeaderRecord values). A later import of the series reuses it instead of parsing the archived file again, as long as the size and modification time of the file are unchanged')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Archived Series File',
+                'verbose_name_plural': 'Archived Series Files',
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
@@ -11,6 +11,13 @@ from pathlib import Path
 
 # Create your models here.
 
+class CopyStrategyChoices(models.TextChoices):
+    REFLINK = 'REFLINK'
+    HARDLINK = 'HARDLINK'
+    COPY_FILE_RANGE = 'COPY_FILE_RANGE'
+    COPY = 'COPY'
+
+
 class CopyDicomTaskModel(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     source_directory = models.CharField(max_length=512,blank=True,unique=True, help_text="The source directory of the DICOM files")
@@ -20,6 +27,16 @@ class CopyDicomTaskModel(models.Model):
     target_directory = models.CharField(max_length=512,blank=True)
     task_id = models.CharField(max_length=255,blank=True, help_text="The task id of the celery task that processed the series")
     copy_completed = models.BooleanField(default=False)
+    copy_strategy = models.CharField(max_length=20, blank=True, choices=CopyStrategyChoices.choices, help_text="How the files were copied from the datastore (reflink, hardlink, in-kernel copy_file_range or a regular copy)")
+    files_copied = models.IntegerField(default=0, help_text="Number of files copied from the source directory in the last copy")
+    bytes_copied = models.BigIntegerField(default=0, help_text="Number of bytes copied from the source directory in the last copy")
+    copy_duration_seconds = models.FloatField(null=True, blank=True, help_text="Wall time of the last copy in seconds")
+    copy_files_per_second = models.FloatField(null=True, blank=True, help_text="Files copied per second in the last copy")
+    copy_megabytes_per_second = models.FloatField(null=True, blank=True, help_text="Megabytes (MiB) copied per second in the last copy")
+    file_manifest = models.JSONField(default=dict, blank=True, help_text="The files of the source directory at the last copy, mapping file name to size, modification time and optional hash")
+    skipped_file_counts = models.JSONField(default=dict, blank=True, help_text="Number of files left out of the last copy because their header showed they are not images that can be segmented, by modality or SOP class (e.g. RTDOSE, RTPLAN, SR, NOT_DICOM)")
+    incomplete_series_held_since = models.DateTimeField(null=True, blank=True, help_text="When a series copied from this directory was first held back because slices were missing. Cleared once the series is complete or has been sent anyway")
+    incomplete_series_checked_at = models.DateTimeField(null=True, blank=True, help_text="When the held back series of this directory were last checked for completeness. The directory is only copied again once its files change after this time or the hold has expired")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -32,6 +49,114 @@ class CopyDicomTaskModel(models.Model):
         ordering = ['-created_at']
 
 
+class DatastoreScanIndexModel(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    directory_path = models.CharField(max_length=512, unique=True, help_text="The datastore directory described by this index entry")
+    directory_modification_time = models.FloatField(help_text="The modification time (st_mtime) of the directory when it was last listed")
+    file_count = models.IntegerField(default=0, help_text="Number of files directly inside the directory")
+    total_size = models.BigIntegerField(default=0, help_text="Total size in bytes of the files directly inside the directory")
+    subdirectories = models.JSONField(default=list, blank=True, help_text="Names of the immediate subdirectories of the directory")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.directory_path}"
+
+    class Meta:
+        verbose_name = "Datastore Scan Index"
+        verbose_name_plural = "Datastore Scan Index"
+
+
+class DirectoryStabilityModel(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    directory_path = models.CharField(max_length=512, unique=True, help_text="The datastore directory tracked for arrival stability")
+    file_count = models.IntegerField(default=0, help_text="Number of files directly inside the directory at the last scan")
+    total_size = models.BigIntegerField(default=0, help_text="Total size in bytes of the files directly inside the directory at the last scan")
+    max_file_modification_time = models.FloatField(null=True, blank=True, help_text="The newest modification time (st_mtime) of the files at the last scan")
+    signature_changed_at = models.DateTimeField(help_text="When a scan last saw the file count, size or newest modification time change")
+    last_scanned_at = models.DateTimeField(help_text="When the directory was last scanned")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.directory_path}"
+
+    class Meta:
+        verbose_name = "Directory Stability"
+        verbose_name_plural = "Directory Stability"
+
+
+class DatastoreHealthModel(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    datastore_path = models.CharField(max_length=512, unique=True, help_text="The datastore mount")
+    healthy = models.BooleanField(default=True, help_text="False if the last scan of the datastore timed out")
+    consecutive_failures = models.IntegerField(default=0)
+    unavailable_until = models.DateTimeField(null=True, blank=True, help_text="The datastore is not scanned again before this time")
+    last_error = models.TextField(blank=True)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    metadata_calls = models.IntegerField(default=0, help_text="Number of metadata calls (stat, directory listings) of the last scan")
+    latency_p50_ms = models.FloatField(null=True, blank=True, help_text="Median metadata call latency of the last scan in milliseconds")
+    latency_p95_ms = models.FloatField(null=True, blank=True, help_text="95th percentile metadata call latency of the last scan in milliseconds")
+    latency_p99_ms = models.FloatField(null=True, blank=True, help_text="99th percentile metadata call latency of the last scan in milliseconds")
+    latency_max_ms = models.FloatField(null=True, blank=True, help_text="Slowest metadata call of the last scan in milliseconds")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.datastore_path}"
+
+    class Meta:
+        verbose_name = "Datastore Health"
+        verbose_name_plural = "Datastore Health"
+
+
+class FileRejectionReasonChoices(models.TextChoices):
+    NOT_DICOM = 'NOT_DICOM'
+    UNREADABLE = 'UNREADABLE'
+    MISSING_TAGS = 'MISSING_TAGS'
+    UNSUPPORTED_MODALITY = 'UNSUPPORTED_MODALITY'
+
+
+class RejectedFileModel(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_path = models.CharField(max_length=1024, unique=True, help_text="The path of the file in the datastore")
+    file_size = models.BigIntegerField(help_text="Size of the file when it was rejected")
+    file_modification_time = models.FloatField(help_text="Modification time (unix timestamp) of the file when it was rejected")
+    reason = models.CharField(max_length=30, choices=FileRejectionReasonChoices.choices)
+    reason_message = models.TextField(blank=True)
+    quarantine_path = models.CharField(max_length=1024, blank=True, help_text="Where the rejected file was moved to, if a quarantine directory is configured")
+    rejection_count = models.IntegerField(default=1, help_text="Number of times the file was rejected")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.file_path}"
+
+    class Meta:
+        verbose_name = "Rejected File"
+        verbose_name_plural = "Rejected Files"
+        ordering = ['-updated_at']
+
+
+class ArchivedSeriesFileModel(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file_path = models.CharField(max_length=1024, unique=True, help_text="The path of the file in folder_for_series_archive/<SeriesInstanceUID>")
+    series_instance_uid = models.CharField(max_length=255, db_index=True, help_text="The SeriesInstanceUID of the archive directory holding the file")
+    file_size = models.BigIntegerField(help_text="Size of the archived file when its header record was stored")
+    file_modification_time = models.FloatField(help_text="Modification time (unix timestamp) of the archived file when its header record was stored")
+    header_record = models.JSONField(default=list, blank=True, help_text="The series preparation header record of the file (SeriesHeaderRecord values). A later import of the series reuses it instead of parsing the archived file again, as long as the size and modification time of the file are unchanged")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.file_path}"
+
+    class Meta:
+        verbose_name = "Archived Series File"
+        verbose_name_plural = "Archived Series Files"
+        ordering = ['-updated_at']
+
+
 class ProcessingStatusChoices(models.TextChoices):
     SERIES_SEPARATED = 'SERIES_SEPARATED'
     TEMPLATE_NOT_MATCHED = 'TEMPLATE_NOT_MATCHED'
@@ -70,6 +195,8 @@ class DicomSeriesProcessingModel(models.Model):
     template_file = models.ForeignKey(ModelYamlInfo,on_delete=models.SET_NULL, null=True, blank=True)
     processing_status = models.CharField(max_length=60,blank=True,choices=ProcessingStatusChoices.choices)
     series_state = models.CharField(max_length=60,blank=True,choices=SeriesState.choices)
+    series_header = models.JSONField(default=dict, blank=True, help_text="Header of a file of the series read once by series preparation (file name and every element except the pixel data). Template matching uses it instead of parsing the files again")
+    excluded_image_count = models.PositiveIntegerField(default=0, help_text="Number of images dropped from the series by the ImageType / secondary capture filter (e.g. localizers)")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
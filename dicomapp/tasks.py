@@ -1,9 +1,11 @@
-from celery import shared_task, chain
+from celery import shared_task, chain, chord, group
 from logging import getLogger
 from dicomapp.models import *
 from django.conf import settings
 from dicom_handler.models import DicomPathConfig
 from dicomapp.dicom_utils.copy_dicom import copy_dicom
+from dicomapp.dicom_utils.datastore_io import DatastoreUnavailableError, get_mount_health, mount_in_backoff, resolve_datastore_path
+from django.utils import timezone
 from dicomapp.dicom_utils.series_preparation import series_preparation
 from dicomapp.dicom_utils.match_autosegmentation_template import match_autosegmentation_template
 from dicomapp.dicom_utils.deidentifiy_dicom_series import deidentify_dicom_series
@@ -18,9 +20,10 @@ logger = getLogger(__name__)
 ## DICOM Export Tasks
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60, name = "DICOM Export - Copy DICOM files to datastore")
-def copy_dicom_task(self, datastore_path, target_path=None, task_id=None):
+def copy_dicom_task(self, datastore_path, target_path=None, task_id=None, source_directories=None):
     """
     This task will copy the DICOM files from the datastore path to the target path.
+    If source_directories is given only those directories (and their subdirectories) are scanned.
     It will return a dictionary with the following keys:
         - status (success or failure)
         - message (message to be displayed)
@@ -30,15 +33,27 @@ def copy_dicom_task(self, datastore_path, target_path=None, task_id=None):
     try:
         # Get the DicomPathConfig instance
         path_config = DicomPathConfig.get_instance()
-        # Get a safe path using the get_safe_path method
-        safe_path = path_config.get_safe_path()
+        # Get a safe path using the get_safe_path method.
+        # Resolving the path touches the datastore mount, so it is skipped while the mount is in backoff and
+        # otherwise runs under the datastore deadline like the scan.
+        try:
+            safe_path = resolve_datastore_path(path_config, timezone.now())
+        except DatastoreUnavailableError as e:
+            logger.warning(f"Skipping the copy as the datastore is unavailable: {str(e)}")
+            return {
+                'status': 'failure',
+                'task_id': task_id or self.request.id,
+                'error': str(e)
+            }
         if safe_path is None:
             raise ValueError("No valid datastore path configured")
             
         copy_dicom_task_results = copy_dicom(
             datastore_path=str(safe_path),
             target_path=str(target_path) if target_path else None,
-            task_id=task_id or self.request.id
+            task_id=task_id or self.request.id,
+            source_directories=source_directories,
+            mount_health_path=path_config.datastorepath
         )
         logger.info(f"Copy dicom task results: {copy_dicom_task_results}")
         return copy_dicom_task_results
@@ -51,21 +66,71 @@ def copy_dicom_task(self, datastore_path, target_path=None, task_id=None):
         )
 
 
+def series_export_chain(series_preparation_results):
+    """
+    Return the chain which matches the template, deidentifies and sends the series in series_preparation_results.
+    """
+    return chain(
+        match_autosegmentation_template_task.s(series_preparation_results),
+        deidentify_dicom_series_task.s(),
+        send_dicom_to_remote_server_task.s()
+    )
+
+
+def start_series_export(series_results):
+    """Start the export chain of a single prepared series."""
+    result = series_export_chain(series_results).apply_async()
+    logger.info(f"Started export chain {result.id} for series {series_results['series_processing_ids']}")
+
+
+def split_series_preparation_results(series_preparation_results):
+    """
+    Split the results of series_preparation into one results dictionary per series.
+
+    Returns:
+        list: Dictionaries with the keys of the series_preparation results, each with a single series.
+    """
+    return [
+        {
+            'status': 'success',
+            'message': f"Series {series_id} prepared",
+            'separated_series_path_folders': [series_path],
+            'series_processing_ids': [series_id]
+        }
+        for series_id, series_path in zip(
+            series_preparation_results.get('series_processing_ids', []),
+            series_preparation_results.get('separated_series_path_folders', [])
+        )
+    ]
+
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=60, name = "DICOM Export - Series Preparation")
-def series_preparation_task(self, copy_dicom_task_results):
+def series_preparation_task(self, copy_dicom_task_results, stream_series=False):
     """
     This task will prepare the series for deidentification.
+    If stream_series is True the export chain of every series is started as soon as the series is prepared,
+    see DicomPathConfig.stream_series_downstream.
     It will return a dictionary with the following keys:
         - status (success, partial_failure, or failure)
         - message (message to be displayed)
         - separated_series_path_folders (list of paths to folders where series were successfully separated)
         - series_processing_ids (list of UUIDs of created DicomSeriesProcessingModel entries)
+        - streamed_series_processing_ids (list of UUIDs of the series whose export chain was started)
     """
     try:
         # Add task_id to the input data
         copy_dicom_task_results['task_id'] = self.request.id
-        series_preparation_task_results = series_preparation(copy_dicom_task_results)   
+        series_preparation_task_results = series_preparation(
+            copy_dicom_task_results,
+            on_series_ready=start_series_export if stream_series else None
+        )
         logger.info(f"Series preparation task results: {series_preparation_task_results}")
+        if stream_series:
+            # Series whose export could not be started while preparing are started now
+            streamed_ids = set(series_preparation_task_results.get('streamed_series_processing_ids', []))
+            for series_results in split_series_preparation_results(series_preparation_task_results):
+                if series_results['series_processing_ids'][0] not in streamed_ids:
+                    start_series_export(series_results)
         return series_preparation_task_results
     except Exception as e:
         logger.error(f"Error in series_preparation_task: {e}")
@@ -148,8 +213,85 @@ def send_dicom_to_remote_server_task(self, deidentify_dicom_series_task_results)
             max_retries=3  # override max retries for this specific retry
         )
 
+@shared_task(bind=True, max_retries=3, default_retry_delay=60, name = "DICOM Export - Export Series in Parallel")
+def export_series_task(self, series_preparation_task_results, summarize=False):
+    """
+    This task starts a separate match -> deidentify -> send chain for every prepared series and runs them as a group.
+    The series are processed in parallel by the Celery workers, a large series does not hold back the small ones
+    and a failing series is retried on its own.
+    If summarize is True the group is a chord whose callback (summarize_series_export_task) collects a summary of the run.
+    It will return a dictionary with the following keys:
+        - status (success or failure)
+        - message (message to be displayed)
+        - series_processing_ids (list of UUIDs of the series whose export was started)
+        - group_id (id of the group or chord, None if there was no series to export)
+    """
+    try:
+        series_results = split_series_preparation_results(series_preparation_task_results)
+        series_processing_ids = [results['series_processing_ids'][0] for results in series_results]
+        if not series_results:
+            logger.warning(f"No series to export: {series_preparation_task_results.get('message')}")
+            return {
+                "status": "failure",
+                "message": f"No series to export: {series_preparation_task_results.get('message')}",
+                "series_processing_ids": [],
+                "group_id": None
+            }
+
+        series_group = group(series_export_chain(results) for results in series_results)
+        if summarize:
+            result = chord(series_group)(summarize_series_export_task.s(run_task_id=self.request.id))
+        else:
+            result = series_group.apply_async()
+        logger.info(f"Started export of {len(series_results)} series in group {result.id}")
+        return {
+            "status": "success",
+            "message": f"Started export of {len(series_results)} series",
+            "series_processing_ids": series_processing_ids,
+            "group_id": result.id
+        }
+    except Exception as e:
+        logger.error(f"Error in export_series_task: {e}")
+        raise self.retry(
+            exc=e,
+            countdown=60,  # retry after 60 seconds
+            max_retries=3  # override max retries for this specific retry
+        )
+
+
+@shared_task(bind=True, name = "DICOM Export - Summarize Series Export")
+def summarize_series_export_task(self, series_export_results, run_task_id=None):
+    """
+    This task is the chord callback of export_series_task and collects the results of the series exported in a run.
+    It will return a dictionary with the following keys:
+        - run_task_id (id of the export_series_task which started the run)
+        - series_count (number of series exported in the run)
+        - status_counts (number of series per status of the send_dicom_to_remote_server_task results)
+        - successful_series (list of series IDs that were processed successfully)
+        - failed_series (list of series IDs that failed to process)
+    """
+    status_counts = {}
+    successful_series = []
+    failed_series = []
+    for results in series_export_results:
+        status = results.get('status', 'unknown')
+        status_counts[status] = status_counts.get(status, 0) + 1
+        successful_series.extend(results.get('successful_series', []))
+        failed_series.extend(results.get('failed_series', []))
+
+    summary = {
+        "run_task_id": run_task_id,
+        "series_count": len(series_export_results),
+        "status_counts": status_counts,
+        "successful_series": successful_series,
+        "failed_series": failed_series
+    }
+    logger.info(f"Export run {run_task_id} summary: {summary}")
+    return summary
+
+
 @shared_task(bind=True, max_retries=3, default_retry_delay=60, name = "DICOM Export - Pipeline to export DICOM to Remote Server")
-def send_dicom_to_remote_server_pipeline(self, target_path=None):
+def send_dicom_to_remote_server_pipeline(self, target_path=None, source_directories=None, summarize_series=False):
     """
     This task chains together all the DICOM processing tasks in sequence:
     1. Copy DICOM files using the copy_dicom_task
@@ -157,26 +299,44 @@ def send_dicom_to_remote_server_pipeline(self, target_path=None):
     3. Match autosegmentation template using the match_autosegmentation_template_task
     4. Deidentify DICOM series using the deidentify_dicom_series_task
     5. Send to remote server using the send_dicom_to_remote_server_task
+
+    Steps 3 to 5 run in a separate chain for every series. The chains are started as a group by the
+    export_series_task, or by the series_preparation_task as soon as each series is prepared when
+    DicomPathConfig.stream_series_downstream is set.
     
     Args:
         target_path: Optional target path for copying files
+        source_directories: Optional list of datastore directories to scan instead of the whole datastore.
+            The datastore watcher (see the watch_datastore management command) passes the directories which changed.
+        summarize_series: Collect a summary of the run once all series are exported (summarize_series_export_task).
+            Not available in streaming mode.
     """
     try:
         # Get the DicomPathConfig instance
         path_config = DicomPathConfig.get_instance()
-        # Get a safe path using the get_safe_path method
-        datastore_path = path_config.get_safe_path()
-        if datastore_path is None:
+        # The copy task resolves the datastore path under the datastore deadline, nothing here touches the mount
+        datastore_path = path_config.datastorepath
+        if not datastore_path:
             raise ValueError("No valid datastore path configured")
+        mount_health = get_mount_health(datastore_path)
+        if mount_in_backoff(mount_health, timezone.now()):
+            logger.warning(f"Not starting the DICOM processing pipeline as the datastore {datastore_path} is unavailable until {mount_health.unavailable_until}")
+            return {"status": "skipped", "unavailable_until": mount_health.unavailable_until.isoformat()}
             
         # Create the task chain
-        task_chain = chain(
-            copy_dicom_task.s(str(datastore_path), str(target_path) if target_path else None, task_id=self.request.id),
-            series_preparation_task.s(),
-            match_autosegmentation_template_task.s(),
-            deidentify_dicom_series_task.s(),
-            send_dicom_to_remote_server_task.s()
-        )
+        copy_task = copy_dicom_task.s(str(datastore_path), str(target_path) if target_path else None, task_id=self.request.id, source_directories=source_directories)
+        if path_config.stream_series_downstream:
+            # Series preparation starts the export chain of each series itself
+            task_chain = chain(
+                copy_task,
+                series_preparation_task.s(stream_series=True)
+            )
+        else:
+            task_chain = chain(
+                copy_task,
+                series_preparation_task.s(),
+                export_series_task.s(summarize=summarize_series)
+            )
         
         # Execute the chain
         result = task_chain.apply_async()
@@ -25,6 +25,9 @@ if [ "$1" = "celery" ]; then
 # Check if we're running Celery beat
 elif [ "$1" = "celery-beat" ]; then
     exec celery -A draw_client beat -l INFO
+# Check if we're running the datastore watcher
+elif [ "$1" = "datastore-watcher" ]; then
+    exec python manage.py watch_datastore
 # Default to running Django with Gunicorn
 else
     exec python -m gunicorn draw_client.wsgi:application --bind 0.0.0.0:8000 --workers 3
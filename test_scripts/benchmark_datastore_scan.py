@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+"""
+Benchmark for the datastore scan used by copy_dicom.
+It builds a synthetic datastore and counts the metadata calls (stat, listdir, scandir and DirEntry.stat)
+made per directory by:
+    1. The previous glob + stat + listdir + isfile + getsize pattern of find_directories_with_direct_files and copy_dicom.
+    2. The single pass scandir walker (walk_datastore) on a cold scan without a scan index.
+    3. The walker on a warm scan where every directory is already present in the scan index.
+Over SMB/NFS each of these calls is a network round trip.
+
+Usage:
+    python test_scripts/benchmark_datastore_scan.py [number_of_directories] [files_per_directory]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import logging
+from collections import Counter
+from pathlib import Path
+
+import django
+
+# Set up Django environment
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'draw_client.settings')
+django.setup()
+
+from dicomapp.models import DatastoreScanIndexModel
+from dicomapp.dicom_utils.datastore_scan import walk_datastore
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(levelname)s] %(asctime)s %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logging.getLogger('dicomapp').setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+class CountingDirEntry:
+    """Wraps an os.DirEntry and counts the first stat() call, which is the one that reaches the filesystem."""
+    def __init__(self, entry, counter):
+        self._entry = entry
+        self._counter = counter
+        self._stat_counted = set()
+
+    def stat(self, *, follow_symlinks=True):
+        if follow_symlinks not in self._stat_counted:
+            self._stat_counted.add(follow_symlinks)
+            self._counter['direntry_stat'] += 1
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+    def __getattr__(self, name):
+        return getattr(self._entry, name)
+
+    def __fspath__(self):
+        return self._entry.path
+
+
+class CountingScandir:
+    def __init__(self, iterator, counter):
+        self._iterator = iterator
+        self._counter = counter
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._iterator.close()
+
+    def __iter__(self):
+        for entry in self._iterator:
+            yield CountingDirEntry(entry, self._counter)
+
+    def close(self):
+        self._iterator.close()
+
+
+class MetadataCallCounter:
+    """Context manager which patches the os module to count the metadata calls made inside it."""
+    def __init__(self):
+        self.counter = Counter()
+
+    def __enter__(self):
+        self._stat, self._listdir, self._scandir = os.stat, os.listdir, os.scandir
+        counter = self.counter
+        original_stat, original_listdir, original_scandir = self._stat, self._listdir, self._scandir
+
+        def stat(*args, **kwargs):
+            counter['stat'] += 1
+            return original_stat(*args, **kwargs)
+
+        def listdir(*args, **kwargs):
+            counter['listdir'] += 1
+            return original_listdir(*args, **kwargs)
+
+        def scandir(*args, **kwargs):
+            counter['scandir'] += 1
+            return CountingScandir(original_scandir(*args, **kwargs), counter)
+
+        os.stat, os.listdir, os.scandir = stat, listdir, scandir
+        return self
+
+    def __exit__(self, *args):
+        os.stat, os.listdir, os.scandir = self._stat, self._listdir, self._scandir
+
+    @property
+    def total(self):
+        return sum(self.counter.values())
+
+
+def build_datastore(base_path, number_of_directories, files_per_directory):
+    """Create patient/study/series directories with small files inside the series directories."""
+    for index in range(number_of_directories):
+        series_dir = os.path.join(base_path, f"patient_{index // 10}", f"study_{index // 5}", f"series_{index}")
+        os.makedirs(series_dir, exist_ok=True)
+        for file_index in range(files_per_directory):
+            with open(os.path.join(series_dir, f"IM{file_index:05d}.dcm"), 'wb') as f:
+                f.write(b'\0' * 256)
+
+
+def legacy_scan_and_copy_metadata(base_path):
+    """The previous metadata access pattern of find_directories_with_direct_files and copy_dicom (without the copy itself)."""
+    path_object = Path(base_path)
+    dir_items = [item for item in path_object.glob('**/') if item.is_dir()]
+    sorted_dirs = sorted(dir_items, key=lambda item: item.stat().st_mtime)
+    all_dirs = [str(item) for item in sorted_dirs if item.stat().st_mtime >= 0]
+    if str(path_object) in all_dirs:
+        all_dirs.remove(str(path_object))
+    dirs_with_files = []
+    for dir_path in all_dirs:
+        for item in os.listdir(dir_path):
+            if os.path.isfile(os.path.join(dir_path, item)):
+                dirs_with_files.append(dir_path)
+                break
+    for source_dir in dirs_with_files:
+        os.stat(source_dir)
+        for f in os.listdir(source_dir):
+            file_path = os.path.join(source_dir, f)
+            if os.path.isfile(file_path):
+                os.path.getsize(file_path)
+        for item in os.listdir(source_dir):
+            os.path.isfile(os.path.join(source_dir, item))
+    return len(all_dirs) + 1
+
+
+def walker_scan_and_copy_metadata(base_path, index=None):
+    """The metadata access pattern of the scandir walker followed by the copy stage."""
+    records = list(walk_datastore(base_path, index))
+    for record in records:
+        if record.path != base_path and record.file_count > 0:
+            record.get_files()
+    return records
+
+
+def run_benchmark(name, function, *args):
+    with MetadataCallCounter() as calls:
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+    return name, calls, elapsed, result
+
+
+def main():
+    number_of_directories = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    files_per_directory = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    base_path = tempfile.mkdtemp(prefix='datastore_benchmark_')
+    try:
+        build_datastore(base_path, number_of_directories, files_per_directory)
+        logger.info(f"Built datastore at {base_path} with {number_of_directories} series directories of {files_per_directory} files")
+
+        results = []
+        name, calls, elapsed, directory_count = run_benchmark("legacy glob/listdir", legacy_scan_and_copy_metadata, base_path)
+        results.append((name, calls, elapsed, directory_count))
+
+        name, calls, elapsed, records = run_benchmark("walker (cold)", walker_scan_and_copy_metadata, base_path)
+        results.append((name, calls, elapsed, len(records)))
+
+        # Build an in-memory scan index from the cold scan. Nothing is written to the database.
+        index = {
+            record.path: DatastoreScanIndexModel(
+                directory_path=record.path,
+                directory_modification_time=record.modification_time,
+                file_count=record.file_count,
+                total_size=record.total_size,
+                subdirectories=record.subdirectories,
+            )
+            for record in records
+        }
+        # Only the discovery is measured for the warm scan as unchanged directories are not copied again
+        name, calls, elapsed, warm_records = run_benchmark("walker (warm index)", lambda: list(walk_datastore(base_path, index)))
+        results.append((name, calls, elapsed, len(warm_records)))
+
+        logger.info(f"{'Scan':<22}{'dirs':>7}{'stat':>9}{'listdir':>9}{'scandir':>9}{'entry.stat':>12}{'calls/dir':>11}{'time (s)':>10}")
+        for name, calls, elapsed, directory_count in results:
+            counter = calls.counter
+            logger.info(
+                f"{name:<22}{directory_count:>7}{counter['stat']:>9}{counter['listdir']:>9}{counter['scandir']:>9}"
+                f"{counter['direntry_stat']:>12}{calls.total / max(directory_count, 1):>11.1f}{elapsed:>10.3f}"
+            )
+    finally:
+        shutil.rmtree(base_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
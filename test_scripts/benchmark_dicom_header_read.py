@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+"""
+Benchmark for the DICOM reads of series_preparation.
+It compares the bytes read from disk and the wall time per file of:
+    1. A full pydicom.dcmread (the previous behaviour of series_preparation).
+    2. pydicom.dcmread with stop_before_pixels=True.
+    3. read_dicom_header with the attributes series_preparation needs (stop_before_pixels + specific_tags).
+
+By default a synthetic series of 512x512 16 bit CT slices is generated. A directory with real DICOM files
+can be given instead. Wall times are measured with a warm page cache, the bytes read are what the
+parser requests from the operating system and do not depend on the cache.
+
+Usage:
+    python test_scripts/benchmark_dicom_header_read.py [number_of_files] [dicom_directory]
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import tempfile
+import logging
+
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, CTImageStorage, generate_uid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dicomapp.dicom_utils.dicom_headers import read_dicom_header, SERIES_PREPARATION_TAGS
+
+# Set up logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='[%(levelname)s] %(asctime)s %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+logger = logging.getLogger(__name__)
+
+
+class CountingFileIO(io.FileIO):
+    """A raw file which counts the bytes read from the operating system."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bytes_read = 0
+
+    def readinto(self, buffer):
+        count = super().readinto(buffer)
+        self.bytes_read += count or 0
+        return count
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data or b'')
+        return data
+
+    def readall(self):
+        data = super().readall()
+        self.bytes_read += len(data)
+        return data
+
+
+def build_ct_series(directory, number_of_files, rows=512, columns=512):
+    """Write a synthetic CT series with random pixel data."""
+    study_uid, series_uid = generate_uid(), generate_uid()
+    for index in range(number_of_files):
+        file_meta = FileMetaDataset()
+        file_meta.MediaStorageSOPClassUID = CTImageStorage
+        file_meta.MediaStorageSOPInstanceUID = generate_uid()
+        file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+        ds = Dataset()
+        ds.file_meta = file_meta
+        ds.SOPClassUID = CTImageStorage
+        ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+        ds.PatientID = 'BENCHMARK'
+        ds.PatientName = 'Benchmark^Patient'
+        ds.PatientSex = 'O'
+        ds.StudyDate = '20250101'
+        ds.Modality = 'CT'
+        ds.StudyInstanceUID = study_uid
+        ds.SeriesInstanceUID = series_uid
+        ds.SeriesDescription = 'Benchmark series'
+        ds.ProtocolName = 'Benchmark protocol'
+        ds.InstanceNumber = index + 1
+        ds.ImagePositionPatient = [0, 0, index * 2.5]
+        ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = 'MONOCHROME2'
+        ds.Rows = rows
+        ds.Columns = columns
+        ds.BitsAllocated = 16
+        ds.BitsStored = 16
+        ds.HighBit = 15
+        ds.PixelRepresentation = 1
+        ds.PixelData = os.urandom(rows * columns * 2)
+        ds.save_as(os.path.join(directory, f"CT{index:05d}.dcm"), enforce_file_format=True)
+
+
+def full_read(fp):
+    return pydicom.dcmread(fp)
+
+
+def stop_before_pixels_read(fp):
+    return pydicom.dcmread(fp, stop_before_pixels=True)
+
+
+def header_read(fp):
+    return read_dicom_header(fp, SERIES_PREPARATION_TAGS)
+
+
+def run_benchmark(read_function, file_paths):
+    """Return the total bytes read and the wall time for reading all files."""
+    bytes_read = 0
+    start = time.perf_counter()
+    for file_path in file_paths:
+        raw = CountingFileIO(file_path, 'r')
+        with io.BufferedReader(raw) as fp:
+            dataset = read_function(fp)
+            # Touch the attributes series_preparation uses
+            getattr(dataset, 'SeriesInstanceUID', None)
+            getattr(dataset, 'Modality', None)
+        bytes_read += raw.bytes_read
+    return bytes_read, time.perf_counter() - start
+
+
+def main():
+    number_of_files = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    dicom_directory = sys.argv[2] if len(sys.argv) > 2 else None
+
+    temporary_directory = None
+    try:
+        if dicom_directory is None:
+            temporary_directory = tempfile.mkdtemp(prefix='dicom_header_benchmark_')
+            build_ct_series(temporary_directory, number_of_files)
+            dicom_directory = temporary_directory
+            logger.info(f"Built {number_of_files} synthetic 512x512 CT slices in {dicom_directory}")
+
+        file_paths = sorted(
+            os.path.join(root, file_name)
+            for root, _, files in os.walk(dicom_directory)
+            for file_name in files
+        )[:number_of_files]
+        total_size = sum(os.path.getsize(file_path) for file_path in file_paths)
+        logger.info(f"Reading {len(file_paths)} files, {total_size / len(file_paths) / 1024:.1f} KiB per file on disk")
+
+        results = []
+        for name, read_function in (
+            ("full dcmread", full_read),
+            ("stop_before_pixels", stop_before_pixels_read),
+            ("read_dicom_header", header_read),
+        ):
+            bytes_read, elapsed = run_benchmark(read_function, file_paths)
+            results.append((name, bytes_read, elapsed))
+
+        full_bytes = results[0][1]
+        logger.info(f"{'Read':<22}{'KiB/file':>10}{'ms/file':>10}{'I/O saved':>11}")
+        for name, bytes_read, elapsed in results:
+            logger.info(
+                f"{name:<22}{bytes_read / len(file_paths) / 1024:>10.1f}{elapsed / len(file_paths) * 1000:>10.3f}"
+                f"{(1 - bytes_read / full_bytes) * 100:>10.1f}%"
+            )
+    finally:
+        if temporary_directory:
+            shutil.rmtree(temporary_directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
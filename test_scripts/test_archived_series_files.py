@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Tests for the header records of archived files (ArchivedSeriesFileModel).
+A series arriving over several imports is completed with its archived files, whose header records are taken
+from the database instead of parsing the archived files again on each import.
+
+Usage:
+    python test_scripts/test_archived_series_files.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+from unittest import mock
+
+import django
+from pydicom.uid import generate_uid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'draw_client.settings')
+django.setup()
+
+from django.test import TestCase, override_settings
+from dicomapp.models import ArchivedSeriesFileModel
+from dicomapp.dicom_utils import series_preparation as series_preparation_module
+from dicomapp.dicom_utils.series_preparation import series_preparation
+from test_scripts.test_series_streaming import write_ct_slice
+
+
+class ArchivedSeriesFilesTest(TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        settings_override = override_settings(BASE_DIR=self.base_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.base_dir, ignore_errors=True)
+        self.import_dir = os.path.join(self.base_dir, 'folders', 'folder_unprocessed_dicom')
+        self.series_uid = generate_uid()
+
+    def import_slices(self, name, instance_numbers):
+        """Run series preparation on a new import directory holding the given slices of the series."""
+        directory = os.path.join(self.import_dir, name)
+        for instance_number in instance_numbers:
+            write_ct_slice(directory, self.series_uid, instance_number)
+        read_series_header_record = series_preparation_module.read_series_header_record
+        with mock.patch.object(series_preparation_module, 'read_series_header_record', side_effect=read_series_header_record) as patched:
+            result = series_preparation({'target_paths': [directory], 'task_id': 'test'})
+        self.assertEqual(result['status'], 'success')
+        return sorted(os.path.basename(call.args[0]) for call in patched.call_args_list)
+
+    def archive_directory(self):
+        return os.path.join(self.base_dir, 'folders', 'folder_for_series_archive', self.series_uid)
+
+    def test_archived_files_are_not_read_again(self):
+        self.assertEqual(len(self.import_slices('first', [1, 2])), 2)
+        self.assertEqual(ArchivedSeriesFileModel.objects.filter(series_instance_uid=self.series_uid).count(), 2)
+
+        # Only the late slice is read, the two archived slices come from their stored header records
+        self.assertEqual(self.import_slices('second', [3]), [f'{self.series_uid}_3.dcm'])
+        self.assertEqual(ArchivedSeriesFileModel.objects.filter(series_instance_uid=self.series_uid).count(), 3)
+        series_directory = os.path.join(self.base_dir, 'folders', 'folder_post_series_separation', self.series_uid)
+        self.assertEqual(len(os.listdir(series_directory)), 3)
+
+    def test_changed_archived_file_is_read_again(self):
+        self.import_slices('first', [1, 2])
+        archive_path = os.path.join(self.archive_directory(), f'{self.series_uid}_1.dcm')
+        stat = os.stat(archive_path)
+        os.utime(archive_path, (stat.st_atime, stat.st_mtime + 10))
+
+        self.assertEqual(self.import_slices('second', [3]), [f'{self.series_uid}_1.dcm', f'{self.series_uid}_3.dcm'])
+        entry = ArchivedSeriesFileModel.objects.get(file_path=archive_path)
+        self.assertEqual(entry.file_modification_time, stat.st_mtime + 10)
+
+
+if __name__ == "__main__":
+    from django.conf import settings
+    from django.test.utils import get_runner
+    test_runner = get_runner(settings)()
+    sys.exit(bool(test_runner.run_tests(['__main__'])))
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Unit tests for the copy manifest of copy_dicom (get_changed_files, build_manifest_entry and add_file_hashes).
+The manifest decides which files of a datastore directory are copied again, so a wrong diff either imports
+files twice or misses changed files. Only temporary files are needed, the database is not used.
+
+Usage:
+    python test_scripts/test_copy_manifest.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'draw_client.settings')
+django.setup()
+
+from dicomapp.dicom_utils.datastore_scan import FileRecord
+from dicomapp.dicom_utils.copy_manifest import get_changed_files, build_manifest_entry, add_file_hashes, calculate_file_hash
+
+
+class CopyManifestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write_file(self, name, content, modification_time=1000.0):
+        """Write a file and return its FileRecord."""
+        file_path = os.path.join(self.directory, name)
+        with open(file_path, 'wb') as f:
+            f.write(content)
+        os.utime(file_path, (modification_time, modification_time))
+        return FileRecord(name, file_path, len(content), modification_time)
+
+    def test_first_copy_copies_all_files(self):
+        file_records = [self.write_file('1.dcm', b'a'), self.write_file('2.dcm', b'bb')]
+        changed_files, manifest = get_changed_files(file_records, None)
+        self.assertEqual(changed_files, file_records)
+        self.assertEqual(manifest, {'1.dcm': {'size': 1, 'mtime': 1000.0}, '2.dcm': {'size': 2, 'mtime': 1000.0}})
+
+    def test_only_new_and_changed_files_are_copied(self):
+        unchanged = self.write_file('1.dcm', b'a')
+        resized = self.write_file('2.dcm', b'bbb')
+        new = self.write_file('3.dcm', b'c')
+        manifest = {
+            '1.dcm': {'size': 1, 'mtime': 1000.0, 'hash': 'kept'},
+            '2.dcm': {'size': 2, 'mtime': 1000.0},
+            'removed.dcm': {'size': 1, 'mtime': 1000.0},
+        }
+        changed_files, new_manifest = get_changed_files([unchanged, resized, new], manifest)
+        self.assertEqual(changed_files, [resized, new])
+        # Unchanged entries are kept as they are, removed files are dropped
+        self.assertEqual(new_manifest['1.dcm'], {'size': 1, 'mtime': 1000.0, 'hash': 'kept'})
+        self.assertEqual(new_manifest['2.dcm'], build_manifest_entry(resized))
+        self.assertNotIn('removed.dcm', new_manifest)
+
+    def test_touched_file_is_copied_without_hashes(self):
+        touched = self.write_file('1.dcm', b'a', modification_time=2000.0)
+        manifest = {'1.dcm': {'size': 1, 'mtime': 1000.0, 'hash': calculate_file_hash(touched.path)}}
+        changed_files, new_manifest = get_changed_files([touched], manifest)
+        self.assertEqual(changed_files, [touched])
+        self.assertEqual(new_manifest['1.dcm'], {'size': 1, 'mtime': 2000.0})
+
+    def test_touched_file_with_same_hash_is_not_copied(self):
+        touched = self.write_file('1.dcm', b'a', modification_time=2000.0)
+        file_hash = calculate_file_hash(touched.path)
+        manifest = {'1.dcm': {'size': 1, 'mtime': 1000.0, 'hash': file_hash}}
+        changed_files, new_manifest = get_changed_files([touched], manifest, hash_files=True)
+        self.assertEqual(changed_files, [])
+        self.assertEqual(new_manifest['1.dcm'], {'size': 1, 'mtime': 2000.0, 'hash': file_hash})
+
+    def test_rewritten_file_with_other_hash_is_copied(self):
+        rewritten = self.write_file('1.dcm', b'b', modification_time=2000.0)
+        manifest = {'1.dcm': {'size': 1, 'mtime': 1000.0, 'hash': 'other'}}
+        changed_files, new_manifest = get_changed_files([rewritten], manifest, hash_files=True)
+        self.assertEqual(changed_files, [rewritten])
+        self.assertNotIn('hash', new_manifest['1.dcm'])
+
+    def test_add_file_hashes_reads_the_copies(self):
+        file_record = self.write_file('1.dcm', b'a')
+        target_dir = os.path.join(self.directory, 'target')
+        os.makedirs(target_dir)
+        shutil.copy(file_record.path, target_dir)
+        manifest = {'1.dcm': build_manifest_entry(file_record), '2.dcm': {'size': 1, 'mtime': 1000.0}}
+        add_file_hashes(manifest, [file_record, FileRecord('2.dcm', '', 1, 1000.0)], target_dir)
+        self.assertEqual(manifest['1.dcm']['hash'], calculate_file_hash(file_record.path))
+        # A copy which can not be read gets no hash
+        self.assertNotIn('hash', manifest['2.dcm'])
+
+
+if __name__ == "__main__":
+    unittest.main()
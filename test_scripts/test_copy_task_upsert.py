@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Tests for the bulk upsert of the CopyDicomTaskModel entries written by copy_dicom (save_copy_tasks and
+get_existing_copy_tasks). New and existing entries are written together on the unique source_directory, so an
+existing entry must be updated in place and keep the fields copy_dicom does not own.
+
+Usage:
+    python test_scripts/test_copy_task_upsert.py
+"""
+
+import os
+import sys
+from datetime import timedelta
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'draw_client.settings')
+django.setup()
+
+from django.test import TestCase
+from django.utils import timezone
+from dicomapp.models import CopyDicomTaskModel
+from dicomapp.dicom_utils.copy_dicom import save_copy_tasks, get_existing_copy_tasks
+
+
+def copy_task(source_directory, **fields):
+    """Build an unsaved CopyDicomTaskModel entry like copy_dicom does."""
+    now = timezone.now()
+    values = {
+        'source_directory': source_directory,
+        'source_directory_creation_date': now,
+        'source_directory_modification_date': now,
+        'source_directory_size': 10,
+        'target_directory': '/import/' + os.path.basename(source_directory),
+        'task_id': 'first',
+        'copy_completed': True,
+        'files_copied': 1,
+        'file_manifest': {'1.dcm': {'size': 10, 'mtime': 1000.0}},
+    }
+    values.update(fields)
+    return CopyDicomTaskModel(**values)
+
+
+class CopyTaskUpsertTest(TestCase):
+
+    def test_new_entries_are_created(self):
+        save_copy_tasks([copy_task('/datastore/a'), copy_task('/datastore/b')])
+        self.assertEqual(
+            sorted(CopyDicomTaskModel.objects.values_list('source_directory', flat=True)),
+            ['/datastore/a', '/datastore/b']
+        )
+
+    def test_existing_entry_is_updated_in_place(self):
+        save_copy_tasks([copy_task('/datastore/a')])
+        existing = get_existing_copy_tasks(['/datastore/a'])['/datastore/a']
+        held_since = timezone.now() - timedelta(minutes=5)
+        CopyDicomTaskModel.objects.filter(id=existing.id).update(incomplete_series_held_since=held_since)
+
+        existing.task_id = 'second'
+        existing.files_copied = 2
+        existing.file_manifest = {'1.dcm': {'size': 10, 'mtime': 1000.0}, '2.dcm': {'size': 20, 'mtime': 2000.0}}
+        existing.skipped_file_counts = {'RTPLAN': 1}
+        save_copy_tasks([existing, copy_task('/datastore/b')])
+
+        self.assertEqual(CopyDicomTaskModel.objects.count(), 2)
+        updated = CopyDicomTaskModel.objects.get(source_directory='/datastore/a')
+        self.assertEqual(updated.id, existing.id)
+        self.assertEqual(updated.task_id, 'second')
+        self.assertEqual(updated.files_copied, 2)
+        self.assertEqual(set(updated.file_manifest), {'1.dcm', '2.dcm'})
+        self.assertEqual(updated.skipped_file_counts, {'RTPLAN': 1})
+        # The hold of series preparation is not part of the copy task update
+        self.assertEqual(updated.incomplete_series_held_since, held_since)
+
+    def test_entry_built_for_a_known_directory_updates_the_existing_row(self):
+        save_copy_tasks([copy_task('/datastore/a')])
+        original = CopyDicomTaskModel.objects.get(source_directory='/datastore/a')
+        save_copy_tasks([copy_task('/datastore/a', task_id='second', copy_completed=False)])
+
+        updated = CopyDicomTaskModel.objects.get(source_directory='/datastore/a')
+        self.assertEqual(updated.id, original.id)
+        self.assertEqual(updated.created_at, original.created_at)
+        self.assertEqual(updated.task_id, 'second')
+        self.assertFalse(updated.copy_completed)
+
+    def test_existing_entries_are_fetched_in_batches(self):
+        save_copy_tasks([copy_task(f'/datastore/{index}') for index in range(5)])
+        existing = get_existing_copy_tasks([f'/datastore/{index}' for index in range(6)], batch_size=2)
+        self.assertEqual(sorted(existing), [f'/datastore/{index}' for index in range(5)])
+
+    def test_nothing_to_save(self):
+        save_copy_tasks([])
+        self.assertEqual(CopyDicomTaskModel.objects.count(), 0)
+
+
+if __name__ == "__main__":
+    from django.conf import settings
+    from django.test.utils import get_runner
+    test_runner = get_runner(settings)()
+    sys.exit(bool(test_runner.run_tests(['__main__'])))
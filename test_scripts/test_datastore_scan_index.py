@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Tests for the DatastoreScanIndexModel entries written and pruned by scan_datastore.
+A full scan of one datastore must neither load nor prune the index entries of a sibling directory whose path
+starts with the same characters (/data/ds and /data/ds2).
+
+Usage:
+    python test_scripts/test_datastore_scan_index.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'draw_client.settings')
+django.setup()
+
+from django.test import TestCase
+from dicomapp.models import DatastoreScanIndexModel
+from dicomapp.dicom_utils.datastore_scan import scan_datastore
+
+
+class DatastoreScanIndexTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.datastore = os.path.join(self.directory, 'ds')
+        self.sibling = os.path.join(self.directory, 'ds2')
+        for root in (self.datastore, self.sibling):
+            os.makedirs(os.path.join(root, 'patient'))
+            with open(os.path.join(root, 'patient', '1.dcm'), 'wb') as f:
+                f.write(b'\0' * 10)
+
+    def index_paths(self):
+        return set(DatastoreScanIndexModel.objects.values_list('directory_path', flat=True))
+
+    def test_full_scan_keeps_index_of_sibling_tree(self):
+        scan_datastore(self.sibling)
+        scan_datastore(self.datastore)
+        sibling_paths = {self.sibling, os.path.join(self.sibling, 'patient')}
+        self.assertTrue(sibling_paths <= self.index_paths())
+
+        shutil.rmtree(os.path.join(self.datastore, 'patient'))
+        scan_datastore(self.datastore)
+        self.assertTrue(sibling_paths <= self.index_paths())
+        self.assertNotIn(os.path.join(self.datastore, 'patient'), self.index_paths())
+
+    def test_unchanged_directory_is_taken_from_the_index(self):
+        scan_datastore(self.datastore)
+        records = {record.path: record for record in scan_datastore(self.datastore)}
+        patient_record = records[os.path.join(self.datastore, 'patient')]
+        self.assertFalse(patient_record.listed)
+        self.assertEqual(patient_record.file_count, 1)
+        self.assertEqual(patient_record.total_size, 10)
+
+
+if __name__ == "__main__":
+    from django.conf import settings
+    from django.test.utils import get_runner
+    test_runner = get_runner(settings)()
+    sys.exit(bool(test_runner.run_tests(['__main__'])))
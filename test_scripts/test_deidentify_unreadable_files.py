@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Tests that deidentification only deletes files which are definitely not DICOM.
+A file which could not be read (e.g. a transient error of a network share) must be kept, it may be a
+valid DICOM file.
+
+Usage:
+    python test_scripts/test_deidentify_unreadable_files.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'draw_client.settings')
+django.setup()
+
+from django.test import TestCase
+from dicomapp.dicom_utils.dicom_headers import sniff_dicom_file, DICOM_UNREADABLE
+from deidapp.dicomutils.deidentify_dicom import DicomDeidentifier
+
+
+class DeidentifyUnreadableFilesTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.dicom_dir = os.path.join(self.directory, 'series')
+        self.processed_dir = os.path.join(self.directory, 'processed')
+        os.makedirs(self.dicom_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_file(self, name, content):
+        file_path = os.path.join(self.dicom_dir, name)
+        with open(file_path, 'wb') as f:
+            f.write(content)
+        return file_path
+
+    def test_sniff_reports_unreadable_file(self):
+        # Opening a directory as a file raises an OSError like a failing read of the share would
+        self.assertEqual(sniff_dicom_file(self.dicom_dir), DICOM_UNREADABLE)
+
+    def test_unreadable_file_is_kept(self):
+        file_path = self.write_file('1.dcm', b'\0' * 128 + b'DICM')
+        with mock.patch('deidapp.dicomutils.deidentify_dicom.sniff_dicom_file', return_value=DICOM_UNREADABLE):
+            result = DicomDeidentifier().process_dicom_directory(self.dicom_dir, self.processed_dir)
+        self.assertEqual(result['status'], 'error')
+        self.assertTrue(os.path.exists(file_path))
+
+    def test_file_which_is_not_dicom_is_deleted(self):
+        file_path = self.write_file('thumbnail.jpg', b'\xff\xd8\xff\xe0' + b'\0' * 200)
+        DicomDeidentifier().process_dicom_directory(self.dicom_dir, self.processed_dir)
+        self.assertFalse(os.path.exists(file_path))
+
+
+if __name__ == "__main__":
+    from django.conf import settings
+    from django.test.utils import get_runner
+    test_runner = get_runner(settings)()
+    sys.exit(bool(test_runner.run_tests(['__main__'])))
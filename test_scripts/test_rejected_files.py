@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Tests for the rejected file cache (RejectedFileCache, RejectedFileModel) and the handling of rejected files by
+series preparation. A rejected file is skipped until its size or modification time changes, and is deleted
+right away unless a quarantine directory is configured.
+
+Usage:
+    python test_scripts/test_rejected_files.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+
+import django
+from pydicom.uid import generate_uid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'draw_client.settings')
+django.setup()
+
+from django.test import TestCase, override_settings
+from dicomapp.models import RejectedFileModel, FileRejectionReasonChoices
+from dicom_handler.models import DicomPathConfig
+from dicomapp.dicom_utils.rejected_files import RejectedFileCache, quarantine_file
+from dicomapp.dicom_utils.series_preparation import series_preparation
+from test_scripts.test_series_streaming import write_ct_slice
+
+
+class RejectedFileCacheTest(TestCase):
+
+    def test_rejected_file_is_skipped_until_it_changes(self):
+        cache = RejectedFileCache()
+        cache.reject('/datastore/a/thumbnail.jpg', 10, 1000.0, FileRejectionReasonChoices.NOT_DICOM)
+        cache.save()
+
+        cache = RejectedFileCache()
+        cache.load(['/datastore/a/thumbnail.jpg', '/datastore/a/1.dcm'])
+        self.assertTrue(cache.is_rejected('/datastore/a/thumbnail.jpg', 10, 1000.0))
+        self.assertFalse(cache.is_rejected('/datastore/a/thumbnail.jpg', 10, 2000.0))
+        self.assertFalse(cache.is_rejected('/datastore/a/thumbnail.jpg', 11, 1000.0))
+        self.assertFalse(cache.is_rejected('/datastore/a/1.dcm', 10, 1000.0))
+
+    def test_rejecting_again_updates_the_entry(self):
+        cache = RejectedFileCache()
+        cache.reject('/datastore/a/1.dcm', 10, 1000.0, FileRejectionReasonChoices.NOT_DICOM)
+        cache.save()
+
+        cache = RejectedFileCache()
+        cache.load(['/datastore/a/1.dcm'])
+        cache.reject('/datastore/a/1.dcm', 20, 2000.0, FileRejectionReasonChoices.UNSUPPORTED_MODALITY, 'Not a CT / MR / PT (PET) / US')
+        cache.save()
+
+        entry = RejectedFileModel.objects.get(file_path='/datastore/a/1.dcm')
+        self.assertEqual(RejectedFileModel.objects.count(), 1)
+        self.assertEqual(entry.rejection_count, 2)
+        self.assertEqual((entry.file_size, entry.file_modification_time), (20, 2000.0))
+        self.assertEqual(entry.reason, FileRejectionReasonChoices.UNSUPPORTED_MODALITY)
+
+    def test_entries_are_loaded_in_batches(self):
+        cache = RejectedFileCache()
+        for index in range(5):
+            cache.reject(f'/datastore/{index}.jpg', 10, 1000.0, FileRejectionReasonChoices.NOT_DICOM)
+        cache.save()
+        self.assertEqual(cache.changed_entries, {})
+
+        cache = RejectedFileCache()
+        cache.load([f'/datastore/{index}.jpg' for index in range(5)], batch_size=2)
+        self.assertEqual(len(cache.entries), 5)
+
+
+class RejectedFilesInSeriesPreparationTest(TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        settings_override = override_settings(BASE_DIR=self.base_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.base_dir, ignore_errors=True)
+        self.import_dir = os.path.join(self.base_dir, 'folders', 'folder_unprocessed_dicom', 'study')
+        write_ct_slice(self.import_dir, generate_uid(), 1)
+        self.rejected_path = os.path.join(self.import_dir, 'thumbnail.jpg')
+        with open(self.rejected_path, 'wb') as f:
+            f.write(b'\xff\xd8\xff\xe0' + b'\0' * 200)
+
+    def test_rejected_file_is_deleted_without_quarantine_directory(self):
+        result = series_preparation({'target_paths': [self.import_dir], 'task_id': 'test'})
+        self.assertEqual(result['status'], 'success')
+        self.assertFalse(os.path.exists(self.rejected_path))
+        entry = RejectedFileModel.objects.get(file_path=self.rejected_path)
+        self.assertEqual(entry.reason, FileRejectionReasonChoices.NOT_DICOM)
+        self.assertEqual(entry.quarantine_path, '')
+
+    def test_rejected_file_is_moved_to_the_quarantine_directory(self):
+        quarantine_directory = os.path.join(self.base_dir, 'quarantine')
+        DicomPathConfig.objects.create(quarantine_directory=quarantine_directory)
+        series_preparation({'target_paths': [self.import_dir], 'task_id': 'test'})
+        quarantine_path = os.path.join(quarantine_directory, 'study', 'thumbnail.jpg')
+        self.assertTrue(os.path.exists(quarantine_path))
+        self.assertEqual(RejectedFileModel.objects.get(file_path=self.rejected_path).quarantine_path, quarantine_path)
+
+    def test_quarantine_failure_keeps_the_file(self):
+        # The quarantine directory can not be created below a file
+        self.assertEqual(quarantine_file(self.rejected_path, self.rejected_path, 'study'), '')
+        self.assertTrue(os.path.exists(self.rejected_path))
+
+
+if __name__ == "__main__":
+    from django.conf import settings
+    from django.test.utils import get_runner
+    test_runner = get_runner(settings)()
+    sys.exit(bool(test_runner.run_tests(['__main__'])))
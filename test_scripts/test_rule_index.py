@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Unit tests for match_rule_sets, the comparison of a series header record with the compiled rules.
+The rule index is built by hand, no database is needed.
+
+Usage:
+    python test_scripts/test_rule_index.py
+"""
+
+import os
+import sys
+import unittest
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'draw_client.settings')
+django.setup()
+
+from dicomapp.dicom_utils.rule_index import RuleIndex, match_rule_sets, parse_tag_id
+
+
+def element(tag_name, tag_value):
+    return {'tag': '', 'tag_name': tag_name, 'tag_value': tag_value}
+
+
+class MatchRuleSetsTest(unittest.TestCase):
+
+    def setUp(self):
+        # Rule set 1: Modality CT and BodyPartExamined HEAD. Rule set 2: Modality MR.
+        self.rule_index = RuleIndex(
+            rule_sets_by_tag={
+                'Modality': {'CT': [1], 'MR': [2]},
+                'BodyPartExamined': {'HEAD': [1]},
+            },
+            required_rule_counts={1: 2, 2: 1},
+            rule_set_names={1: 'Head CT', 2: 'MR'},
+            specific_tags=[0x00080060, 0x00180015],
+            fingerprint=None,
+        )
+
+    def test_all_rules_of_a_rule_set_must_match(self):
+        header = [element('Modality', 'CT'), element('BodyPartExamined', 'HEAD'), element('PatientID', '1')]
+        self.assertEqual(match_rule_sets(self.rule_index, header), [1])
+        self.assertEqual(match_rule_sets(self.rule_index, [element('Modality', 'CT')]), [])
+
+    def test_repeated_element_does_not_count_twice(self):
+        header = [element('Modality', 'CT'), element('Modality', 'CT')]
+        self.assertEqual(match_rule_sets(self.rule_index, header), [])
+
+    def test_elements_without_rules_are_ignored(self):
+        header = [element('Privatetagdata', "b'ABC'")] * 100 + [element('Modality', 'MR')]
+        self.assertEqual(match_rule_sets(self.rule_index, header), [2])
+
+    def test_parse_tag_id(self):
+        self.assertEqual(parse_tag_id('(0008,0060)'), 0x00080060)
+        self.assertIsNone(parse_tag_id('(50xx,0030)'))
+
+
+if __name__ == "__main__":
+    unittest.main()
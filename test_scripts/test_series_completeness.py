@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+Unit tests for analyse_series_completeness, the check which holds back series with missing slices.
+The series are described by their InstanceNumbers and slice geometry only, no DICOM files or database
+are needed.
+
+Usage:
+    python test_scripts/test_series_completeness.py
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dicomapp.dicom_utils.series_completeness import analyse_series_completeness
+
+AXIAL = [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]
+
+
+def axial_stack(slice_locations):
+    """Return the ImagePositionPatient and ImageOrientationPatient of axial slices at the z locations."""
+    positions = [[-250.0, -250.0, float(z)] for z in slice_locations]
+    return positions, [AXIAL] * len(positions)
+
+
+class AnalyseSeriesCompletenessTest(unittest.TestCase):
+
+    def test_complete_stack(self):
+        positions, orientations = axial_stack([index * 2.5 for index in range(10)])
+        result = analyse_series_completeness(list(range(1, 11)), positions, orientations, 'CT')
+        self.assertTrue(result.complete)
+        self.assertEqual(result.slice_count, 10)
+        self.assertEqual(result.slice_spacing, 2.5)
+        self.assertEqual(result.inconsistent_spacing, 0)
+        self.assertEqual(result.reasons, [])
+
+    def test_missing_instance_number(self):
+        locations = [index * 2.5 for index in range(10) if index != 4]
+        positions, orientations = axial_stack(locations)
+        result = analyse_series_completeness([1, 2, 3, 4, 6, 7, 8, 9, 10], positions, orientations, 'CT')
+        self.assertFalse(result.complete)
+        self.assertEqual(result.missing_instance_numbers, [5])
+        self.assertEqual(result.missing_positions, 1)
+
+    def test_position_gap_without_instance_numbers(self):
+        locations = [index * 2.5 for index in range(10) if index not in (4, 5)]
+        positions, orientations = axial_stack(locations)
+        result = analyse_series_completeness([None] * len(locations), positions, orientations, 'CT')
+        self.assertFalse(result.complete)
+        self.assertEqual(result.missing_positions, 2)
+
+    def test_mixed_slice_thickness_with_contiguous_instance_numbers(self):
+        # 5 mm slices at both ends of a 2.5 mm planning CT
+        locations = [0.0, 5.0, 10.0, 12.5, 15.0, 17.5, 20.0, 22.5, 25.0, 27.5, 30.0, 35.0, 40.0]
+        positions, orientations = axial_stack(locations)
+        result = analyse_series_completeness(list(range(1, len(locations) + 1)), positions, orientations, 'CT')
+        self.assertTrue(result.complete)
+        self.assertEqual(result.missing_positions, 0)
+        self.assertEqual(result.slice_spacing, 2.5)
+        self.assertEqual(result.inconsistent_spacing, 4)
+
+    def test_multi_phase_series_still_arriving(self):
+        locations = [index * 3.0 for index in range(5)]
+        positions, orientations = axial_stack(locations + locations[:3])
+        result = analyse_series_completeness(list(range(1, 9)), positions, orientations, 'MR')
+        self.assertFalse(result.complete)
+        self.assertEqual(result.duplicate_positions, 2)
+
+    def test_multi_phase_series_complete(self):
+        locations = [index * 3.0 for index in range(5)]
+        positions, orientations = axial_stack(locations * 2)
+        result = analyse_series_completeness(list(range(1, 11)), positions, orientations, 'MR')
+        self.assertTrue(result.complete)
+        self.assertEqual(result.duplicate_positions, 0)
+
+    def test_modality_without_stack_is_not_checked(self):
+        positions, orientations = axial_stack([0.0, 10.0])
+        result = analyse_series_completeness([1, 5], positions, orientations, 'US')
+        self.assertTrue(result.complete)
+        self.assertEqual(result.reasons, [])
+
+    def test_single_slice_is_complete(self):
+        positions, orientations = axial_stack([0.0])
+        result = analyse_series_completeness([7], positions, orientations, 'CT')
+        self.assertTrue(result.complete)
+        self.assertEqual(result.slice_count, 1)
+
+    def test_missing_geometry_checks_instance_numbers_only(self):
+        result = analyse_series_completeness([1, 2, 4], [None] * 3, [None] * 3, 'CT')
+        self.assertFalse(result.complete)
+        self.assertEqual(result.missing_instance_numbers, [3])
+        self.assertIsNone(result.slice_spacing)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Tests for the streaming mode of series preparation (stream_series_downstream).
+A series whose files are spread over several imported directories must be sent downstream once, with the
+files of all of its directories, and must only create one DicomSeriesProcessingModel entry.
+
+Usage:
+    python test_scripts/test_series_streaming.py
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+import django
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, CTImageStorage, generate_uid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set up Django environment
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'draw_client.settings')
+django.setup()
+
+from django.test import TestCase, override_settings
+from dicomapp.models import DicomSeriesProcessingModel
+from dicomapp.dicom_utils.series_preparation import series_preparation, group_directories_by_series, SeriesHeaderRecord
+
+
+def write_ct_slice(directory, series_uid, instance_number):
+    """Write a minimal CT slice of the series with 2.5 mm slice spacing."""
+    file_meta = FileMetaDataset()
+    file_meta.MediaStorageSOPClassUID = CTImageStorage
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = Dataset()
+    ds.file_meta = file_meta
+    ds.SOPClassUID = CTImageStorage
+    ds.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    ds.PatientID = 'TEST'
+    ds.PatientName = 'Test^Patient'
+    ds.PatientSex = 'O'
+    ds.StudyDate = '20250101'
+    ds.Modality = 'CT'
+    ds.StudyInstanceUID = '1.2.3'
+    ds.SeriesInstanceUID = series_uid
+    ds.SeriesDescription = 'Test'
+    ds.ProtocolName = 'Test'
+    ds.InstanceNumber = instance_number
+    ds.ImagePositionPatient = [0, 0, instance_number * 2.5]
+    ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    ds.ImageType = ['ORIGINAL', 'PRIMARY', 'AXIAL']
+    ds.Rows = 2
+    ds.Columns = 2
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 1
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.PixelData = b'\0' * 8
+    os.makedirs(directory, exist_ok=True)
+    ds.save_as(os.path.join(directory, f'{series_uid}_{instance_number}.dcm'), enforce_file_format=True)
+
+
+def header_result(series_uid):
+    """Return a read_series_header_record() result of a file of the series."""
+    return ('record', SeriesHeaderRecord(*[None] * len(SeriesHeaderRecord._fields))._replace(series_instance_uid=series_uid))
+
+
+class GroupDirectoriesBySeriesTest(unittest.TestCase):
+
+    def test_directories_sharing_a_series_form_one_batch(self):
+        file_sources = [('a1', 'A'), ('b1', 'B'), ('c1', 'C'), ('d1', 'D'), ('d2', 'D')]
+        header_results = {
+            'a1': header_result('X'),
+            'b1': header_result('Y'),
+            'c1': header_result('X'),
+            'd1': header_result('Y'),
+            'd2': ('skipped', ('NOT_DICOM', None)),
+        }
+        batches = group_directories_by_series(file_sources, header_results, ['A', 'B', 'C', 'D'])
+        self.assertEqual(batches, [[('a1', 'A'), ('c1', 'C')], [('b1', 'B'), ('d1', 'D'), ('d2', 'D')]])
+
+    def test_series_joining_two_batches(self):
+        file_sources = [('a1', 'A'), ('b1', 'B'), ('c1', 'C'), ('c2', 'C')]
+        header_results = {
+            'a1': header_result('X'),
+            'b1': header_result('Y'),
+            'c1': header_result('Y'),
+            'c2': header_result('X'),
+        }
+        batches = group_directories_by_series(file_sources, header_results, ['A', 'B', 'C'])
+        self.assertEqual(batches, [file_sources])
+
+    def test_directories_without_shared_series_stay_apart(self):
+        file_sources = [('a1', 'A'), ('b1', 'B')]
+        header_results = {'a1': header_result('X'), 'b1': header_result('Y')}
+        batches = group_directories_by_series(file_sources, header_results, ['A', 'B'])
+        self.assertEqual(batches, [[('a1', 'A')], [('b1', 'B')]])
+
+
+class StreamSeriesOverTwoDirectoriesTest(TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        settings_override = override_settings(BASE_DIR=self.base_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.base_dir, ignore_errors=True)
+
+    def test_series_spread_over_two_directories_is_sent_once(self):
+        import_dir = os.path.join(self.base_dir, 'folders', 'folder_unprocessed_dicom')
+        first_dir = os.path.join(import_dir, 'first')
+        second_dir = os.path.join(import_dir, 'second')
+        third_dir = os.path.join(import_dir, 'third')
+        split_series, other_series = generate_uid(), generate_uid()
+        for instance_number in (1, 2):
+            write_ct_slice(first_dir, split_series, instance_number)
+        for instance_number in (3, 4):
+            write_ct_slice(second_dir, split_series, instance_number)
+        for instance_number in (1, 2, 3):
+            write_ct_slice(third_dir, other_series, instance_number)
+
+        ready_series = []
+
+        def on_series_ready(series_result):
+            for series_folder in series_result['separated_series_path_folders']:
+                ready_series.append((os.path.basename(series_folder), sorted(os.listdir(series_folder))))
+
+        result = series_preparation(
+            {'target_paths': [first_dir, second_dir, third_dir], 'task_id': 'test'}, on_series_ready=on_series_ready)
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual([series_uid for series_uid, _ in ready_series], [split_series, other_series])
+        self.assertEqual(len(ready_series[0][1]), 4)
+        self.assertEqual(len(ready_series[1][1]), 3)
+        self.assertEqual(DicomSeriesProcessingModel.objects.filter(series_instance_uid=split_series).count(), 1)
+        self.assertEqual(DicomSeriesProcessingModel.objects.count(), 2)
+
+
+if __name__ == "__main__":
+    from django.conf import settings
+    from django.test.utils import get_runner
+    test_runner = get_runner(settings)()
+    sys.exit(bool(test_runner.run_tests(['__main__'])))